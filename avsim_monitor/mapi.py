@@ -5,6 +5,15 @@ Message API definitions
 '''
 
 import json
+import time
+import bisect
+
+# faster JSON backend (optional)
+try:
+    import orjson
+    _json_loads = orjson.loads # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+except ImportError:
+    _json_loads = json.loads
 
 class mapi():
     
@@ -17,4 +26,110 @@ class mapi():
     # active notification
     def mapi_notify_active(self, app:str, active:bool) -> str:
         msg = {"app":app, "active":active}
-        return json.dumps(msg)
\ No newline at end of file
+        return json.dumps(msg)
+
+
+'''
+Message API dispatcher
+Topic filters(with MQTT wildcards '+' and '#') are compiled into a topic trie. Matching results are cached per topic,
+so unknown topics cost a single dictionary lookup. Payload is decoded(JSON) only if a handler exists,
+once per message, with orjson if it is installed.
+'''
+# handler latency histogram bucket upper bounds (ms)
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+class _TopicNode:
+    __slots__ = ("children", "handlers")
+    def __init__(self):
+        self.children = {}  # level -> node ('+' and '#' are stored as levels)
+        self.handlers = []  # (topic filter, handler)
+
+class MapiDispatcher:
+    def __init__(self, json_loads=None, cache_size:int=4096):
+        self.__root = _TopicNode()
+        self.__loads = json_loads if json_loads else _json_loads
+        self.__cache = {}   # topic -> matched (topic filter, handler) tuple
+        self.__cache_size = cache_size
+        self.__latency = {} # topic filter -> [bucket counts..., count, sum(ms), max(ms)]
+
+    # register handler(payload:dict) for the topic filter
+    def register(self, topic_filter:str, handler) -> None:
+        node = self.__root
+        for level in topic_filter.split("/"):
+            node = node.children.setdefault(level, _TopicNode())
+        node.handlers.append((topic_filter, handler))
+        self.__latency.setdefault(topic_filter, [0]*(len(LATENCY_BUCKETS_MS)+1) + [0, 0.0, 0.0])
+        self.__cache.clear()
+
+    # register handlers of {topic filter:handler}
+    def register_all(self, message_api:dict) -> None:
+        for topic_filter, handler in message_api.items():
+            self.register(topic_filter, handler)
+
+    # registered topic filters (to subscribe)
+    def topics(self) -> list:
+        return list(self.__latency.keys())
+
+    # matched (topic filter, handler) tuple for the topic
+    def match(self, topic:str) -> tuple:
+        matched = self.__cache.get(topic)
+        if matched is None:
+            found = []
+            self.__match(self.__root, topic.split("/"), 0, found, topic.startswith("$"))
+            matched = tuple(found)
+            if len(self.__cache)>=self.__cache_size:
+                self.__cache.clear()
+            self.__cache[topic] = matched
+        return matched
+
+    # check the topic has handlers
+    def has_handler(self, topic:str) -> bool:
+        return len(self.match(topic))>0
+
+    def __match(self, node:_TopicNode, levels:list, idx:int, found:list, system:bool):
+        wildcard = not (system and idx==0) # wildcards do not match $-topics at the first level
+        if wildcard and "#" in node.children: # multi level (also matches the parent level)
+            found.extend(node.children["#"].handlers)
+        if idx==len(levels):
+            found.extend(node.handlers)
+            return
+        child = node.children.get(levels[idx])
+        if child is not None:
+            self.__match(child, levels, idx+1, found, system)
+        if wildcard and "+" in node.children:
+            self.__match(node.children["+"], levels, idx+1, found, system)
+
+    # call handlers of the topic with decoded payload. returns False if there is no handler
+    # (raises json.JSONDecodeError if the payload is not valid)
+    def dispatch(self, topic:str, payload) -> bool:
+        matched = self.match(topic)
+        if not matched:
+            return False
+        decoded = self.__loads(payload)
+        for topic_filter, handler in matched:
+            t_start = time.perf_counter()
+            try:
+                handler(decoded)
+            finally:
+                self.__record_latency(topic_filter, (time.perf_counter()-t_start)*1000)
+        return True
+
+    def __record_latency(self, topic_filter:str, latency_ms:float):
+        hist = self.__latency[topic_filter]
+        hist[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        hist[-3] += 1
+        hist[-2] += latency_ms
+        hist[-1] = max(hist[-1], latency_ms)
+
+    # handler latency histograms : {topic filter : {"buckets":{upper bound(ms):count}, "count", "mean_ms", "max_ms"}}
+    def get_latency_histograms(self) -> dict:
+        report = {}
+        for topic_filter, hist in self.__latency.items():
+            bounds = list(LATENCY_BUCKETS_MS) + [float("inf")]
+            report[topic_filter] = {
+                "buckets": dict(zip(bounds, hist[:len(bounds)])),
+                "count": hist[-3],
+                "mean_ms": hist[-2]/hist[-3] if hist[-3] else 0.0,
+                "max_ms": hist[-1],
+            }
+        return report
@@ -0,0 +1,166 @@
+'''
+MQTT Messenger running on its own thread
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import time
+import collections
+import paho.mqtt.client as mqtt
+
+try:
+    # using PyQt5
+    from PyQt5.QtCore import QThread, pyqtSignal
+except ImportError:
+    # using PyQt6
+    from PyQt6.QtCore import QThread, pyqtSignal
+
+from util.logger.console import ConsoleLogger
+
+'''
+MQTT client owner thread
+Only this thread touches the paho client. Other threads put outbound messages into a queue(deque, no lock on the caller side)
+and the thread publishes them in batches between network loops. QoS is decided by the per-topic QoS policy.
+Inbound messages are delivered through a (queued) signal, so slow handlers do not block the network loop.
+'''
+class MQTTMessenger(QThread):
+
+    message_received_signal = pyqtSignal(str, bytes) # topic, payload
+    connected_signal = pyqtSignal(int)      # return code
+    disconnected_signal = pyqtSignal(int)   # return code
+    metrics_signal = pyqtSignal(dict)       # publish metrics (every second)
+
+    def __init__(self, client_id:str, broker_ip:str, subscribe_topics:list, qos_policy:dict=None, port:int=1883, keepalive:int=60, loop_timeout:float=0.005):
+        super().__init__()
+        self.__console = ConsoleLogger.get_logger()
+
+        self.__broker = (broker_ip, port, keepalive)
+        self.__subscribe_topics = subscribe_topics
+        self.__qos_policy = dict(qos_policy) if qos_policy else {}
+        self.__default_qos = self.__qos_policy.pop("default", 2)
+        self.__loop_timeout = loop_timeout
+        self.__topic_filter = None # callable(topic)->bool, inbound messages of rejected topics are dropped on this thread
+        self.__outbound = collections.deque() # (topic, payload, qos, enqueued monotonic ns)
+        self.__inflight = {} # mid -> enqueued monotonic ns
+
+        # metrics
+        self.__published = 0
+        self.__acked = 0
+        self.__publish_latency_ns = [0, 0] # sum, max (enqueue -> publish)
+        self.__ack_latency_ns = [0, 0]     # sum, max (enqueue -> ack)
+        self.__max_queue_depth = 0
+
+        self.__client = mqtt.Client(client_id=client_id, transport='tcp', protocol=mqtt.MQTTv311, clean_session=True)
+        self.__client.on_connect = self.__on_connect
+        self.__client.on_disconnect = self.__on_disconnect
+        self.__client.on_message = self.__on_message
+        self.__client.on_publish = self.__on_publish
+
+    # queue a message to be published (thread-safe, never blocks). qos=None follows the QoS policy
+    def publish(self, topic:str, payload, qos:int=None):
+        if qos is None:
+            qos = self.__qos_policy.get(topic, self.__default_qos)
+        self.__outbound.append((topic, payload, qos, time.monotonic_ns()))
+
+    # set inbound topic filter (e.g. MapiDispatcher.has_handler)
+    def set_topic_filter(self, topic_filter):
+        self.__topic_filter = topic_filter
+
+    # current number of messages waiting to be published
+    def get_queue_depth(self) -> int:
+        return len(self.__outbound)
+
+    # publish metrics
+    def get_metrics(self) -> dict:
+        return {
+            "queue_depth": len(self.__outbound),
+            "max_queue_depth": self.__max_queue_depth,
+            "inflight": len(self.__inflight),
+            "published": self.__published,
+            "acked": self.__acked,
+            "publish_latency_mean_ms": self.__publish_latency_ns[0]/max(1, self.__published)/1e6,
+            "publish_latency_max_ms": self.__publish_latency_ns[1]/1e6,
+            "ack_latency_mean_ms": self.__ack_latency_ns[0]/max(1, self.__acked)/1e6,
+            "ack_latency_max_ms": self.__ack_latency_ns[1]/1e6,
+        }
+
+    # close thread (queued messages are flushed before disconnecting)
+    def close(self) -> None:
+        self.requestInterruption()
+        self.quit()
+        self.wait(3000)
+
+    # network loop
+    def run(self):
+        host, port, keepalive = self.__broker
+        self.__client.connect_async(host, port=port, keepalive=keepalive)
+        connected = False
+        next_metrics = time.monotonic()
+
+        while not self.isInterruptionRequested():
+            if not connected:
+                try:
+                    self.__client.reconnect()
+                    connected = True
+                except (OSError, ValueError) as e:
+                    self.__console.warning(f"Cannot connect to broker {host}:{port} ({e})")
+                    self.msleep(1000)
+                    continue
+
+            self.__flush_outbound()
+            rc = self.__client.loop(timeout=self.__loop_timeout)
+            if rc!=mqtt.MQTT_ERR_SUCCESS:
+                connected = False
+                self.msleep(1000)
+
+            if time.monotonic()>=next_metrics:
+                next_metrics += 1.0
+                self.metrics_signal.emit(self.get_metrics())
+
+        # publish remaining messages then disconnect
+        if connected:
+            self.__flush_outbound()
+            self.__client.loop(timeout=self.__loop_timeout)
+            self.__client.disconnect()
+
+    # publish all queued messages
+    def __flush_outbound(self):
+        self.__max_queue_depth = max(self.__max_queue_depth, len(self.__outbound))
+        while self.__outbound:
+            topic, payload, qos, t_enqueue = self.__outbound.popleft()
+            info = self.__client.publish(topic, payload, qos)
+            latency = time.monotonic_ns() - t_enqueue
+            self.__published += 1
+            self.__publish_latency_ns[0] += latency
+            self.__publish_latency_ns[1] = max(self.__publish_latency_ns[1], latency)
+            if info.rc==mqtt.MQTT_ERR_SUCCESS:
+                if info.is_published(): # already completed in publish (QoS 0)
+                    self.__record_ack(t_enqueue)
+                else:
+                    self.__inflight[info.mid] = t_enqueue
+            else:
+                self.__console.warning(f"Publish failed ({topic}, rc={info.rc})")
+
+    def __on_connect(self, mqttc, obj, flags, rc):
+        for topic in self.__subscribe_topics:
+            self.__client.subscribe(topic, 2)
+        self.connected_signal.emit(rc)
+
+    def __on_disconnect(self, mqttc, userdata, rc):
+        self.disconnected_signal.emit(rc)
+
+    def __on_message(self, mqttc, userdata, msg):
+        topic = str(msg.topic)
+        if self.__topic_filter is None or self.__topic_filter(topic):
+            self.message_received_signal.emit(topic, bytes(msg.payload))
+
+    # QoS 0 : sent, QoS 1 : PUBACK, QoS 2 : PUBCOMP
+    def __on_publish(self, mqttc, userdata, mid):
+        t_enqueue = self.__inflight.pop(mid, None)
+        if t_enqueue is not None:
+            self.__record_ack(t_enqueue)
+
+    def __record_ack(self, t_enqueue:int):
+        latency = time.monotonic_ns() - t_enqueue
+        self.__acked += 1
+        self.__ack_latency_ns[0] += latency
+        self.__ack_latency_ns[1] = max(self.__ack_latency_ns[1], latency)
@@ -0,0 +1,141 @@
+'''
+Camera Preview Renderer
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import cv2
+import time
+import numpy as np
+from datetime import datetime
+from typing import Tuple
+
+try:
+    # using PyQt5
+    from PyQt5.QtGui import QImage
+    from PyQt5.QtCore import QThread, pyqtSignal
+except ImportError:
+    # using PyQt6
+    from PyQt6.QtGui import QImage
+    from PyQt6.QtCore import QThread, pyqtSignal
+
+from util.logger.console import ConsoleLogger
+from device.camera.frame_ring import FrameRing
+
+'''
+Renders label-sized RGB previews of the latest camera frames at its own (preview) rate, independent of the capture rate.
+Every camera has one preallocated preview buffer wrapped by a QImage. A new preview is rendered only after the GUI
+reported the previous one as consumed, so the buffer is never overwritten while the GUI reads it.
+'''
+class PreviewRenderer(QThread):
+
+    preview_update_signal = pyqtSignal(int, QImage) # camera_id, preview image
+
+    def __init__(self, preview_fps:float=10.0):
+        super().__init__()
+        self.__console = ConsoleLogger.get_logger()
+
+        self.__interval = 1.0/preview_fps
+        self.__cameras = {}     # camera id -> camera controller (owner of the frame ring)
+        self.__latest = {}      # camera id -> (slot, sequence, fps) of the last grabbed frame
+        self.__rendered = {}    # camera id -> sequence of the last rendered frame
+        self.__target = {}      # camera id -> (width, height) of the preview window
+        self.__previews = {}    # camera id -> (scaled bgr buffer, rgb buffer, QImage on the rgb buffer)
+        self.__pending = {}     # camera id -> preview is emitted but not consumed yet
+
+    # register camera controller to be rendered
+    def add_camera(self, camera_id:int, camera, preview_size:Tuple[int,int]):
+        self.__cameras[camera_id] = camera
+        self.__target[camera_id] = preview_size
+        self.__rendered[camera_id] = 0
+        self.__pending[camera_id] = False
+
+    # set preview window size (width, height)
+    def set_preview_size(self, camera_id:int, preview_size:Tuple[int,int]):
+        self.__target[camera_id] = preview_size
+
+    # requested preview window size (width, height), the rendered preview is fitted into it
+    def get_preview_size(self, camera_id:int) -> Tuple[int,int]:
+        return self.__target.get(camera_id)
+
+    # frame update from camera controller (connect with direct connection, called in grab thread)
+    def on_frame_update(self, camera_id:int, slot:int, seq:int, fps:float):
+        self.__latest[camera_id] = (slot, seq, fps)
+
+    # called by GUI after the preview image was copied
+    def preview_consumed(self, camera_id:int):
+        self.__pending[camera_id] = False
+
+    # close thread
+    def close(self) -> None:
+        self.requestInterruption()
+        self.quit()
+        self.wait(1000)
+
+    # render loop
+    def run(self):
+        next_deadline = time.monotonic()
+        while True:
+            if self.isInterruptionRequested():
+                break
+
+            for camera_id in list(self.__latest.keys()):
+                try:
+                    self.__render(camera_id)
+                except Exception as e:
+                    self.__console.error(f"Preview render error (camera {camera_id}) : {e}")
+
+            next_deadline += self.__interval
+            delay = next_deadline - time.monotonic()
+            if delay>0:
+                time.sleep(delay)
+            else:
+                next_deadline = time.monotonic() # too slow, do not try to catch up
+
+    # render a preview of the latest frame into the preview buffer
+    def __render(self, camera_id:int):
+        if self.__pending.get(camera_id, True):
+            return
+        slot, seq, fps = self.__latest[camera_id]
+        if seq==self.__rendered[camera_id]:
+            return
+
+        frame_ring:FrameRing = self.__cameras[camera_id].get_frame_ring()
+        frame = frame_ring.read(slot, seq) if frame_ring else None
+        if frame is None:
+            return
+
+        scaled, rgb, qt_image = self.__get_preview_buffer(camera_id, frame.shape)
+        h, w = rgb.shape[:2]
+        cv2.resize(frame, (w, h), dst=scaled, interpolation=cv2.INTER_AREA)
+        if not frame_ring.is_valid(slot, seq): # overwritten while scaling
+            return
+        cv2.cvtColor(scaled, cv2.COLOR_BGR2RGB, dst=rgb)
+
+        scale = h/1080
+        font_scale = max(0.3, 2.0*scale)
+        thickness = max(1, int(round(2*scale)))
+        t = datetime.now()
+        cv2.putText(rgb, t.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3], (int(10*scale)+2, h-int(10*scale)-2), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,255,0), thickness, cv2.LINE_AA)
+        cv2.putText(rgb, f"Camera #{camera_id}(fps:{fps:.1f})", (int(10*scale)+2, int(50*scale)+10), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (1,255,0), thickness, cv2.LINE_AA)
+
+        self.__rendered[camera_id] = seq
+        self.__pending[camera_id] = True
+        self.preview_update_signal.emit(camera_id, qt_image)
+
+    # preallocated preview buffer fitting into the preview window with keeping aspect ratio
+    def __get_preview_buffer(self, camera_id:int, frame_shape:tuple):
+        fh, fw = frame_shape[:2]
+        tw, th = self.__target[camera_id]
+        ratio = min(max(tw, 1)/fw, max(th, 1)/fh)
+        w, h = max(1, int(fw*ratio)), max(1, int(fh*ratio))
+
+        if camera_id in self.__previews:
+            scaled, rgb, qt_image = self.__previews[camera_id]
+            if rgb.shape[0]==h and rgb.shape[1]==w:
+                return (scaled, rgb, qt_image)
+
+        scaled = np.zeros((h, w, 3), dtype=np.uint8)
+        rgb = np.zeros((h, w, 3), dtype=np.uint8)
+        qt_image = QImage(rgb.data, w, h, 3*w, QImage.Format.Format_RGB888)
+        self.__previews[camera_id] = (scaled, rgb, qt_image)
+        return (scaled, rgb, qt_image)
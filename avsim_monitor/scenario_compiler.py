@@ -0,0 +1,149 @@
+'''
+Scenario Compiler
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import json
+import pathlib
+import numpy as np
+from array import array
+from typing import Tuple, Iterator
+
+from util.logger.console import ConsoleLogger
+
+_CACHE_VERSION = 2
+_CACHE_SUFFIX = ".compiled.npz"
+
+# scenario file has invalid events
+class ScenarioCompileError(ValueError):
+    pass
+
+'''
+Compiled scenario event table
+Events are sorted by time (stable for events of the same time) and stored in arrays :
+times(sec), topic ids(index of topics) and payloads(final UTF-8 JSON bytes to be published)
+'''
+class CompiledScenario:
+    def __init__(self, times:array, topic_ids:array, topics:list, payloads:list) -> None:
+        self.times = times
+        self.topic_ids = topic_ids
+        self.topics = topics
+        self.payloads = payloads
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    # event at the index : (time, topic, payload)
+    def event(self, index:int) -> Tuple[float, str, bytes]:
+        return (self.times[index], self.topics[self.topic_ids[index]], self.payloads[index])
+
+    def events(self) -> Iterator[Tuple[float, str, bytes]]:
+        for index in range(len(self.times)):
+            yield self.event(index)
+
+    def end_time(self) -> float:
+        return self.times[-1] if len(self.times)>0 else 0.0
+
+
+# convert scenario message to final JSON payload (scenario messages use single quotes)
+def compile_payload(message) -> bytes:
+    if isinstance(message, dict):
+        return json.dumps(message).encode("utf-8")
+    payload = str(message).replace("'", '"')
+    json.loads(payload) # validate
+    return payload.encode("utf-8")
+
+
+# compile scenario(dict loaded from scenario file)
+def compile_scenario(scenario:dict) -> CompiledScenario:
+    if "scenario" not in scenario:
+        raise ScenarioCompileError("Scenario does not contain 'scenario'")
+
+    rows = []
+    for scene_idx, scene in enumerate(scenario["scenario"]):
+        try:
+            t = float(scene["time"])
+            events = scene["event"]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ScenarioCompileError(f"Scene #{scene_idx} has invalid time or events : {e}")
+        for event_idx, event in enumerate(events):
+            try:
+                rows.append((t, len(rows), str(event["mapi"]), compile_payload(event["message"])))
+            except (KeyError, TypeError) as e:
+                raise ScenarioCompileError(f"Event #{event_idx} at {t}s has no mapi or message : {e}")
+            except json.JSONDecodeError as e:
+                raise ScenarioCompileError(f"Event #{event_idx} at {t}s has invalid message {event['message']} : {e}")
+    rows.sort()
+
+    topics = []
+    topic_index = {}
+    times = array("d")
+    topic_ids = array("I")
+    payloads = []
+    for t, _, topic, payload in rows:
+        if topic not in topic_index:
+            topic_index[topic] = len(topics)
+            topics.append(topic)
+        times.append(t)
+        topic_ids.append(topic_index[topic])
+        payloads.append(payload)
+    return CompiledScenario(times, topic_ids, topics, payloads)
+
+
+# compile scenario file (compiled scenario is cached next to the scenario file if use_cache is True)
+def compile_scenario_file(path, use_cache:bool=False) -> CompiledScenario:
+    console = ConsoleLogger.get_logger()
+    path = pathlib.Path(path)
+    cache_path = path.with_name(path.name + _CACHE_SUFFIX)
+    stat = path.stat()
+    key = [_CACHE_VERSION, stat.st_size, stat.st_mtime_ns]
+
+    if use_cache and cache_path.is_file():
+        try:
+            with np.load(cache_path) as cached: # arrays only (no pickled objects)
+                if cached["key"].tolist()==key:
+                    return _from_cache(cached)
+        except (OSError, ValueError, KeyError, UnicodeDecodeError) as e:
+            console.warning(f"Ignore scenario cache {cache_path.as_posix()} : {e}")
+
+    with open(path, "r") as sfile:
+        try:
+            scenario = json.load(sfile)
+        except json.JSONDecodeError as e:
+            raise ScenarioCompileError(f"Scenario file read error : {e}")
+    compiled = compile_scenario(scenario)
+
+    if use_cache:
+        try:
+            with open(cache_path, "wb") as cfile:
+                np.savez(cfile, key=np.array(key, dtype=np.int64), **_to_cache(compiled))
+        except OSError as e:
+            console.warning(f"Cannot write scenario cache {cache_path.as_posix()} : {e}")
+    return compiled
+
+'''
+Scenario cache (<scenario>.compiled.npz)
+  key             : cache version, size and mtime(ns) of the scenario file
+  times           : (events) float64
+  topic_ids       : (events) uint32
+  topics          : UTF-8 JSON list of topics
+  payloads        : concatenated payload bytes, payload n is payloads[payload_offsets[n]:payload_offsets[n+1]]
+  payload_offsets : (events+1) int64
+'''
+def _to_cache(compiled:CompiledScenario) -> dict:
+    return {"times":np.frombuffer(compiled.times.tobytes(), dtype=np.float64),
+            "topic_ids":np.array(compiled.topic_ids, dtype=np.uint32),
+            "topics":np.frombuffer(json.dumps(compiled.topics).encode("utf-8"), dtype=np.uint8),
+            "payloads":np.frombuffer(b"".join(compiled.payloads), dtype=np.uint8),
+            "payload_offsets":np.concatenate([[0], np.cumsum([len(p) for p in compiled.payloads], dtype=np.int64)]).astype(np.int64)}
+
+def _from_cache(cached) -> CompiledScenario:
+    times = array("d", cached["times"].astype(np.float64).tolist())
+    topic_ids = array("I", cached["topic_ids"].astype(np.uint32).tolist())
+    topics = json.loads(cached["topics"].tobytes().decode("utf-8"))
+    blob = cached["payloads"].tobytes()
+    offsets = cached["payload_offsets"].tolist()
+    if len(offsets)!=len(times)+1 or len(topic_ids)!=len(times) or any(n>=len(topics) for n in topic_ids):
+        raise ValueError("Inconsistent scenario cache")
+    payloads = [blob[offsets[n]:offsets[n+1]] for n in range(len(times))]
+    return CompiledScenario(times, topic_ids, topics, payloads)
@@ -3,6 +3,9 @@ import cv2
 import pathlib
 import json
 import paho.mqtt.client as mqtt
+import time
+import math
+from array import array
 
 try:
     # using PyQt5
@@ -18,75 +21,115 @@ except ImportError:
     from PyQt6.QtCore import QModelIndex, QObject, Qt, QTimer, QThread, pyqtSignal
 
 from util.logger.console import ConsoleLogger
+from avsim_monitor.scenario_compiler import CompiledScenario, ScenarioCompileError, compile_scenario
 
 
+'''
+Scenario runner with absolute deadlines
+Events are kept in a compiled(sorted) event table. Every event deadline is relative to the monotonic time the scenario started,
+and the (single shot, precise) timer sleeps until the next deadline, so the timer error does not accumulate.
+Firing latency(actual - planned) of every event is reported.
+'''
 class ScenarioRunner(QTimer):
 
-    scenario_start_slot = pyqtSignal(float, str, str) #arguments : time_key, mapi, message
+    scenario_start_slot = pyqtSignal(float, str, bytes) #arguments : time_key, mapi, payload(JSON bytes)
     scenario_stop_slot = pyqtSignal()
+    scenario_latency_slot = pyqtSignal(float, float) #arguments : time_key, firing latency(sec)
 
     def __init__(self, interval_ms):
         super().__init__()
         self.__console = ConsoleLogger.get_logger()
 
-        self.time_interval = interval_ms # default interval_ms = 100ms
-        self.setInterval(interval_ms)
+        self.time_interval = interval_ms # scenario stops after the interval from the last event
+        self.setSingleShot(True)
+        self.setTimerType(Qt.TimerType.PreciseTimer)
         self.timeout.connect(self.on_timeout_callback) # timer callback
-        self.current_time_idx = 0  # time index
-        self.scenario_container = {} # scenario data container
+        self.current_time_idx = 0  # time index (elapsed scenario time in sec)
+        self.scenario = CompiledScenario(array("d"), array("I"), [], []) # compiled scenario event table
         
         self._end_time = 0.0
+        self.__next_event = 0       # index of the next event in the event table
+        self.__start_ns = 0         # monotonic time(ns) at scenario time 0
+        self.__latency = []         # firing latency of fired events
     
     # reset all params    
     def initialize(self):
         self.current_time_idx = 0
-        self.scenario_container.clear()
+        self.scenario = CompiledScenario(array("d"), array("I"), [], [])
+        self.__next_event = 0
+        self.__latency.clear()
+
+    # elapsed scenario time
+    def __elapsed(self) -> float:
+        return (time.monotonic_ns() - self.__start_ns)/1e9
+
+    # sleep until the deadline (scenario time)
+    def __schedule(self, deadline:float):
+        self.start(max(0, math.ceil((deadline - self.__elapsed())*1000)))
         
     # scenario running callback by timeout event
     def on_timeout_callback(self):
-        time_key = round(self.current_time_idx, 1)
-        if self._end_time<self.current_time_idx:
+        times = self.scenario.times
+        while self.__next_event<len(times) and times[self.__next_event]<=self.__elapsed():
+            time_key, mapi, payload = self.scenario.event(self.__next_event)
+            latency = self.__elapsed() - time_key
+            self.scenario_start_slot.emit(time_key, mapi, payload)
+            self.__latency.append(latency)
+            self.scenario_latency_slot.emit(time_key, latency)
+            self.__next_event += 1
+
+        self.current_time_idx = self.__elapsed() # update time index
+        if self.__next_event<len(times):
+            self.__schedule(times[self.__next_event])
+        elif self._end_time+self.time_interval/1000<=self.current_time_idx:
             self.scenario_stop_slot.emit()
         else:
-            if time_key in self.scenario_container.keys():
-                for msg in self.scenario_container[time_key]:
-                    self.scenario_start_slot.emit(time_key, msg["mapi"], msg["message"])
-            
-        self.current_time_idx += self.time_interval/1000 # update time index
+            self.__schedule(self._end_time+self.time_interval/1000)
+
+    # firing latency statistics of the fired events (sec)
+    def get_latency_report(self) -> dict:
+        if not self.__latency:
+            return {"events":0, "mean":0.0, "max":0.0}
+        return {"events":len(self.__latency), "mean":sum(self.__latency)/len(self.__latency), "max":max(self.__latency)}
     
-    # open & load scenario file
-    def load_scenario(self, scenario:dict) -> bool:
+    # load scenario (scenario dict or compiled scenario), payloads are validated here
+    def load_scenario(self, scenario) -> bool:
         self.stop_scenario() # if timer is running, stop the scenario runner
+        self.initialize()
 
         if len(scenario)<1:
             print("> Empty Scenario. Please check your scenario")
             return False
         
         try:
-            if "scenario" in scenario:
-                for scene in scenario["scenario"]:
-                    self.scenario_container[scene["time"]] = [] # time indexed container
-                    for event in scene["event"]: # for every events
-                        self.scenario_container[scene["time"]].append(event) # append event
-            self._end_time = max(list(self.scenario_container.keys()))
+            if not isinstance(scenario, CompiledScenario):
+                scenario = compile_scenario(scenario)
+            self.scenario = scenario
+            self._end_time = scenario.end_time()
 
-        except json.JSONDecodeError as e:
-            print("JSON Decode error", str(e))
+        except ScenarioCompileError as e:
+            self.__console.error(f"Scenario compile error : {e}")
             return False
 
         return True
     
-    # start timer
+    # start timer (resume from the current time index)
     def run_scenario(self):
         if self.isActive(): # if the timer is now active(=running)
             self.stop() # stop the timer
-        self.start() # then restart the timer
+        if self.current_time_idx==0:
+            self.__latency.clear()
+        self.__start_ns = time.monotonic_ns() - int(self.current_time_idx*1e9)
+        self.__schedule(self.scenario.times[self.__next_event] if self.__next_event<len(self.scenario) else self._end_time)
     
     # stop timer
     def stop_scenario(self):
         self.current_time_idx = 0 # timer index set 0
+        self.__next_event = 0
         self.stop() # timer stop
         
     # pause timer
     def pause_scenario(self):
+        if self.isActive():
+            self.current_time_idx = self.__elapsed()
         self.stop() # stop the timer, but timer index does not set 0
\ No newline at end of file
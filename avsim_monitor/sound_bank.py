@@ -0,0 +1,112 @@
+'''
+Lazy Sound Bank (decoded on demand, LRU cache bounded by memory)
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import pathlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pygame import mixer
+
+from util.logger.console import ConsoleLogger
+
+'''
+Sound files are only indexed at startup. A sound is decoded (mixer.Sound, PCM in memory) when it is played first,
+or in the background when a scenario preloads it. Decoded sounds are kept in least-recently-used order and the oldest
+sounds not playing are released when the decoded size exceeds memory_budget_mb.
+'''
+class SoundBank:
+    def __init__(self, path:pathlib.Path, patterns:tuple=("*.mp3",), memory_budget_mb:float=256.0) -> None:
+        self.__console = ConsoleLogger.get_logger()
+
+        self.__files = {}
+        for pattern in patterns:
+            for file in sorted(pathlib.Path(path).glob(pattern)):
+                self.__files[file.name] = file
+        self.__budget = int(memory_budget_mb*1024*1024)
+        self.__sounds = OrderedDict() # name -> (mixer.Sound, decoded bytes), most recently used last
+        self.__loading = {}           # name -> future of the sound being decoded in the background
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.__loader = ThreadPoolExecutor(max_workers=1)
+
+    # indexed sound files (not decoded)
+    def get_files(self) -> list:
+        return list(self.__files.values())
+
+    def has_sound(self, name:str) -> bool:
+        return name in self.__files
+
+    # decoded size in bytes
+    def get_memory(self) -> int:
+        return self.__size
+
+    # decoded sound (decoded now if not cached), None if unknown
+    def get(self, name:str):
+        if name not in self.__files:
+            return None
+        with self.__lock:
+            if name in self.__sounds:
+                self.__sounds.move_to_end(name)
+                return self.__sounds[name][0]
+            future = self.__loading.get(name)
+        if future and not future.cancel(): # being decoded by the preloader
+            return future.result()
+        return self.__load(name) # decoded now, not after the sounds queued for preloading
+
+    # decode sounds in the background (e.g. sounds used by a scenario)
+    def preload(self, names):
+        with self.__lock:
+            for name in names:
+                if name in self.__files and name not in self.__sounds and name not in self.__loading:
+                    self.__loading[name] = self.__loader.submit(self.__load, name)
+
+    # stop the sound if it is decoded
+    def stop(self, name:str):
+        with self.__lock:
+            entry = self.__sounds.get(name)
+        if entry:
+            entry[0].stop()
+
+    def close(self):
+        self.__loader.shutdown(wait=False, cancel_futures=True)
+        with self.__lock:
+            self.__sounds.clear()
+            self.__size = 0
+
+    def __load(self, name:str):
+        try:
+            sound = mixer.Sound(str(self.__files[name]))
+        except Exception as e:
+            self.__console.error(f"Cannot load sound {name} : {e}")
+            sound = None
+        with self.__lock:
+            self.__loading.pop(name, None)
+            if sound is None:
+                return None
+            if name in self.__sounds: # decoded by another thread meanwhile
+                self.__sounds.move_to_end(name)
+                return self.__sounds[name][0]
+            size = self.__decoded_size(sound)
+            self.__sounds[name] = (sound, size)
+            self.__size += size
+            self.__evict()
+        return sound
+
+    # release least recently used sounds not playing (the newest sound is always kept)
+    def __evict(self):
+        for name in list(self.__sounds.keys())[:-1]:
+            if self.__size<=self.__budget:
+                break
+            sound, size = self.__sounds[name]
+            if sound.get_num_channels()>0: # playing
+                continue
+            del self.__sounds[name]
+            self.__size -= size
+
+    # PCM size of the sound in the mixer format
+    @staticmethod
+    def __decoded_size(sound) -> int:
+        frequency, bits, channels = mixer.get_init()
+        return int(sound.get_length()*frequency)*channels*(abs(bits)//8)
@@ -8,10 +8,8 @@ import cv2
 import pathlib
 import json
 import time
-import paho.mqtt.client as mqtt
 from datetime import datetime
 from pygame import mixer
-import csv
 
 try:
     # using PyQt5
@@ -27,8 +25,15 @@ except ImportError:
     from PyQt6.QtCore import QModelIndex, QObject, Qt, QTimer, QThread, pyqtSignal
 
 from util.logger.console import ConsoleLogger
+from util.logger.csv import CSVWriterService
+from util.logger.journal import JournalWriter, Source
 from avsim_monitor.scenario_runner import ScenarioRunner
-from device.eyetracker.neon import neon_controller
+from avsim_monitor.scenario_compiler import compile_scenario_file, ScenarioCompileError
+from avsim_monitor.preview import PreviewRenderer
+from avsim_monitor.messenger import MQTTMessenger
+from avsim_monitor.mapi import MapiDispatcher
+from avsim_monitor.sound_bank import SoundBank
+from device.eyetracker.neon_async import NeonAsyncController
 from device.camera.uvc import Controller as camera_controller
 
 '''
@@ -69,6 +74,10 @@ class AppWindow(QMainWindow):
                 self.btn_show_home.clicked.connect(self.on_btn_show_home) # go home
                 self.btn_show_nback.clicked.connect(self.on_btn_show_nback) # go nback
 
+                # camera preview renderer (downscaled previews at preview rate)
+                self.__preview_renderer = PreviewRenderer(preview_fps=config.get("preview_fps", 10))
+                self.__preview_renderer.preview_update_signal.connect(self.on_camera_frame_update)
+
                 # map between camera device and windows
                 self.__frame_window_map = {}
                 self.__camera_device_map = {}
@@ -76,13 +85,16 @@ class AppWindow(QMainWindow):
                     self.__frame_window_map[id] = self.findChild(QLabel, config["camera_windows"][idx])
                     self.__camera_device_map[id] = camera_controller(id)
                     if self.__camera_device_map[id].open(): # ok
-                        self.__camera_device_map[id].frame_update_signal.connect(self.on_camera_frame_update)
+                        label_size = self.__frame_window_map[id].size()
+                        self.__preview_renderer.add_camera(id, self.__camera_device_map[id], (label_size.width(), label_size.height()))
+                        self.__camera_device_map[id].frame_update_signal.connect(self.__preview_renderer.on_frame_update, Qt.ConnectionType.DirectConnection)
                         if "camera_startup" in config:
                             if config["camera_startup"]:
                                 self.__camera_device_map[id].begin()
                     else:
                         self.__camera_device_map[id].close()
                         del self.__camera_device_map[id]
+                self.__preview_renderer.start()
 
                 # scenario model
                 self.scenario_table_columns = ["Time(s)", "Message API", "Payload"]
@@ -90,14 +102,15 @@ class AppWindow(QMainWindow):
                 self.scenario_model.setColumnCount(len(self.scenario_table_columns))
                 self.scenario_model.setHorizontalHeaderLabels(self.scenario_table_columns)
                 self.table_scenario_contents.setModel(self.scenario_model)
+                self.__scenario_time_rows = {}     # event time -> rows (range) on the scenario table
+                self.__scenario_marked_rows = range(0) # currently marked rows
 
                 # MQTT Connections
-                self.mq_client = mqtt.Client(client_id="avsim_monitor", transport='tcp', protocol=mqtt.MQTTv311, clean_session=True)
-                self.mq_client.on_connect = self.on_mqtt_connect
-                self.mq_client.on_message = self.on_mqtt_message
-                self.mq_client.on_disconnect = self.on_mqtt_disconnect
-                self.mq_client.connect_async(config["broker_ip"], port=1883, keepalive=60)
-                self.mq_client.loop_start()
+                self.mq_client = MQTTMessenger(client_id="avsim_monitor", broker_ip=config["broker_ip"], subscribe_topics=config["subscribe_topics"], qos_policy=config.get("publish_qos"))
+                self.mq_client.connected_signal.connect(self.on_mqtt_connect)
+                self.mq_client.message_received_signal.connect(self.on_mqtt_message)
+                self.mq_client.disconnected_signal.connect(self.on_mqtt_disconnect)
+                self.mq_client.start()
                 for topic in config["subscribe_topics"]:
                     self.__console.info(f"subscribe topic : {topic}")
 
@@ -109,15 +122,16 @@ class AppWindow(QMainWindow):
                 # eyetracker device discovery
                 self.__eyetracker = None
                 if config["use_eyetracker"]:
-                    self.__eyetracker = neon_controller(config)
+                    self.__eyetracker = NeonAsyncController(config)
                     self.__eyetracker.status_update_signal.connect(self.on_eyetracker_status_update)
-                    self.__eyetracker.device_discover()
+                    self.__eyetracker.record_started_signal.connect(self.on_eyetracker_record_started)
+                    self.__eyetracker.device_discover() # non-blocking
 
                 # load sound resource
                 mixer.init()
                 sound_path = pathlib.Path(self.config["root_path"])/pathlib.Path(self.config["sound_resource_path"])
-                self.sound_files = list(sound_path.glob(f"*.mp3"))
-                self.__resource_sound = {}
+                self.__sound_bank = SoundBank(sound_path, memory_budget_mb=self.config.get("sound_memory_budget_mb", 256)) # files are decoded on demand
+                self.sound_files = self.__sound_bank.get_files()
                 sound_resource_table_columns = ["Sound Resources"]
                 self.__sound_resource_model = QStandardItemModel()
                 self.__sound_resource_model.setColumnCount(len(sound_resource_table_columns))
@@ -134,12 +148,15 @@ class AppWindow(QMainWindow):
                     "flame/avsim/mixer/mapi_play": self.mapi_sound_play, # sound play
                     "flame/avsim/mixer/mapi_stop": self.mapi_sound_stop # sound stop
                 }
-
-                # log files & writer
-                self.nback_logfile = None
-                self.nback_logfile_writer = None
-                self.scenario_logfile = None
-                self.scenario_logfile_writer = None
+                self.__mapi_dispatcher = MapiDispatcher()
+                self.__mapi_dispatcher.register_all(self.message_api)
+                self.mq_client.set_topic_filter(self.__mapi_dispatcher.has_handler) # drop unknown topics on messenger thread
+
+                # log files & writer (rows are written on the writer thread)
+                self.__log_writer = CSVWriterService(flush_interval=config.get("log_flush_interval", 1.0), durability=config.get("log_durability", "flush"))
+                self.nback_log = None
+                self.scenario_log = None
+                self.__journal = None # session journal (scenario history, n-back responses and frame timestamps)
                 
 
         except Exception as e:
@@ -152,17 +169,23 @@ class AppWindow(QMainWindow):
         if self.__eyetracker:
             self.__eyetracker.close()
 
-        for camera in self.__camera_device_map.values():
+        self.__preview_renderer.close()
+        self.mq_client.close()
+        self.__log_mapi_latency()
+        self.__sound_bank.close()
+        for camera in self.__camera_device_map.values(): # recordings are stopped and written before the logs are closed
             camera.close()
 
-        # close log file
-        if self.nback_logfile:
-            self.nback_logfile.flush()
-            self.nback_logfile.close()
+        # close log file (queued rows are written)
+        if self.nback_log:
+            self.nback_log.close()
+
+        if self.scenario_log:
+            self.scenario_log.close()
+        self.__log_writer.close()
 
-        if self.scenario_logfile:
-            self.scenario_logfile.flush()
-            self.scenario_logfile.close()
+        if self.__journal:
+            self.__journal.close()
             
         return super().closeEvent(event)
 
@@ -172,25 +195,41 @@ class AppWindow(QMainWindow):
     def on_scenario_open(self):
         selected_file = QFileDialog.getOpenFileName(self, 'Open scenario file', './')
         if selected_file[0]:
-            sfile = open(selected_file[0], "r")
             self.scenario_filepath = selected_file[0]
+            self.__load_scenario_file(self.scenario_filepath)
+
+    '''
+    Compile scenario file and show on the scenario table
+    '''
+    def __load_scenario_file(self, path):
+        try:
+            compiled = compile_scenario_file(path, use_cache=self.config.get("scenario_cache", False))
+        except (OSError, ScenarioCompileError) as e:
+            QMessageBox.critical(self, "Error", "Scenario file read error {}".format(str(e)))
+            return
             
-            with sfile:
+        # load compiled scenario
+        self.runner.load_scenario(compiled)
+        self.scenario_model.setRowCount(0)
+        self.__scenario_time_rows.clear()
+        self.__scenario_marked_rows = range(0)
+        for row, (time_key, mapi, payload) in enumerate(compiled.events()):
+            self.scenario_model.appendRow([QStandardItem(str(time_key)), QStandardItem(mapi), QStandardItem(payload.decode("utf-8"))])
+            first = self.__scenario_time_rows.get(time_key, range(row, row)).start # events are sorted by time
+            self.__scenario_time_rows[time_key] = range(first, row+1)
+
+        # table view column width resizing
+        self.table_scenario_contents.resizeColumnsToContents()
+
+        # decode sounds of the scenario in the background
+        sounds = []
+        for _, mapi, payload in compiled.events():
+            if mapi=="flame/avsim/mixer/mapi_play":
                 try:
-                    scenario_data = json.load(sfile)
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", "Scenario file read error {}".format(str(e)))
-                    
-                # parse scenario file
-                self.runner.load_scenario(scenario_data)
-                self.scenario_model.setRowCount(0)
-                if "scenario" in scenario_data:
-                    for data in scenario_data["scenario"]:
-                        for event in data["event"]:
-                            self.scenario_model.appendRow([QStandardItem(str(data["time"])), QStandardItem(event["mapi"]), QStandardItem(event["message"])])
-
-                # table view column width resizing
-                self.table_scenario_contents.resizeColumnsToContents()
+                    sounds.append(json.loads(payload)["file"])
+                except (ValueError, KeyError, TypeError):
+                    pass
+        self.__sound_bank.preload(sounds)
 
     def on_btn_show_wifi_qr(self):
         """ show wifi QR code on center display"""
@@ -212,23 +251,7 @@ class AppWindow(QMainWindow):
         """load full scenario """
         self.scenario_filepath = pathlib.Path(self.config["root_path"]) / "scenario" / "0_full_scenario.json"
         print(f"Load Full Scenario : {self.scenario_filepath.as_posix()}")
-        sfile = open(self.scenario_filepath, "r")
-        with sfile:
-            try:
-                scenario_data = json.load(sfile)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", "Scenario file read error {}".format(str(e)))
-                
-            # parse scenario file
-            self.runner.load_scenario(scenario_data)
-            self.scenario_model.setRowCount(0)
-            if "scenario" in scenario_data:
-                for data in scenario_data["scenario"]:
-                    for event in data["event"]:
-                        self.scenario_model.appendRow([QStandardItem(str(data["time"])), QStandardItem(event["mapi"]), QStandardItem(event["message"])])
-
-            # table view column width resizing
-            self.table_scenario_contents.resizeColumnsToContents()
+        self.__load_scenario_file(self.scenario_filepath)
 
     '''
     Scenario Start Event Callback Function
@@ -241,9 +264,7 @@ class AppWindow(QMainWindow):
         
         # stamp time
         tstamp = datetime.now()
-        if self.scenario_logfile_writer:
-            self.scenario_logfile_writer.writerow([str(tstamp.timestamp()), "scenario start"])
-            self.scenario_logfile.flush()
+        self.__log_scenario(tstamp, "scenario start")
         
         # show start timestamp
         self.label_simulation_start_at.setText(tstamp.strftime("%Y-%m-%d %H:%M:%S"))
@@ -261,19 +282,21 @@ class AppWindow(QMainWindow):
 
         # all sound stop & clear
         for sound in self.__sound_playing_list:
-            self.__resource_sound[sound].stop()
+            self.__sound_bank.stop(sound)
         self.__sound_playing_list.clear()
 
         # stamp time
         tstamp = datetime.now()
-        if self.scenario_logfile_writer:
-            self.scenario_logfile_writer.writerow([str(tstamp.timestamp()), "scenario end"])
-            self.scenario_logfile.flush()
+        self.__log_scenario(tstamp, "scenario end")
 
         # show start timestamp
         self.label_simulation_end_at.setText(tstamp.strftime("%Y-%m-%d %H:%M:%S"))
 
         self.runner.stop_scenario()
+        latency = self.runner.get_latency_report()
+        self.__console.info(f"Scenario events : {latency['events']}, firing latency mean {latency['mean']*1000:.2f}ms, max {latency['max']*1000:.2f}ms")
+        metrics = self.mq_client.get_metrics()
+        self.__console.info(f"MQTT published : {metrics['published']}, ack latency mean {metrics['ack_latency_mean_ms']:.2f}ms, max {metrics['ack_latency_max_ms']:.2f}ms, max queue depth {metrics['max_queue_depth']}")
         self.on_eyetracker_stop() # eyetracker record stop
         self.on_camera_record_stop() # camera record stop
         self.__show_on_statusbar("Scenario is stopped.")
@@ -282,9 +305,10 @@ class AppWindow(QMainWindow):
     Scenario table mark row reset
     '''
     def __scenario_mark_row_reset(self):
-        for col in range(self.scenario_model.columnCount()):
-            for row in range(self.scenario_model.rowCount()):
+        for row in self.__scenario_marked_rows: # only the marked rows
+            for col in range(self.scenario_model.columnCount()):
                 self.scenario_model.item(row,col).setBackground(QColor(0,0,0,0))
+        self.__scenario_marked_rows = range(0)
 
     '''
     Scenario table mark colored
@@ -302,21 +326,16 @@ class AppWindow(QMainWindow):
     '''
     MQTT event callback
     '''
-    def on_mqtt_connect(self, mqttc, obj, flags, rc):
-        for topic in self.config["subscribe_topics"]:
-            self.mq_client.subscribe(topic, 2)
+    def on_mqtt_connect(self, rc):
         self.__show_on_statusbar("Connected to Broker({})".format(str(rc)))
         
-    def on_mqtt_disconnect(self, mqttc, userdata, rc):
+    def on_mqtt_disconnect(self, rc):
         self.__show_on_statusbar("Disconnected to Broker({})".format(str(rc)))
 
-    def on_mqtt_message(self, mqttc, userdata, msg):
-        mapi = str(msg.topic)
-        
+    # (called on GUI thread through messenger signal)
+    def on_mqtt_message(self, mapi:str, message:bytes):
         try:
-            if mapi in self.message_api.keys():
-                payload = json.loads(msg.payload)          
-                self.message_api[mapi](payload)
+            if self.__mapi_dispatcher.dispatch(mapi, message):
                 self.__console.info(f"call mapi : {mapi}")
             else:
                 self.__console.warning(f"Unknown Message API was called : {mapi}")
@@ -328,6 +347,11 @@ class AppWindow(QMainWindow):
     enroll new subject button click event callback
     '''
     def on_new_subject(self):
+        # recorders write into the logs of the current subject
+        if any(camera.is_recording() for camera in self.__camera_device_map.values()):
+            QMessageBox.warning(self, "Warning", "Camera recording is in progress. Stop recording before enrolling a new subject.")
+            return
+
         subject_name = self.findChild(QLineEdit, name="edit_subject_name").text()
         target_path = pathlib.Path(self.config["root_path"])/pathlib.Path(self.config["save_path"])/pathlib.Path(subject_name)/pathlib.Path(datetime.now().strftime("%Y-%m-%d-%H-%M-%S"))
         self.config["target_workspace"] = target_path.as_posix()
@@ -336,27 +360,32 @@ class AppWindow(QMainWindow):
         self.label_simulation_data_path.setText(target_path.as_posix())
         self.__show_on_statusbar(f"Created {target_path.as_posix()}")
 
-        # create logfile (nback task)
-        self.nback_logfile = open(target_path/"nback_response.csv", "a")
-        self.nback_logfile_writer = csv.writer(self.nback_logfile)
+        # close logfiles of the previous subject
+        for log in (self.nback_log, self.scenario_log, self.__journal):
+            if log:
+                log.close()
 
-        # create logfile (scenario)
-        self.scenario_logfile = open(target_path/"scenario_history.csv", "a")
-        self.scenario_logfile_writer = csv.writer(self.scenario_logfile)
+        # create session journal (scenario history, n-back responses and frame timestamps)
+        self.__journal = JournalWriter(target_path/"session.jrnl") if self.config.get("session_journal", True) else None
+
+        # create csv logfiles (nback task, scenario) unless disabled
+        self.nback_log = self.__log_writer.open(target_path/"nback_response.csv", "a") if self.__is_csv_logged() else None
+        self.scenario_log = self.__log_writer.open(target_path/"scenario_history.csv", "a") if self.__is_csv_logged() else None
 
         # initialize
         self.label_simulation_start_at.setText("")
         self.label_simulation_end_at.setText("")
 
 
-    def do_scenario_process(self, time, mapi, message):
-        message = message.replace("'", '"')
-        self.mq_client.publish(mapi, message, 2) # publish mapi interface
+    def do_scenario_process(self, time, mapi, payload):
+        self.mq_client.publish(mapi, payload) # publish mapi interface (payload is compiled on scenario load, QoS by policy)
 
-        self.__scenario_mark_row_reset()
-        for row in range(self.scenario_model.rowCount()):
-            if time == float(self.scenario_model.item(row, 0).text()):
+        rows = self.__scenario_time_rows.get(time, range(0))
+        if rows!=self.__scenario_marked_rows: # events of the same time are marked once
+            self.__scenario_mark_row_reset()
+            for row in rows:
                 self.__scenario_mark_row_color(row)
+            self.__scenario_marked_rows = rows
 
 
     '''
@@ -376,21 +405,18 @@ class AppWindow(QMainWindow):
         self.label_eyetracker_free_storage.setText(f"{status['free_storage']:.1f}GB")
         self.label_eyetracker_memory_state.setText(status["memory_state"])
 
-    # show camera grabbed image
-    def on_camera_frame_update(self, camera_id, frame, fps):
-        frame_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        t = datetime.now()
-        cv2.putText(frame_image, t.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3], (10, 1070), cv2.FONT_HERSHEY_SIMPLEX, 2.0, (0,255,0), 2, cv2.LINE_AA)
-        cv2.putText(frame_image, f"Camera #{camera_id}(fps:{fps:.1f})", (10,50), cv2.FONT_HERSHEY_SIMPLEX, 2.0, (1,255,0), 2, cv2.LINE_AA)
-
-        h, w, ch = frame_image.shape
-        qt_image = QImage(frame_image.data, w, h, ch*w, QImage.Format.Format_RGB888)
-        pixmap = QPixmap.fromImage(qt_image)
+    # show camera preview image (rendered by preview renderer)
+    def on_camera_frame_update(self, camera_id, qt_image):
         try:
-            self.__frame_window_map[camera_id].setPixmap(pixmap.scaled(self.__frame_window_map[camera_id].size(), Qt.AspectRatioMode.KeepAspectRatio))
+            window = self.__frame_window_map[camera_id]
+            window.setPixmap(QPixmap.fromImage(qt_image))
+            window_size = (window.width(), window.height())
+            if window_size!=self.__preview_renderer.get_preview_size(camera_id): # window resized (width or height)
+                self.__preview_renderer.set_preview_size(camera_id, window_size)
         except Exception as e:
             self.__console.error(e)
+        finally:
+            self.__preview_renderer.preview_consumed(camera_id)
 
 
     # eyetracker custom event callback
@@ -400,47 +426,49 @@ class AppWindow(QMainWindow):
 
     def on_eyetracker_record(self):
         if self.config["use_eyetracker"] and self.__eyetracker:
-            record_id = self.__eyetracker.record_start()
-
-            tstamp = datetime.now()
-            if self.scenario_logfile_writer:
-                self.scenario_logfile_writer.writerow([str(tstamp.timestamp()), f"Eyetracker start recording : {record_id}"])
-                self.scenario_logfile.flush()
-            
+            self.__eyetracker.record_start() # recording id comes with record_started_signal
+            if "target_workspace" in self.config.keys():
+                self.__eyetracker.start_capture(self.config["target_workspace"]) # gaze/IMU samples in the workspace
         else:
             self.__console.warning("Eyetracker device either not available or disabled")
             #QMessageBox.warning(self, "Warning", "Eyetracker device either not available or disabled")
 
+    # eyetracker recording started on the device
+    def on_eyetracker_record_started(self, record_id:str):
+        tstamp = datetime.now()
+        self.__log_scenario(tstamp, f"Eyetracker start recording : {record_id}")
+
     def on_eyetracker_stop(self):
         if self.__eyetracker:
             self.__eyetracker.record_stop()
-            self.__console.info("Eyetracker record stopped")
+            self.__eyetracker.stop_capture()
+            self.__console.info("Eyetracker record stop requested")
         
 
     def on_load_sound_resource(self):
         self.__sound_resource_model.setRowCount(0)
         for resource in self.sound_files:
             self.__sound_resource_model.appendRow([QStandardItem(str(resource.name))])
-            self.__resource_sound[resource.name] = mixer.Sound(str(resource))
         self.table_sound_files.resizeColumnsToContents()
     
     def sound_play(self, filename:str, volume:float=1.0, ):
         if filename in self.__sound_playing_list:
             print("already plyaying.., Now stopping the sound")
-            self.__resource_sound[filename].stop()
+            self.__sound_bank.stop(filename)
             index = self.__sound_playing_list.index(filename)
             self.__sound_playing_list.pop(index)
 
-        if filename in self.__resource_sound.keys():
+        sound = self.__sound_bank.get(filename) # decoded on first use
+        if sound:
             self.__sound_playing_list.append(filename)
-            self.__resource_sound[filename].set_volume(volume)
-            self.__resource_sound[filename].play()
+            sound.set_volume(volume)
+            sound.play()
             # row_index = self.resource_model.findItems(filename, Qt.MatchFlag.MatchExactly, 0)[0].row()
 
     def on_dbclick_sound_select(self):
         row = self.table_sound_files.currentIndex().row()
 
-        if self.sound_files[row].name in self.__resource_sound.keys():
+        if self.__sound_bank.has_sound(self.sound_files[row].name):
             self.sound_play(self.sound_files[row].name)
 
             # self.__currnet_playing_sound = self.sound_files[row].name
@@ -449,7 +477,7 @@ class AppWindow(QMainWindow):
 
     def on_sound_stop(self, filename:str):
         if filename in self.__sound_playing_list:
-            self.__resource_sound[filename].stop()
+            self.__sound_bank.stop(filename)
             self.__console.info(f"Sound stop : {filename}")
             if filename in self.__sound_playing_list:
                 idx = self.__sound_playing_list.index(filename)
@@ -465,7 +493,7 @@ class AppWindow(QMainWindow):
         if "target_workspace" in self.config.keys():
             for camera in self.__camera_device_map.values():
                 self.__console.info(f"Start Recording (ID : {camera.get_camera_id()}")
-                camera.start_recording(self.config["target_workspace"])
+                camera.start_recording(self.config["target_workspace"], self.config.get("record_queue_size", 30), self.config.get("record_policy", "drop_oldest"), self.config.get("record_format", "mjpg"), self.__log_writer if self.__is_csv_logged() else None, self.__journal)
         else:
             QMessageBox.critical(self, "Error", "Workspace is not specified. Please enroll the subject.")
         
@@ -476,11 +504,40 @@ class AppWindow(QMainWindow):
             camera.stop_recording()
             
     
-    # nback log via message api
+    # handler latency of message api topics (count, mean, max and the smallest bucket holding 99% of the calls)
+    def __log_mapi_latency(self):
+        for topic_filter, hist in self.__mapi_dispatcher.get_latency_histograms().items():
+            if hist["count"]==0:
+                continue
+            calls, p99 = 0, None
+            for bound, count in hist["buckets"].items():
+                calls += count
+                if calls>=0.99*hist["count"]:
+                    p99 = bound
+                    break
+            self.__console.info(f"MAPI {topic_filter} : {hist['count']} calls, mean {hist['mean_ms']:.2f}ms, max {hist['max_ms']:.2f}ms, 99% <= {p99}ms")
+
+    # csv logs are written next to the session journal unless disabled (log_csv), always without the journal
+    def __is_csv_logged(self) -> bool:
+        return self.config.get("log_csv", True) or not self.config.get("session_journal", True)
+
+    # write scenario history (session journal, csv unless disabled)
+    def __log_scenario(self, tstamp:datetime, text:str):
+        if self.__journal:
+            self.__journal.append_text(Source.SCENARIO, text, wall_ns=int(tstamp.timestamp()*1e9))
+        if self.scenario_log:
+            self.scenario_log.write_row([str(tstamp.timestamp()), text])
+
+    # nback log via message api (session journal with the device timestamp, csv unless disabled)
     def mapi_nback_log(self, payload:dict):
-        if self.nback_logfile_writer:
-            self.nback_logfile_writer.writerow([payload["timestamp"], payload["message"]])
-            self.nback_logfile.flush()
+        if self.__journal:
+            try:
+                wall_ns = int(float(payload["timestamp"])*1e9)
+            except (KeyError, TypeError, ValueError):
+                wall_ns = None # time of receipt
+            self.__journal.append_text(Source.NBACK, str(payload["message"]), wall_ns=wall_ns)
+        if self.nback_log:
+            self.nback_log.write_row([payload["timestamp"], payload["message"]])
 
     # camera record start via message api
     def mapi_camera_record_start(self, payload:dict):
@@ -501,4 +558,4 @@ class AppWindow(QMainWindow):
     # go url
     def mapi_set_url(self, payload:dict):
         json_data = json.dumps(payload)
-        self.mq_client.publish("flame/avsim/cabinview/mapi_set_url", json_data, 2) # publish mapi interface
\ No newline at end of file
+        self.mq_client.publish("flame/avsim/cabinview/mapi_set_url", json_data) # publish mapi interface
\ No newline at end of file
@@ -0,0 +1,115 @@
+'''
+Shared Memory Frame Ring Buffer
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+from multiprocessing import shared_memory
+import numpy as np
+from typing import Tuple, Optional
+
+_HEADER_FIELDS = 4  # slots, height, width, channels
+_ALIGN = 64         # frame slots start on a cache line boundary
+
+'''
+Preallocated frame ring on shared memory.
+A single grab thread writes frames into fixed slots, consumers(GUI, recorder, HPE) read them by (slot, sequence).
+Every slot carries the sequence number of the frame it holds. The writer invalidates the slot before it overwrites it,
+so a reader can check that the frame it got is still the one it was notified about (seqlock).
+'''
+class FrameRing:
+    def __init__(self, shape:Tuple[int,int,int]=None, slots:int=8, name:str=None, create:bool=True) -> None:
+        if create:
+            if shape is None:
+                raise ValueError("Frame shape is required to create a frame ring")
+            if len(shape)==2:
+                shape = (shape[0], shape[1], 1)
+            header_size = FrameRing.__header_size(slots)
+            frame_size = int(np.prod(shape))
+            self.__shm = shared_memory.SharedMemory(name=name, create=True, size=header_size+frame_size*slots)
+            self.__header = np.ndarray((_HEADER_FIELDS+1+slots,), dtype=np.int64, buffer=self.__shm.buf)
+            self.__header[:] = 0
+            self.__header[:_HEADER_FIELDS] = (slots, *shape)
+        else:
+            self.__shm = shared_memory.SharedMemory(name=name, create=False)
+            self.__header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=self.__shm.buf)
+            slots = int(self.__header[0])
+            shape = tuple(int(v) for v in self.__header[1:_HEADER_FIELDS])
+            del self.__header
+            self.__header = np.ndarray((_HEADER_FIELDS+1+slots,), dtype=np.int64, buffer=self.__shm.buf)
+
+        self.__owner = create
+        self.__slots = slots
+        self.__shape = tuple(shape)
+        self.__head = self.__header[_HEADER_FIELDS:_HEADER_FIELDS+1]  # sequence of the last committed frame
+        self.__seq = self.__header[_HEADER_FIELDS+1:]                  # sequence per slot (0 = empty or being written)
+        self.__frames = np.ndarray((slots, *self.__shape), dtype=np.uint8, buffer=self.__shm.buf, offset=FrameRing.__header_size(slots))
+
+    # attach to the frame ring created by another process
+    @classmethod
+    def attach(cls, name:str):
+        return cls(name=name, create=False)
+
+    @staticmethod
+    def __header_size(slots:int) -> int:
+        size = (_HEADER_FIELDS+1+slots)*np.dtype(np.int64).itemsize
+        return (size+_ALIGN-1)//_ALIGN*_ALIGN
+
+    # shared memory name (to attach from other processes)
+    def get_name(self) -> str:
+        return self.__shm.name
+
+    def get_shape(self) -> Tuple[int,int,int]:
+        return self.__shape
+
+    def get_slots(self) -> int:
+        return self.__slots
+
+    # reserve next slot for writing. returns (slot, sequence, writable view of the slot)
+    def acquire(self) -> Tuple[int, int, np.ndarray]:
+        seq = int(self.__head[0])+1
+        slot = seq%self.__slots
+        self.__seq[slot] = 0 # invalidate before overwriting
+        return (slot, seq, self.__frames[slot])
+
+    # publish the frame written into the acquired slot
+    def commit(self, slot:int, seq:int) -> None:
+        self.__seq[slot] = seq
+        self.__head[0] = seq
+
+    # copy a frame into the next slot
+    def write(self, frame:np.ndarray) -> Tuple[int, int]:
+        slot, seq, buffer = self.acquire()
+        np.copyto(buffer, frame.reshape(buffer.shape))
+        self.commit(slot, seq)
+        return (slot, seq)
+
+    # (slot, sequence) of the most recent frame, sequence is 0 if nothing was written yet
+    def latest(self) -> Tuple[int, int]:
+        seq = int(self.__head[0])
+        return (seq%self.__slots, seq)
+
+    # check the slot still holds the frame of the given sequence
+    def is_valid(self, slot:int, seq:int) -> bool:
+        return seq>0 and int(self.__seq[slot])==seq
+
+    # read-only view of the frame in the slot, None if it was already overwritten
+    # (call is_valid() again after using the view to detect a torn read)
+    def read(self, slot:int, seq:int) -> Optional[np.ndarray]:
+        if not self.is_valid(slot, seq):
+            return None
+        view = self.__frames[slot].view()
+        view.flags.writeable = False
+        return view
+
+    # release shared memory (owner also unlinks it)
+    def close(self) -> None:
+        if self.__shm is None:
+            return
+        del self.__head, self.__seq, self.__frames, self.__header
+        try:
+            if self.__owner:
+                self.__shm.unlink()
+            self.__shm.close()
+        except (BufferError, FileNotFoundError): # views still held by consumers are released by GC
+            pass
+        self.__shm = None
@@ -0,0 +1,150 @@
+'''
+Multi Camera Frame Synchronizer
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import time
+import threading
+import collections
+from typing import Iterable, Callable
+
+'''
+Frames of all cameras taken at the same time (frames are referenced, not copied)
+Frames are pooled buffers of the grabber : every consumer calls release() when it is done with the bundle, the frames
+are given back to the pool when the last consumer released it (retain() adds consumers).
+'''
+class FrameBundle:
+    def __init__(self, timestamp_ns:int, frames:dict, timestamps:dict, missing:tuple, release:Callable=None) -> None:
+        self.timestamp_ns = timestamp_ns    # reference timestamp of the bundle (oldest frame)
+        self.frames = frames                # camera id -> frame
+        self.timestamps = timestamps        # camera id -> frame timestamp(ns)
+        self.missing = missing              # camera ids without frame in this bundle
+        self.__release = release            # release(camera id, frame) of the frame owner
+        self.__refs = 1
+        self.__lock = threading.Lock()
+
+    # add consumers of the bundle
+    def retain(self, count:int=1):
+        with self.__lock:
+            self.__refs += count
+
+    # the consumer is done with the frames (frames must not be used afterwards)
+    def release(self):
+        with self.__lock:
+            if self.__refs<=0:
+                return
+            self.__refs -= 1
+            if self.__refs>0:
+                return
+        if self.__release:
+            for camera_id, frame in self.frames.items():
+                self.__release(camera_id, frame)
+
+    def is_complete(self) -> bool:
+        return len(self.missing)==0
+
+    # timestamp difference between the oldest and newest frame
+    def spread_ns(self) -> int:
+        if not self.timestamps:
+            return 0
+        return max(self.timestamps.values()) - min(self.timestamps.values())
+
+# what to do with a bundle if some cameras have no frame within the tolerance
+class SyncPolicy:
+    PARTIAL = "partial" # emit the bundle without the missing cameras
+    DROP = "drop"       # drop the incomplete bundle
+
+'''
+Groups frames of N cameras into bundles by timestamp.
+Frames whose timestamps are within the tolerance from the oldest pending frame make a bundle.
+A camera is missing for a bundle if its next frame is already newer than the tolerance window, or if it does not deliver
+a frame within max_wait. Frames older than the last emitted bundle are late and dropped.
+Dropped frames are given back with release(camera id, frame), bundles release their frames the same way (FrameBundle.release).
+(device timestamps of different cameras are comparable only if the camera clocks are synchronized, e.g. PTP)
+'''
+class FrameSynchronizer:
+    def __init__(self, camera_ids:Iterable[int], tolerance_ns:int, max_wait_ns:int, policy:str=SyncPolicy.PARTIAL, max_pending:int=8, release:Callable=None) -> None:
+        if policy not in (SyncPolicy.PARTIAL, SyncPolicy.DROP):
+            raise ValueError(f"Unknown sync policy : {policy}")
+
+        self.__camera_ids = tuple(camera_ids)
+        self.__tolerance_ns = tolerance_ns
+        self.__max_wait_ns = max_wait_ns
+        self.__policy = policy
+        self.__max_pending = max_pending
+        self.__release = release if release else (lambda camera_id, frame: None)
+        self.__pending = {cid:collections.deque() for cid in self.__camera_ids} # (timestamp, frame, arrival monotonic ns)
+        self.__last_bundle_ns = None
+        self.__stats = {"complete":0, "partial":0, "dropped":0, "late":0, "overflow":0}
+
+    # add a grabbed frame, returns bundles completed by this frame
+    def push(self, camera_id:int, frame, timestamp_ns:int, arrival_ns:int=None) -> list:
+        if arrival_ns is None:
+            arrival_ns = time.monotonic_ns()
+        if camera_id not in self.__pending:
+            self.__camera_ids += (camera_id,)
+            self.__pending[camera_id] = collections.deque()
+
+        if self.__last_bundle_ns is not None and timestamp_ns<=self.__last_bundle_ns:
+            self.__stats["late"] += 1
+            self.__release(camera_id, frame)
+            return []
+
+        pending = self.__pending[camera_id]
+        pending.append((timestamp_ns, frame, arrival_ns))
+        if len(pending)>self.__max_pending: # consumer of other cameras stalled
+            _, dropped, _ = pending.popleft()
+            self.__release(camera_id, dropped)
+            self.__stats["overflow"] += 1
+        return self.poll(arrival_ns)
+
+    # assemble bundles that are complete or timed out
+    def poll(self, now_ns:int=None) -> list:
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        bundles = []
+        while True:
+            heads = [q[0] for q in self.__pending.values() if q]
+            if not heads:
+                break
+            ref_ns = min(head[0] for head in heads)
+
+            group = {}
+            missing = []
+            waiting = False
+            for cid in self.__camera_ids:
+                q = self.__pending[cid]
+                if q and q[0][0]<=ref_ns+self.__tolerance_ns:
+                    group[cid] = q[0]
+                else:
+                    missing.append(cid)
+                    waiting = waiting or not q # frame may still arrive
+
+            if missing and waiting:
+                oldest_arrival = min(entry[2] for entry in group.values())
+                if now_ns-oldest_arrival<self.__max_wait_ns:
+                    break # wait for the missing cameras
+
+            for cid in group:
+                self.__pending[cid].popleft()
+            self.__last_bundle_ns = max(entry[0] for entry in group.values())
+
+            if not missing:
+                self.__stats["complete"] += 1
+            elif self.__policy==SyncPolicy.DROP:
+                self.__stats["dropped"] += 1
+                for cid, entry in group.items():
+                    self.__release(cid, entry[1])
+                continue
+            else:
+                self.__stats["partial"] += 1
+            bundles.append(FrameBundle(ref_ns,
+                                       {cid:entry[1] for cid, entry in group.items()},
+                                       {cid:entry[0] for cid, entry in group.items()},
+                                       tuple(missing),
+                                       self.__release))
+        return bundles
+
+    # bundle statistics (complete, partial, dropped bundles and late, overflow frames)
+    def get_stats(self) -> dict:
+        return dict(self.__stats)
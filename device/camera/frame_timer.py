@@ -0,0 +1,70 @@
+'''
+Frame Timing Service
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import time
+from typing import NamedTuple, Optional
+
+# timestamp of a grabbed frame
+class FrameStamp(NamedTuple):
+    monotonic_ns:int        # host monotonic clock
+    wall_ns:int             # wall clock derived from the monotonic clock and the wall clock anchor
+    device_ns:Optional[int] # device clock (None if the camera does not provide it)
+    interval_ns:int         # frame interval (device clock if available, 0 for the first frame)
+
+    # wall clock timestamp in seconds (same unit as datetime.timestamp())
+    def timestamp(self) -> float:
+        return self.wall_ns/1e9
+
+'''
+Frame timer for a camera controller
+Wall clock time is taken once as an anchor and every frame is stamped with the monotonic clock,
+so timestamps do not jump when the system clock is adjusted. The device timestamp is used for the frame interval
+if the camera provides it. Framerate is smoothed with EWMA of the frame interval.
+'''
+class FrameTimer:
+    def __init__(self, tick_ns:float=None, alpha:float=0.1) -> None:
+        self.__tick_ns = tick_ns  # device tick time in ns (None if no device clock)
+        self.__alpha = alpha
+        self.__mono_anchor_ns = time.monotonic_ns()
+        self.__wall_anchor_ns = time.time_ns()
+        self.__prev_mono_ns = None
+        self.__prev_device_ns = None
+        self.__interval_ewma_ns = 0.0
+
+    # stamp a grabbed frame (device_ticks : device timestamp of the frame in ticks)
+    def stamp(self, device_ticks:int=None) -> FrameStamp:
+        mono_ns = time.monotonic_ns()
+        wall_ns = self.__wall_anchor_ns + (mono_ns - self.__mono_anchor_ns)
+        device_ns = None
+        if device_ticks is not None and self.__tick_ns:
+            device_ns = int(device_ticks*self.__tick_ns)
+
+        interval_ns = 0
+        if device_ns is not None and self.__prev_device_ns is not None:
+            interval_ns = device_ns - self.__prev_device_ns
+        elif self.__prev_mono_ns is not None:
+            interval_ns = mono_ns - self.__prev_mono_ns
+
+        if interval_ns>0:
+            if self.__interval_ewma_ns==0.0:
+                self.__interval_ewma_ns = float(interval_ns)
+            else:
+                self.__interval_ewma_ns += self.__alpha*(interval_ns - self.__interval_ewma_ns)
+
+        self.__prev_mono_ns = mono_ns
+        self.__prev_device_ns = device_ns
+        return FrameStamp(mono_ns, wall_ns, device_ns, interval_ns)
+
+    # smoothed framerate
+    def get_fps(self) -> float:
+        if self.__interval_ewma_ns>0:
+            return 1e9/self.__interval_ewma_ns
+        return 0.0
+
+    # reset frame interval history (e.g. after restarting acquisition)
+    def reset(self):
+        self.__prev_mono_ns = None
+        self.__prev_device_ns = None
+        self.__interval_ewma_ns = 0.0
@@ -17,6 +17,9 @@ from util.logger.video import VideoRecorder
 import platform
 from util.logger.console import ConsoleLogger
 from vision.camera.interface import ICamera
+from device.camera.frame_timer import FrameTimer
+from device.camera.pylon_frame import PylonFrameConverter
+from device.camera.frame_ring import FrameRing
 import numpy as np
 from pypylon import genicam
 from pypylon import pylon
@@ -37,9 +40,8 @@ class GigE_Basler(ICamera):
         self.__device:pylon.InstantCamera = None        # single camera device instance
         self.__console = ConsoleLogger.get_logger()
         
-        self.__converter = pylon.ImageFormatConverter()
-        self.__converter.OutputPixelFormat = pylon.PixelType_BGR8packed
-        self.__converter.OutputBitAlignment = pylon.OutputBitAlignment_MsbAligned
+        # grab_into() converts into the given buffer (frame ring slot), grab() copies a single shot out of a reused buffer
+        self.__converter = PylonFrameConverter(pool_size=1)
         
     # open device
     def open(self) -> bool:
@@ -69,14 +71,36 @@ class GigE_Basler(ICamera):
     
     # captrue image
     def grab(self):
+        ret, raw_image, _ = self.grab_with_timestamp()
+        return (ret, raw_image)
+    
+    # capture image with device timestamp (in ticks)
+    def grab_with_timestamp(self):
         if self.__device.IsGrabbing():
             _grab_result = self.__device.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
             if _grab_result.GrabSucceeded():
-                image = self.__converter.Convert(_grab_result)
-                raw_image = image.GetArray()
-                _grab_result.Release()
+                device_ticks = _grab_result.GetTimeStamp()
+                buffer = self.__converter.convert(_grab_result) # grab result is released here
+                if buffer is None:
+                    return (False, None, None)
+                raw_image = buffer.copy() # owned by the caller
+                self.__converter.release(buffer)
                 
-                return (True, raw_image)
+                return (True, raw_image, device_ticks)
+            _grab_result.Release()
+        return (False, None, None)
+
+    # capture image into the given BGR buffer : (result, device timestamp in ticks), False if the frame does not fit the buffer
+    def grab_into(self, buffer:np.ndarray):
+        if self.__device.IsGrabbing():
+            _grab_result = self.__device.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
+            if _grab_result.GrabSucceeded():
+                device_ticks = _grab_result.GetTimeStamp()
+                if not self.__converter.convert_into(_grab_result, buffer): # grab result is released here
+                    self.__console.warning(f"Camera {self.camera_id} frame size does not fit the frame ring {buffer.shape}")
+                    return (False, None)
+                return (True, device_ticks)
+            _grab_result.Release()
         return (False, None)
             
     # check device open
@@ -88,18 +112,25 @@ class GigE_Basler(ICamera):
 # camera controller class
 class Controller(QThread):
     
-    frame_update_signal = pyqtSignal(np.ndarray, float) # to gui and process
+    frame_update_signal = pyqtSignal(int, int, int, float) # camera_id, frame ring slot, frame sequence, framerate
     
-    def __init__(self, camera_id:int):
+    def __init__(self, camera_id:int, ring_slots:int=8):
         super().__init__()
         
         self.__console = ConsoleLogger.get_logger()
         self.__camera = GigE_Basler(camera_id)
+        self.__frame_timer = FrameTimer(tick_ns=CAMERA_TICK_TIME)
+        self.__frame_ring = None    # shared frame ring (created with the first grabbed frame)
+        self.__ring_slots = ring_slots
         
     # getting camera id
     def get_camera_id(self) -> int:
         return self.__camera.camera_id
     
+    # frame ring to read the grabbed frames by (slot, sequence)
+    def get_frame_ring(self) -> FrameRing:
+        return self.__frame_ring
+    
     # camera open
     def open(self) -> bool:
         try:
@@ -119,6 +150,8 @@ class Controller(QThread):
 
         # release grabber
         self.__camera.close()
+        if self.__frame_ring:
+            self.__frame_ring.close()
         self.__console.info(f"camera {self.__camera.camera_id} controller is closed")
         
      # start thread
@@ -143,14 +176,28 @@ class Controller(QThread):
             if self.isInterruptionRequested():
                 break
             
-            t_start = datetime.now()
-            ret, frame = self.__camera.grab()
+            ret, slot, seq, device_ticks = self.__grab_to_ring()
 
             if ret:                
-                t_end = datetime.now()
-                framerate = float(1./(t_end - t_start).total_seconds())
+                self.__frame_timer.stamp(device_ticks) # frame interval from device clock
+                self.frame_update_signal.emit(self.__camera.camera_id, slot, seq, self.__frame_timer.get_fps())
+
+    # grab a frame directly into the next ring slot (converted from the driver buffer, no frame is allocated)
+    def __grab_to_ring(self):
+        if self.__frame_ring is None:
+            ret, frame, device_ticks = self.__camera.grab_with_timestamp()
+            if not ret:
+                return (False, 0, 0, None)
+            self.__frame_ring = FrameRing(frame.shape, slots=self.__ring_slots)
+            slot, seq = self.__frame_ring.write(frame)
+            return (True, slot, seq, device_ticks)
 
-                self.frame_update_signal.emit(frame, framerate)
+        slot, seq, buffer = self.__frame_ring.acquire()
+        ret, device_ticks = self.__camera.grab_into(buffer)
+        if not ret:
+            return (False, 0, 0, None)
+        self.__frame_ring.commit(slot, seq)
+        return (True, slot, seq, device_ticks)
 
         
 '''
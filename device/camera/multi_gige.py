@@ -19,6 +19,9 @@ from pypylon import genicam
 from pypylon import pylon
 import threading
 import time
+from device.camera.frame_timer import FrameTimer
+from device.camera.frame_sync import FrameSynchronizer, SyncPolicy
+from device.camera.pylon_frame import PylonFrameConverter
 
 #(Note) acA1300-60gc = 125MHz(PTP disabled), 1 Tick = 8ns
 #(Note) a2A1920-51gmPRO = 1GHZ, 1 Tick = 1ns
@@ -33,21 +36,28 @@ _camera_array_container:pylon.InstantCameraArray = None
 class Controller(QThread):
     
     frame_update_signal = pyqtSignal(int, np.ndarray, float) # to gui and process
-    frame_update_signal_multi = pyqtSignal(int, dict, float)
+    frame_bundle_signal = pyqtSignal(object) # FrameBundle (synchronized frames of all cameras, every receiver calls release())
     frame_write_signal = pyqtSignal(int, np.ndarray, float) # to write image/video
     
-    def __init__(self):
+    def __init__(self, sync_tolerance_ms:float=10.0, sync_max_wait_ms:float=100.0, sync_policy:str=SyncPolicy.PARTIAL, use_device_clock:bool=False, lazy_color:bool=False, buffer_pool_size:int=16):
         super().__init__()
 
+        # frame synchronizer options (device clock is comparable between cameras only if PTP is enabled)
+        self.__sync_tolerance_ns = int(sync_tolerance_ms*1e6)
+        self.__sync_max_wait_ns = int(sync_max_wait_ms*1e6)
+        self.__sync_policy = sync_policy
+        self.__use_device_clock = use_device_clock
+
         self.grab_termination_event = threading.Event() # for termination
         self.grab_thread = threading.Thread(target=self.grab, args =(self.grab_termination_event, ))
 
         self.rec_termination_event = threading.Event()
         self.recorder1_thread = threading.Thread(target=self.record1, args = (self.rec_termination_event, ))
 
-        self.__converter = pylon.ImageFormatConverter()
-        self.__converter.OutputPixelFormat = pylon.PixelType_BGR8packed
-        self.__converter.OutputBitAlignment = pylon.OutputBitAlignment_MsbAligned
+        # frame converters for each camera (pooled buffers given back when bundles are released, lazy_color : frames are RawFrame)
+        self.__lazy_color = lazy_color
+        self.__buffer_pool_size = buffer_pool_size
+        self.__converters = {}
         
         self.__console = ConsoleLogger.get_logger()
         
@@ -93,43 +103,48 @@ class Controller(QThread):
         #_camera_array_container.StartGrabbing(pylon.GrabStrategy_OneByOne, pylon.GrabLoop_ProvidedByUser)
         #_camera_array_container.StartGrabbing(pylon.GrabStrategy_UpcomingImage, pylon.GrabLoop_ProvidedByUser)
         #_camera_array_container.StartGrabbing(pylon.GrabStrategy_LatestImages, pylon.GrabLoop_ProvidedByUser)
-        multi_camera_fps = {}
-
-        __raw_images = {}
+        multi_camera_timer = {} # frame timer for each camera
+        synchronizer = FrameSynchronizer(range(_camera_array_container.GetSize()), self.__sync_tolerance_ns, self.__sync_max_wait_ns, self.__sync_policy,
+                                         release=self.__release_frame)
 
         while True:
 
-            if self.isInterruptionRequested():
+            if self.isInterruptionRequested() or evt.is_set():
                 break
 
-            t_start = datetime.now()
             grab_image = _camera_array_container.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
             camera_id = grab_image.GetCameraContext()
 
             if grab_image.GrabSucceeded():
-                #img = grab_image.GetArray()
-                image = self.__converter.Convert(grab_image)
-                raw_image = image.GetArray()
-
-                __raw_images[camera_id] = raw_image
-
-                if camera_id in multi_camera_fps.keys():
-                    framerate = float(1./(t_start - multi_camera_fps[camera_id]).total_seconds())
-                else:
-                    framerate = 0
-                multi_camera_fps[camera_id] = t_start
-                
-                
-                # send image
-                #self.frame_update_signal.emit(camera_id, raw_image, framerate)
-                if len(__raw_images)==10:
-                    self.frame_update_signal_multi.emit(camera_id, __raw_images.copy(), framerate)
-                    #self.__console.info(f"emit")
-                    __raw_images.clear()
-
-                time.sleep(0.001)
-                if evt.is_set():
-                    break
+                if camera_id not in multi_camera_timer.keys():
+                    multi_camera_timer[camera_id] = FrameTimer(tick_ns=CAMERA_TICK_TIME)
+                    self.__converters[camera_id] = PylonFrameConverter(self.__buffer_pool_size, self.__lazy_color)
+                stamp = multi_camera_timer[camera_id].stamp(grab_image.GetTimeStamp()) # frame interval from device clock
+                raw_image = self.__converters[camera_id].convert(grab_image) # grab result is released here
+                if raw_image is None: # all buffers are held by bundles not released yet
+                    continue
+
+                # group frames of all cameras by timestamp
+                timestamp_ns = stamp.device_ns if self.__use_device_clock and stamp.device_ns is not None else stamp.monotonic_ns
+                for bundle in synchronizer.push(camera_id, raw_image, timestamp_ns, stamp.monotonic_ns):
+                    self.__emit_bundle(bundle)
+            else:
+                grab_image.Release()
+
+        dropped = {camera_id:converter.get_dropped_frames() for camera_id, converter in self.__converters.items()}
+        self.__console.info(f"Frame bundles : {synchronizer.get_stats()}, dropped (no free buffer) : {dropped}")
+
+    # emit the bundle, its frames are reused after every receiver released it
+    def __emit_bundle(self, bundle):
+        receivers = self.receivers(self.frame_bundle_signal)
+        if receivers==0:
+            bundle.release()
+            return
+        bundle.retain(receivers-1)
+        self.frame_bundle_signal.emit(bundle)
+
+    def __release_frame(self, camera_id:int, frame):
+        self.__converters[camera_id].release(frame)
 
     # start grabbing thread
     def start_grab(self):
@@ -0,0 +1,148 @@
+'''
+Pylon Grab Result Converter with preallocated frame buffers
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import cv2
+import threading
+import numpy as np
+from pypylon import pylon
+
+# pylon pixel type -> OpenCV conversion to BGR
+# (OpenCV names Bayer patterns from the second row, pylon BayerRG8 = OpenCV BayerBG)
+_BGR_CONVERSION = {
+    pylon.PixelType_BayerRG8 : cv2.COLOR_BayerBG2BGR,
+    pylon.PixelType_BayerBG8 : cv2.COLOR_BayerRG2BGR,
+    pylon.PixelType_BayerGR8 : cv2.COLOR_BayerGB2BGR,
+    pylon.PixelType_BayerGB8 : cv2.COLOR_BayerGR2BGR,
+    pylon.PixelType_Mono8 : cv2.COLOR_GRAY2BGR,
+}
+
+# at most 'size' reused buffers, a buffer is handed out again only after the consumer released it
+class FrameBufferPool:
+    def __init__(self, size:int) -> None:
+        self.__size = size
+        self.__shape = None
+        self.__free = []
+        self.__allocated = 0
+        self.__lock = threading.Lock()
+
+    # free buffer of the shape, None if all buffers are still in use
+    def acquire(self, shape:tuple, dtype=np.uint8) -> np.ndarray:
+        with self.__lock:
+            if shape!=self.__shape: # buffers of the previous shape are not reused
+                self.__shape = shape
+                self.__free = []
+                self.__allocated = 0
+            if self.__free:
+                return self.__free.pop()
+            if self.__allocated<self.__size:
+                self.__allocated += 1
+                return np.empty(shape, dtype=dtype)
+            return None
+
+    # give the buffer back (called by the consumer, from any thread)
+    def release(self, buffer:np.ndarray):
+        with self.__lock:
+            if buffer.shape==self.__shape and len(self.__free)<self.__allocated:
+                self.__free.append(buffer)
+
+# raw (Bayer/Mono) frame demosaiced on demand (conversion None : raw is already BGR)
+class RawFrame:
+    def __init__(self, raw:np.ndarray, conversion:int) -> None:
+        self.raw = raw
+        self.is_converted = conversion is None
+        self.__conversion = conversion
+        self.__bgr = raw if conversion is None else None
+
+    # color(BGR) image, converted once (dst : buffer to convert into)
+    def bgr(self, dst:np.ndarray=None) -> np.ndarray:
+        if self.__bgr is None:
+            self.__bgr = cv2.cvtColor(self.raw, self.__conversion, dst=dst)
+        return self.__bgr
+
+'''
+Converts grab results into preallocated buffers and releases the grab results to the driver right away.
+Bayer/Mono8 frames are converted with OpenCV straight from the driver buffer (zero copy), other pixel formats fall back
+to pylon ImageFormatConverter with a reused target image. With lazy=True, every frame is a RawFrame : Bayer/Mono8 frames
+are kept raw and converted only when a consumer needs color, frames of other formats are converted already.
+Frames are pooled buffers : the consumer hands a frame back with release() when it is done with it. If all buffers are
+still in use, convert() returns None (the frame is dropped instead of overwriting a frame being consumed).
+convert_into() converts into a buffer given by the caller (e.g. a frame ring slot) without the pool.
+'''
+class PylonFrameConverter:
+    def __init__(self, pool_size:int=8, lazy:bool=False) -> None:
+        self.__lazy = lazy
+        self.__pool = FrameBufferPool(pool_size)
+        self.__raw_pool = FrameBufferPool(pool_size)
+        self.__converter = pylon.ImageFormatConverter()
+        self.__converter.OutputPixelFormat = pylon.PixelType_BGR8packed
+        self.__converter.OutputBitAlignment = pylon.OutputBitAlignment_MsbAligned
+        self.__target = pylon.PylonImage() # reused by the converter
+        self.__dropped = 0
+
+    # convert the grab result (BGR ndarray, or RawFrame in lazy mode) and release it, None if no buffer is free
+    def convert(self, grab_result):
+        try:
+            conversion = _BGR_CONVERSION.get(grab_result.GetPixelType())
+            if conversion is None:
+                self.__converter.Convert(self.__target, grab_result)
+                with self.__target.GetArrayZeroCopy() as bgr:
+                    buffer = self.__acquire(self.__pool, bgr.shape)
+                    if buffer is not None:
+                        np.copyto(buffer, bgr)
+                if buffer is None:
+                    return None
+                return RawFrame(buffer, None) if self.__lazy else buffer
+
+            with grab_result.GetArrayZeroCopy() as raw:
+                if self.__lazy:
+                    buffer = self.__acquire(self.__raw_pool, raw.shape)
+                    if buffer is None:
+                        return None
+                    np.copyto(buffer, raw)
+                    return RawFrame(buffer, conversion)
+                buffer = self.__acquire(self.__pool, (*raw.shape[:2], 3))
+                if buffer is None:
+                    return None
+                cv2.cvtColor(raw, conversion, dst=buffer)
+                return buffer
+        finally:
+            grab_result.Release()
+
+    # convert the grab result into the given BGR buffer (e.g. a frame ring slot) and release it, False if the frame does not fit
+    def convert_into(self, grab_result, dst:np.ndarray) -> bool:
+        try:
+            conversion = _BGR_CONVERSION.get(grab_result.GetPixelType())
+            if conversion is None:
+                self.__converter.Convert(self.__target, grab_result)
+                with self.__target.GetArrayZeroCopy() as bgr:
+                    if bgr.shape!=dst.shape:
+                        return False
+                    np.copyto(dst, bgr)
+                return True
+
+            with grab_result.GetArrayZeroCopy() as raw:
+                if (*raw.shape[:2], 3)!=dst.shape:
+                    return False
+                cv2.cvtColor(raw, conversion, dst=dst)
+                return True
+        finally:
+            grab_result.Release()
+
+    # give a converted frame back to the pool
+    def release(self, frame):
+        if isinstance(frame, RawFrame):
+            (self.__pool if frame.is_converted else self.__raw_pool).release(frame.raw)
+        elif frame is not None:
+            self.__pool.release(frame)
+
+    # number of frames dropped because all buffers were in use
+    def get_dropped_frames(self) -> int:
+        return self.__dropped
+
+    def __acquire(self, pool:FrameBufferPool, shape:tuple):
+        buffer = pool.acquire(shape)
+        if buffer is None:
+            self.__dropped += 1
+        return buffer
@@ -7,13 +7,15 @@ from PyQt6.QtCore import QObject, Qt, QTimer, QThread, pyqtSignal
 from PyQt6.QtGui import QImage
 import cv2
 from datetime import datetime
-from util.logger.video import VideoRecorder
+from util.logger.video import VideoRecorder, QueuedVideoRecorder, RecordPolicy, RecordFormat
+from util.logger.journal import Source
 import platform
 from util.logger.console import ConsoleLogger
 from device.camera.interface import ICamera
+from device.camera.frame_ring import FrameRing
+from device.camera.frame_timer import FrameTimer, FrameStamp
 import numpy as np
 from typing import Tuple
-import csv
 import pathlib
 
 
@@ -56,6 +58,10 @@ class UVC(ICamera):
     def grab(self):
         return self.__grabber.read() # grab
     
+    # capture image into the given buffer (no allocation if the buffer fits the frame)
+    def grab_into(self, buffer:np.ndarray):
+        return self.__grabber.read(buffer)
+    
     # check device open
     def is_opened(self) -> bool:
         return self.__grabber.isOpened()
@@ -70,19 +76,19 @@ class UVC(ICamera):
 # camera controller class
 class Controller(QThread):
 
-    frame_update_signal = pyqtSignal(int, np.ndarray, float) # camera_id, image_frame, framerate
+    frame_update_signal = pyqtSignal(int, int, int, float) # camera_id, frame ring slot, frame sequence, framerate
 
-    def __init__(self, camera_id:int):
+    def __init__(self, camera_id:int, ring_slots:int=8):
         super().__init__()
         
         self.__console = ConsoleLogger.get_logger()   # console logger
         self.__uvc_camera = UVC(camera_id)    # UVC camera device
-        self.__raw_video_writer = None      # camera video writer
+        self.__raw_video_writer = None      # camera video writer (queued, encoded on its own thread)
         self.__recording_released = False
         self.__is_recording = False # video recording status
-        self.__prev_timestamp = datetime.now() # previous timestamp
-        self.__timestamp_writer = None
-        self.__timestamp_file = None
+        self.__frame_timer = FrameTimer() # monotonic frame timestamp & smoothed framerate
+        self.__frame_ring = None    # shared frame ring (created with the first grabbed frame)
+        self.__ring_slots = ring_slots
     
     # get camera id from own camera device    
     def get_camera_id(self) -> int:
@@ -112,14 +118,25 @@ class Controller(QThread):
     def get_properties(self) -> Tuple[float, int, int]:
         return self.__uvc_camera.get_properties()
     
+    # frame ring to read the grabbed frames by (slot, sequence)
+    def get_frame_ring(self) -> FrameRing:
+        return self.__frame_ring
+    
     # camera device close
     def close(self) -> None:
+        self.__is_recording = False # no more frames to the recorder
         self.requestInterruption() # to quit for thread
         self.quit()
         self.wait(1000)
 
+        # stop recording (queued frames are written before the session logs are closed)
+        self.release_video_writer()
+        self.__recording_released = False
+
         # release grabber
         self.__uvc_camera.close()
+        if self.__frame_ring:
+            self.__frame_ring.close()
         self.__console.info(f"camera {self.__uvc_camera.camera_id} controller is closed")
 
     # start thread
@@ -142,14 +159,11 @@ class Controller(QThread):
             if self.isInterruptionRequested():
                 break
             
-            t_current = datetime.now()
-            ret, frame = self.__uvc_camera.grab()
+            ret, frame, slot, seq = self.__grab_to_ring()
 
             if ret:                
-                # t_end = datetime.now()
-                framerate = float(1./(t_current - self.__prev_timestamp).total_seconds())
-                self.frame_update_signal.emit(self.__uvc_camera.get_camera_id(), frame, framerate)
-                self.__prev_timestamp = t_current
+                t_current = self.__frame_timer.stamp()
+                self.frame_update_signal.emit(self.__uvc_camera.get_camera_id(), slot, seq, self.__frame_timer.get_fps())
 
                 # record video
                 if self.__is_recording:
@@ -159,23 +173,38 @@ class Controller(QThread):
                         self.release_video_writer()
                         self.__recording_released = False
     
+    # grab a frame directly into the next ring slot
+    def __grab_to_ring(self):
+        if self.__frame_ring is None:
+            ret, frame = self.__uvc_camera.grab()
+            if not ret:
+                return (False, None, 0, 0)
+            self.__frame_ring = FrameRing(frame.shape, slots=self.__ring_slots)
+            slot, seq = self.__frame_ring.write(frame)
+            return (True, self.__frame_ring.read(slot, seq), slot, seq)
+
+        slot, seq, buffer = self.__frame_ring.acquire()
+        ret, frame = self.__uvc_camera.grab_into(buffer)
+        if ret and frame is not buffer: # backend allocated its own image
+            if frame.shape!=buffer.shape:
+                self.__console.warning(f"Camera {self.__uvc_camera.camera_id} frame size {frame.shape} does not fit the frame ring {buffer.shape}")
+                return (False, None, 0, 0)
+            buffer[...] = frame
+        if not ret:
+            return (False, None, 0, 0)
+        self.__frame_ring.commit(slot, seq)
+        return (True, buffer, slot, seq)
+    
     def is_recording(self) -> bool:
         return self.__is_recording
     
-    # video recording process impl.
-    def raw_video_record(self, frame):
-        if self.__raw_video_writer != None:
-            self.__raw_video_writer.write(frame)
-
     # video recording with timestamp(csv)
-    def raw_video_record_with_timestamp(self, frame, tstamp:datetime):
+    def raw_video_record_with_timestamp(self, frame, tstamp:FrameStamp):
         if self.__raw_video_writer:
-            self.__raw_video_writer.write(frame)
-        if self.__timestamp_writer:
-            self.__timestamp_writer.writerow([str(tstamp.timestamp())])
+            self.__raw_video_writer.write_frame(frame, tstamp.wall_ns, tstamp.monotonic_ns) # queued, encoded on the recorder thread
 
     # create new video writer to save as video file
-    def create_raw_video_writer(self, workspace):
+    def create_raw_video_writer(self, workspace, queue_size:int=30, policy:str=RecordPolicy.DROP_OLDEST, record_format:str=RecordFormat.MJPG, log_writer=None, journal=None):
         if self.__is_recording:
             self.release_video_writer()
             self.__is_recording = False
@@ -185,30 +214,30 @@ class Controller(QThread):
         save_path.mkdir(parents=True, exist_ok=True)
 
         fps, w, h = self.__uvc_camera.get_properties()
-        fourcc = cv2.VideoWriter_fourcc(*'MJPG') # low compression but bigger (file extension : avi) MJPG, I420
+        if fps<=0: # some drivers do not report the framerate
+            fps = self.__frame_timer.get_fps() or 30.0
 
         print(f"recording camera({self.__uvc_camera.get_camera_id()}) info : ({w},{h}@{fps})")
-        self.__raw_video_writer = cv2.VideoWriter((save_path/pathlib.Path(f"cam_{self.__uvc_camera.get_camera_id()}.avi")).as_posix(), fourcc, 30, (w, h)) # 30fps
-
-        # timestamp log to csv
-        self.__timestamp_file = open((save_path/f"timestamp_{self.__uvc_camera.get_camera_id()}.csv"), mode='w')
-        self.__timestamp_writer = csv.writer(self.__timestamp_file)
+        extension = "avi" if record_format==RecordFormat.MJPG else "raw" # raw recording is a directory
+        self.__raw_video_writer = QueuedVideoRecorder(video_path=save_path/f"cam_{self.__uvc_camera.get_camera_id()}.{extension}",
+                                                      timestamp_path=save_path/f"timestamp_{self.__uvc_camera.get_camera_id()}.csv",
+                                                      resolution=(w, h), fps=fps, queue_size=queue_size, policy=policy, record_format=record_format, log_writer=log_writer,
+                                                      journal=journal, journal_source=Source.CAMERA+self.__uvc_camera.get_camera_id())
+        self.__raw_video_writer.start()
 
     # destory the video writer
     def release_video_writer(self):
-        self.__timestamp_file.flush()
-        self.__timestamp_file.close()
-
-        if self.__raw_video_writer:
-            self.__raw_video_writer.release()
+        writer, self.__raw_video_writer = self.__raw_video_writer, None # released once (close and the grab thread)
+        if writer:
+            writer.stop() # write all queued frames
             self.__console.info("Recorder is completely released")
-            self.__raw_video_writer = None
         
 
-    # start video recording (workspace : path to save)
-    def start_recording(self, workspace):
+    # start video recording (workspace : path to save, queue_size & policy : frame queue of the recorder, record_format : file format,
+    # log_writer : CSVWriterService writing the frame timestamps, journal : JournalWriter of the session)
+    def start_recording(self, workspace, queue_size:int=30, policy:str=RecordPolicy.DROP_OLDEST, record_format:str=RecordFormat.MJPG, log_writer=None, journal=None):
         if not self.__is_recording:
-            self.create_raw_video_writer(workspace)
+            self.create_raw_video_writer(workspace, queue_size, policy, record_format, log_writer, journal)
             self.__is_recording = True # working on thread
 
     # stop video recording
@@ -6,6 +6,7 @@ NEON Eyetracker Control module
 from pupil_labs.realtime_api.simple import discover_one_device
 from pupil_labs.realtime_api import device
 from util.logger.console import ConsoleLogger
+from avsim_monitor.mapi import MapiDispatcher
 import asyncio
 import time
 import paho.mqtt.client as mqtt
@@ -108,6 +109,8 @@ class neon_controller2(QThread):
             "flame/avsim/neon/mapi_record_start" : self.mapi_record_start,
             "flame/avsim/neon/mapi_record_stop" : self.mapi_record_stop
         }
+        self.mapi_dispatcher = MapiDispatcher()
+        self.mapi_dispatcher.register_all(self.message_api)
 
         # MQTT-based message api pipeline
         self.mq_client = mqtt.Client(client_id="neon_controller", transport='tcp', protocol=mqtt.MQTTv311, clean_session=True)
@@ -164,11 +167,20 @@ class neon_controller2(QThread):
 
     # message api for record start
     def mapi_record_start(self, payload):
-        self.record_start()
+        if self.__from_other_app(payload):
+            self.record_start()
     
     # message api for record stop
     def mapi_record_stop(self, payload):
-        self.record_stop()  
+        if self.__from_other_app(payload):
+            self.record_stop()  
+
+    # message api requests from the monitor are ignored (the monitor controls the device directly)
+    def __from_other_app(self, payload) -> bool:
+        if "app" not in payload:
+            self.__console.info(f"[Eyetracker] Message payload does not contain the app")
+            return False
+        return payload["app"] != "avsim_monitor"
     
     # recording start
     def record_start(self):
@@ -190,7 +202,7 @@ class neon_controller2(QThread):
     # mqtt connection
     def on_mqtt_connect(self, mqttc, obj, flags, rc):
         # subscribe message api
-        for topic in self.message_api.keys():
+        for topic in self.mapi_dispatcher.topics():
             self.mq_client.subscribe(topic, 0)
         
         self.__console(f"[Eyetracker] Ready to MAPI ({rc})")
@@ -203,15 +215,7 @@ class neon_controller2(QThread):
         mapi = str(msg.topic)
         
         try:
-            if mapi in self.message_api.keys():
-                payload = json.loads(msg.payload)
-                if "app" not in payload:
-                    self.__console.info(f"[Eyetracker] Message payload does not contain the app")
-                    return
-                
-                if payload["app"] != "avsim_monitor":
-                    self.message_api[mapi](payload)
-            else:
+            if not self.mapi_dispatcher.dispatch(mapi, msg.payload):
                 self.__console.info(f"[Eyetracker] Unknown MAPI {mapi}")
 
         except json.JSONDecodeError as e:
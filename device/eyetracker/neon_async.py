@@ -0,0 +1,263 @@
+'''
+NEON Eyetracker Async Controller (asyncio event loop on its own thread)
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import asyncio
+import threading
+import time
+import pathlib
+import numpy as np
+from concurrent.futures import Future
+
+from pupil_labs.realtime_api import Device, Network, receive_gaze_data
+try:
+    from pupil_labs.realtime_api import receive_imu_data
+except ImportError:
+    receive_imu_data = None # older realtime api without IMU streaming
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt6.QtCore import QObject, pyqtSignal
+
+from util.logger.console import ConsoleLogger
+from util.logger.columnar import ColumnarWriter
+
+# gaze sample (device_ns : phone clock of the sample, monotonic_ns : our clock when received)
+GAZE_DTYPE = np.dtype([("device_ns", "<i8"), ("monotonic_ns", "<i8"), ("x", "<f4"), ("y", "<f4"), ("worn", "u1")])
+
+# captured samples (wall_ns : our wall clock when received, to align with the other logs of the session)
+GAZE_COLUMNS = np.dtype([("device_ns", "<i8"), ("monotonic_ns", "<i8"), ("wall_ns", "<i8"), ("x", "<f4"), ("y", "<f4"), ("worn", "u1")])
+IMU_COLUMNS = np.dtype([("device_ns", "<i8"), ("monotonic_ns", "<i8"), ("wall_ns", "<i8"),
+                        ("gyro_x", "<f4"), ("gyro_y", "<f4"), ("gyro_z", "<f4"),
+                        ("accel_x", "<f4"), ("accel_y", "<f4"), ("accel_z", "<f4"),
+                        ("quat_w", "<f4"), ("quat_x", "<f4"), ("quat_y", "<f4"), ("quat_z", "<f4")])
+
+'''
+Fixed size gaze sample buffer (preallocated, oldest samples are overwritten)
+'''
+class GazeRingBuffer:
+    def __init__(self, capacity:int=2000) -> None:
+        self.__samples = np.zeros(capacity, dtype=GAZE_DTYPE)
+        self.__count = 0 # total number of samples put
+        self.__lock = threading.Lock()
+
+    def put(self, device_ns:int, monotonic_ns:int, x:float, y:float, worn:bool):
+        with self.__lock:
+            self.__samples[self.__count%len(self.__samples)] = (device_ns, monotonic_ns, x, y, worn)
+            self.__count += 1
+
+    # last n samples, oldest first (copy)
+    def latest(self, n:int=1) -> np.ndarray:
+        with self.__lock:
+            n = min(n, self.__count, len(self.__samples))
+            index = (np.arange(self.__count-n, self.__count))%len(self.__samples)
+            return self.__samples[index]
+
+    def get_count(self) -> int:
+        return self.__count
+
+'''
+Neon controller on an asyncio event loop thread (pupil_labs.realtime_api async API)
+Commands (discover, record start/stop) return concurrent futures immediately, results are also emitted as signals.
+Device status is refreshed in the background and cached (get_status never does network I/O).
+Gaze samples are streamed into a ring buffer while a device is connected.
+While capturing, gaze and IMU samples are also written to <workspace>/eyetracker/gaze and imu (see ColumnarWriter).
+'''
+class NeonAsyncController(QObject):
+    status_update_signal = pyqtSignal(dict)     # device status (cached)
+    record_started_signal = pyqtSignal(str)     # recording id
+    record_stopped_signal = pyqtSignal()
+    device_lost_signal = pyqtSignal()
+
+    def __init__(self, config:dict, status_interval:float=5.0, gaze_buffer_size:int=2000):
+        super().__init__()
+        self.__console = ConsoleLogger.get_logger()
+
+        self.__status_interval = status_interval
+        self.__device = None
+        self.__status = {}
+        self.__status_lock = threading.Lock()
+        self.__tasks = []
+        self.gaze = GazeRingBuffer(gaze_buffer_size)
+        self.__gaze_writer = None
+        self.__imu_writer = None
+        self.__imu_task = None
+
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__run_loop, daemon=True)
+        self.__thread.start()
+
+    def __run_loop(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.run_forever()
+
+    # run coroutine on the event loop thread (errors are logged, and raised by future.result())
+    def __submit(self, coro) -> Future:
+        future = asyncio.run_coroutine_threadsafe(coro, self.__loop)
+        future.add_done_callback(self.__log_error)
+        return future
+
+    def __log_error(self, future:Future):
+        if not future.cancelled() and future.exception():
+            self.__console.error(f"Eyetracker Error : {future.exception()}")
+
+    # discover a device (non-blocking), future result is True if a device is found
+    def device_discover(self, timeout:float=5.0) -> Future:
+        self.__console.info("Discover eyetracker device...")
+        return self.__submit(self.__discover(timeout))
+
+    # check device is alive
+    def is_available(self) -> bool:
+        return self.__device is not None
+
+    # cached device status
+    def get_status(self) -> dict:
+        with self.__status_lock:
+            return dict(self.__status)
+
+    # recording start (non-blocking), future result is the recording id
+    def record_start(self) -> Future:
+        return self.__submit(self.__record_start())
+
+    # recording stop and save (non-blocking)
+    def record_stop(self) -> Future:
+        return self.__submit(self.__record_stop())
+
+    # start writing gaze/IMU samples into the workspace (non-blocking)
+    def start_capture(self, workspace) -> Future:
+        return self.__submit(self.__start_capture(pathlib.Path(workspace)/"eyetracker"))
+
+    # stop writing samples, remaining samples are flushed (non-blocking)
+    def stop_capture(self) -> Future:
+        return self.__submit(self.__stop_capture())
+
+    # close device and stop the event loop
+    def close(self):
+        if not self.__thread.is_alive():
+            return
+        try:
+            self.__submit(self.__close()).result(timeout=3)
+        except Exception as e:
+            self.__console.error(f"Eyetracker close error : {e}")
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join(timeout=3)
+        self.__console.info("Eyetracker device is closed")
+
+    async def __discover(self, timeout:float) -> bool:
+        if self.__device:
+            await self.__close()
+        async with Network() as network:
+            device_info = await network.wait_for_new_device(timeout_seconds=timeout)
+        if device_info is None:
+            self.__console.warning("Eyetracker device is not found")
+            return False
+
+        self.__device = Device.from_discovered_device(device_info)
+        status = await self.__device.get_status()
+        self.__update_status(status)
+        self.__console.info(f"Eyetracker device : {self.__status.get('name')} ({self.__status.get('address')})")
+
+        self.__tasks = [self.__loop.create_task(self.__poll_status()),
+                        self.__loop.create_task(self.__stream_gaze(status))]
+        return True
+
+    async def __record_start(self) -> str:
+        if not self.__device:
+            return ""
+        record_id = await self.__device.recording_start()
+        self.__console.info(f"Start eyetracker recording... {record_id}")
+        self.record_started_signal.emit(str(record_id))
+        return record_id
+
+    async def __record_stop(self):
+        if not self.__device:
+            return
+        await self.__device.recording_stop_and_save()
+        self.__console.info("Stop eyetracker recording...")
+        self.record_stopped_signal.emit()
+
+    async def __start_capture(self, path:pathlib.Path):
+        await self.__stop_capture()
+        if not self.__device:
+            return
+        self.__gaze_writer = ColumnarWriter(path/"gaze", GAZE_COLUMNS)
+        if receive_imu_data is None:
+            self.__console.warning("IMU streaming is not supported by the installed realtime api")
+            return
+        status = await self.__device.get_status()
+        sensor = status.direct_imu_sensor()
+        if sensor.connected:
+            self.__imu_writer = ColumnarWriter(path/"imu", IMU_COLUMNS)
+            self.__imu_task = self.__loop.create_task(self.__stream_imu(sensor.url, self.__imu_writer))
+        self.__console.info(f"Eyetracker capture in {path.as_posix()}")
+
+    async def __stop_capture(self):
+        if self.__imu_task:
+            self.__imu_task.cancel()
+            await asyncio.gather(self.__imu_task, return_exceptions=True)
+            self.__imu_task = None
+        gaze_writer, imu_writer = self.__gaze_writer, self.__imu_writer
+        self.__gaze_writer = None # detach before closing, the gaze stream keeps running
+        self.__imu_writer = None
+        for writer in (gaze_writer, imu_writer):
+            if writer:
+                await self.__loop.run_in_executor(None, writer.close) # file I/O off the event loop
+        if gaze_writer:
+            self.__console.info(f"Eyetracker captured {gaze_writer.get_samples()} gaze samples")
+
+    async def __close(self):
+        await self.__stop_capture()
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+        if self.__device:
+            await self.__device.close()
+            self.__device = None
+
+    # refresh cached status in the background
+    async def __poll_status(self):
+        while True:
+            await asyncio.sleep(self.__status_interval)
+            try:
+                self.__update_status(await self.__device.get_status())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.__console.warning(f"Eyetracker status is not available : {e}")
+                self.device_lost_signal.emit()
+
+    def __update_status(self, status):
+        phone = status.phone
+        info = {
+            "address": phone.ip,
+            "name": phone.device_name,
+            "battery_level": phone.battery_level,
+            "battery_state": phone.battery_state,
+            "free_storage": phone.memory/1024**3,
+            "memory_state": phone.memory_state,
+        }
+        with self.__status_lock:
+            self.__status = info
+        self.status_update_signal.emit(info)
+
+    # receive gaze samples into the ring buffer
+    async def __stream_gaze(self, status):
+        sensor = status.direct_gaze_sensor()
+        if not sensor.connected:
+            self.__console.warning("Eyetracker gaze sensor is not connected")
+            return
+        async for gaze in receive_gaze_data(sensor.url, run_loop=True, log_exceptions=True):
+            device_ns, monotonic_ns = int(gaze.timestamp_unix_seconds*1e9), time.monotonic_ns()
+            self.gaze.put(device_ns, monotonic_ns, gaze.x, gaze.y, gaze.worn)
+            if self.__gaze_writer:
+                self.__gaze_writer.append((device_ns, monotonic_ns, time.time_ns(), gaze.x, gaze.y, gaze.worn))
+
+    # write IMU samples while capturing
+    async def __stream_imu(self, url:str, writer:ColumnarWriter):
+        async for imu in receive_imu_data(url, run_loop=True, log_exceptions=True):
+            gyro, accel, quat = imu.gyro_data, imu.accel_data, imu.quaternion
+            writer.append((int(imu.timestamp_unix_seconds*1e9), time.monotonic_ns(), time.time_ns(),
+                           gyro.x, gyro.y, gyro.z, accel.x, accel.y, accel.z, quat.w, quat.x, quat.y, quat.z))
@@ -5,13 +5,30 @@ Dataset Frame Counter
 import argparse
 import sys, os
 import pathlib
+import json
+import csv
 import cv2
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
 from openpyxl import Workbook
 
 from util.logger.console import ConsoleLogger
+from util.logger.video_index import open_frame_index, VideoIndexError
 
-def get_video_info(video_path):
+VIDEO_EXTENSIONS = ('.avi', '.mp4', '.raw')
+RESULT_HEADER = ["Video File", "Frame Rate", "Total Frames", "Size", "Modified"]
+
+def get_video_info(video_path, save_index=False):
     """Gets frame rate and total frame count of a video file."""
+    # AVI and raw recordings are counted from the container index (no decoding)
+    if video_path.lower().endswith(('.avi', '.raw')):
+        try:
+            index = open_frame_index(video_path, use_cache=save_index)
+            fps, total_frames = index.get_fps(), len(index)
+            index.close()
+            return fps, total_frames
+        except Exception as e: # truncated or damaged recording
+            print(f"Cannot read index of {video_path} ({e}), counting with decoder")
+
     try:
         video = cv2.VideoCapture(video_path)
         fps = video.get(cv2.CAP_PROP_FPS)
@@ -38,18 +55,158 @@ def count_frames(video):
     return count
 
 
-
-def find_and_get_info(directory):
-    """Finds AVI and MP4 files and gets their frame rates and total frame counts."""
-    results = {}
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith(('.avi', '.mp4')):
+def iter_videos(directory):
+    """Yields (path, size, mtime_ns) of AVI, MP4 files and raw recordings(directory) under the directory."""
+    for root, dirs, files in os.walk(directory):
+        raws = [d for d in dirs if d.lower().endswith('.raw')]
+        dirs[:] = [d for d in dirs if d not in raws]
+        for file in files + raws:
+            if file.lower().endswith(VIDEO_EXTENSIONS):
                 video_path = os.path.join(root, file)
-                fps, total_frames = get_video_info(video_path)
-                if fps is not None and total_frames is not None:
-                    results[video_path] = {'fps': fps, 'total_frames': total_frames}
-                    print(f"Found file {video_path}")
+                try:
+                    stat = os.stat(os.path.join(video_path, "index.bin") if file in raws else video_path)
+                except OSError:
+                    continue
+                yield video_path, stat.st_size, stat.st_mtime_ns
+
+
+class ScanCache:
+    """Persistent scan results keyed on path, size and mtime (JSON lines, appended as results arrive)."""
+    def __init__(self, path):
+        self.__path = pathlib.Path(path)
+        self.__entries = {}
+        if self.__path.is_file():
+            with open(self.__path, "r") as cfile:
+                for line in cfile:
+                    try:
+                        entry = json.loads(line)
+                        self.__entries[entry["path"]] = entry
+                    except (ValueError, KeyError):
+                        pass # line cut by an interrupted run
+        self.__file = open(self.__path, "a")
+
+    def get(self, video_path, size, mtime_ns):
+        entry = self.__entries.get(video_path)
+        if entry and entry["size"]==size and entry["mtime_ns"]==mtime_ns:
+            return entry["fps"], entry["total_frames"]
+        return None
+
+    def put(self, video_path, size, mtime_ns, fps, total_frames):
+        entry = {"path":video_path, "size":size, "mtime_ns":mtime_ns, "fps":fps, "total_frames":total_frames}
+        self.__entries[video_path] = entry
+        self.__file.write(json.dumps(entry)+"\n")
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+
+class CsvResultWriter:
+    """Writes each result row as it arrives."""
+    def __init__(self, path):
+        self.__file = open(path, "w", newline="")
+        self.__writer = csv.writer(self.__file)
+        self.__writer.writerow(RESULT_HEADER)
+
+    def write(self, row):
+        self.__writer.writerow(row)
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+class XlsxResultWriter:
+    """Appends rows to a write-only workbook (saved on close)."""
+    def __init__(self, path):
+        self.__path = path
+        self.__workbook = Workbook(write_only=True)
+        self.__sheet = self.__workbook.create_sheet()
+        self.__sheet.append(RESULT_HEADER)
+
+    def write(self, row):
+        self.__sheet.append(row)
+
+    def close(self):
+        self.__workbook.save(self.__path)
+
+class ParquetResultWriter:
+    """Writes rows in row groups (requires pyarrow)."""
+    def __init__(self, path, group_size=1000):
+        import pyarrow
+        import pyarrow.parquet
+        self.__pa = pyarrow
+        self.__schema = pyarrow.schema([("video_file", pyarrow.string()), ("fps", pyarrow.float64()), ("total_frames", pyarrow.int64()),
+                                        ("size", pyarrow.int64()), ("mtime_ns", pyarrow.int64())])
+        self.__writer = pyarrow.parquet.ParquetWriter(path, self.__schema)
+        self.__group_size = group_size
+        self.__rows = []
+
+    def write(self, row):
+        self.__rows.append(row)
+        if len(self.__rows)>=self.__group_size:
+            self.__flush()
+
+    def __flush(self):
+        if self.__rows:
+            columns = list(zip(*self.__rows))
+            self.__writer.write_table(self.__pa.Table.from_arrays([self.__pa.array(c, type=f.type) for c, f in zip(columns, self.__schema)], schema=self.__schema))
+            self.__rows = []
+
+    def close(self):
+        self.__flush()
+        self.__writer.close()
+
+def open_result_writer(path):
+    """Result writer by the output file extension (csv, parquet, xlsx)."""
+    suffix = pathlib.Path(path).suffix.lower()
+    if suffix==".csv":
+        return CsvResultWriter(path)
+    if suffix==".parquet":
+        return ParquetResultWriter(path)
+    return XlsxResultWriter(path)
+
+
+def find_and_get_info(directory, save_index=False, workers=4, cache=None, writer=None):
+    """Finds AVI, MP4 files and raw recordings and gets their frame rates and total frame counts.
+    Videos are probed in a process pool (at most 2 x workers videos in flight), unchanged videos are taken from the cache,
+    and results are passed to the writer as they arrive."""
+    console = ConsoleLogger.get_logger()
+    results = {}
+
+    def add_result(video_path, size, mtime_ns, fps, total_frames):
+        results[video_path] = {'fps': fps, 'total_frames': total_frames}
+        if writer:
+            writer.write([video_path, fps, total_frames, size, mtime_ns])
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        inflight = {}
+        def collect(return_when):
+            done, _ = wait(inflight, return_when=return_when)
+            for future in done:
+                video_path, size, mtime_ns = inflight.pop(future)
+                try:
+                    fps, total_frames = future.result()
+                except Exception as e: # one unreadable video does not stop the scan
+                    console.error(f"Cannot read {video_path} : {e}")
+                    continue
+                if fps is None or total_frames is None:
+                    console.warning(f"Unreadable file {video_path}")
+                    continue
+                if cache:
+                    cache.put(video_path, size, mtime_ns, fps, total_frames)
+                add_result(video_path, size, mtime_ns, fps, total_frames)
+                console.info(f"Found file {video_path} ({total_frames} frames)")
+
+        for video_path, size, mtime_ns in iter_videos(directory):
+            cached = cache.get(video_path, size, mtime_ns) if cache else None
+            if cached:
+                add_result(video_path, size, mtime_ns, *cached)
+                continue
+            inflight[pool.submit(get_video_info, video_path, save_index)] = (video_path, size, mtime_ns)
+            if len(inflight)>=2*workers:
+                collect(FIRST_COMPLETED)
+        if inflight:
+            collect(ALL_COMPLETED)
     return results
 
 if __name__ == "__main__":
@@ -58,23 +215,21 @@ if __name__ == "__main__":
     # arguments
     parser = argparse.ArgumentParser(description="Get frame rates of video file in a directory")
     parser.add_argument('--path', nargs='?', required=True, help="Dataset Path", default="/mnt/avsim_nas/iae_dataset/Raw")
-    parser.add_argument('--out', nargs='?', required=True, help="Output Filename(*.xlsx)", default="result.xlsx")
+    parser.add_argument('--out', nargs='?', required=True, help="Output Filename(*.xlsx, *.csv, *.parquet)", default="result.xlsx")
+    parser.add_argument('--save-index', action='store_true', help="Save frame index next to each video (*.index.npz)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of probing processes")
+    parser.add_argument('--cache', nargs='?', default="frame_counter_cache.jsonl", help="Scan cache file (re-runs probe new or changed videos only)")
     args = parser.parse_args()
 
-    video_info = find_and_get_info(args.path)
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.append(["Video File", "Frame Rate", "Total Frames"])  # Header row
-
-    if video_info:
-        for video_path, info in video_info.items():
-            sheet.append([video_path, info['fps'], info['total_frames']])
-
-    workbook.save(args.out)
-    print(f"Saved {args.out}")
-
     try:
-        pass
+        cache = ScanCache(args.cache) if args.cache else None
+        writer = open_result_writer(args.out)
+        try:
+            video_info = find_and_get_info(args.path, args.save_index, max(1, args.workers), cache, writer)
+        finally:
+            writer.close()
+            if cache:
+                cache.close()
+        console.info(f"Saved {args.out} ({len(video_info)} videos)")
     except Exception as e:
-        console.critical(f"{e}")
\ No newline at end of file
+        console.critical(f"{e}")
@@ -4,7 +4,6 @@ YOLOv8 Human Pose Estimation Process Class
 '''
 
 
-from ultralytics import YOLO
 import pathlib
 import numpy as np
 from PyQt6.QtCore import QObject, pyqtSignal
@@ -12,41 +11,60 @@ import cv2
 
 from util.logger.console import ConsoleLogger
 from hpe.iestimator import IVisionEstimator
+from hpe.backend import create_estimator
+from hpe.tracker import KeypointTracker
+from hpe.roi import RoiCropper, rois_of
+
+
+# YOLOv8-pose(*.pt) with ultralytics (imported on use, torch is loaded only if this backend is selected)
+# imgsz : inference input size (roi_size when estimating seat crops)
+class YoloPoseEstimator(IVisionEstimator):
+    def __init__(self, model_path:pathlib.Path, conf:float=0.7, iou:float=0.7, imgsz:int=640) -> None:
+        super().__init__(pathlib.Path(model_path).name)
+        from ultralytics import YOLO
+        self.__pose_model = YOLO(model=pathlib.Path(model_path).as_posix())
+        self.__conf = conf
+        self.__iou = iou
+        self.__imgsz = imgsz
+
+    def estimate_batch(self, images:list) -> list:
+        results = self.__pose_model.predict(images, imgsz=self.__imgsz, iou=self.__iou, conf=self.__conf, verbose=False)
+        keypoints = []
+        for result in results:
+            if len(result.boxes)>0:
+                keypoints.append(result.keypoints.data.cpu().numpy())
+            else:
+                keypoints.append(np.zeros((0, 17, 3), dtype=np.float32))
+        return keypoints
 
 class PoseModel(QObject):
     
     estimated_result_image = pyqtSignal(np.ndarray)
     estimated_result_kpt = pyqtSignal(list)
     
-    def __init__(self, modelname:str, id:int) -> None:
+    # modelname : hpe_model in config (*.pt, *.onnx), detect_interval : detect every N frames and track in between (0 : detect every frame)
+    # rois : seat regions [[x, y, w, h], ...] of this camera (camera_rois in config), estimated on the crops if given
+    def __init__(self, modelname:str, id:int, detect_interval:int=0, rois:list=None, roi_size:int=320) -> None:
         super().__init__()
         
         self.__console = ConsoleLogger.get_logger()
         
         self.__id = id
-        
-        pretrained_path = pathlib.Path(__file__).parent / "pretrained"
-        self.__console.info(f"Load model in {pretrained_path.as_posix()}")
         self.__is_processing = False
-        self.__pose_model = None
+        self.__estimator = None
+        self.__tracker = KeypointTracker(detect_interval=detect_interval) if detect_interval>0 else None
+        self.__cropper = RoiCropper({id:rois}, roi_size) if rois else None
         
         try:
-            if modelname.lower() == "yolov8n-pose.pt":
-                self.__pose_model = YOLO(model=(pretrained_path / "yolov8n-pose.pt").as_posix())
-            elif modelname.lower() == "yolov8s-pose.pt":
-                self.__pose_model = YOLO(model=(pretrained_path / "yolov8s-pose.pt").as_posix())
-            elif modelname.lower() == "yolov8m-pose.pt":
-                self.__pose_model = YOLO(model=(pretrained_path / "yolov8m-pose.pt").as_posix())
-            elif modelname.lower() == "yolov8l-pose.pt":
-                self.__pose_model = YOLO(model=(pretrained_path / "yolov8l-pose.pt").as_posix())
-            elif modelname.lower() == "yolov8x-pose.pt":
-                self.__pose_model = YOLO(model=(pretrained_path / "yolov8x-pose.pt").as_posix())
-            elif modelname.lower() == "yolov8x-pose-p6.pt":
-                self.__pose_model = YOLO(model=(pretrained_path / "yolov8x-pose-p6.pt").as_posix())
-            else:
-                self.__console.warning("Unsupported HPE Model")
+            self.__estimator = create_estimator(modelname, **({"imgsz":roi_size} if rois else {}))
         except Exception as e:
             self.__console.critical(f"{e}")
+
+    # pose model of the camera from config (hpe_model, hpe_detect_interval, camera_rois, hpe_roi_size)
+    @classmethod
+    def from_config(cls, config:dict, id:int):
+        rois, roi_size = rois_of(config)
+        return cls(config.get("hpe_model", "yolov8s-pose.pt"), id, config.get("hpe_detect_interval", 0), rois.get(id), roi_size)
             
     # get id
     def get_id(self) -> int:
@@ -55,18 +73,25 @@ class PoseModel(QObject):
     # hpe prediction    
     def predict(self, image:np.ndarray, fps:float):
         if self.__is_processing:
-            results = self.__pose_model.predict(image, iou=0.7, conf=0.7, verbose=False)
+            if self.__tracker:
+                detections = self.estimate_batch([image])[0] if self.__tracker.needs_detection() else None
+                _, keypoints = self.__tracker.update(image, detections)
+            else:
+                keypoints = self.estimate_batch([image])[0]
             
             # draw keypoints on image
-            if len(results[0].boxes)>0:
-                log_kps = []
-                for kps in results[0].keypoints.xy.tolist(): #for multi-person
-                    for kp in kps:
-                        cv2.circle(image, center=(int(kp[0]), int(kp[1])), radius=7, color=(255,0,0), thickness=-1)
-                        log_kps = log_kps + kp
+            if len(keypoints)>0:
+                for x, y in keypoints[..., :2].reshape(-1, 2).astype(int): #for multi-person
+                    cv2.circle(image, center=(int(x), int(y)), radius=7, color=(255,0,0), thickness=-1)
             
                 self.estimated_result_image.emit(image)
-                self.estimated_result_kpt.emit(log_kps)
+                self.estimated_result_kpt.emit(keypoints[..., :2].reshape(-1).tolist()) # x0, y0, x1, y1, ...
+    
+    # batched prediction, returns keypoints (persons, 17, 3 : x, y, confidence) of each image
+    def estimate_batch(self, images:list) -> list:
+        if self.__cropper:
+            return self.__cropper.estimate(self.__estimator, [self.__id]*len(images), images)
+        return self.__estimator.estimate_batch(images)
             
     
     # start pose estimating
@@ -76,6 +101,8 @@ class PoseModel(QObject):
     # stop pose estimating
     def stop(self):
         self.__is_processing = False
+        if self.__tracker:
+            self.__tracker.reset()
         
     
     
\ No newline at end of file
@@ -0,0 +1,31 @@
+'''
+Pose Estimator Backend Selection
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import pathlib
+
+from util.logger.console import ConsoleLogger
+from hpe.iestimator import IVisionEstimator
+
+_PRETRAINED_PATH = pathlib.Path(__file__).parent / "pretrained"
+
+# create estimator for the model(hpe_model in config) : *.onnx with onnxruntime, *.pt with ultralytics
+# (relative model names are looked up in the pretrained directory, backends are imported only when selected)
+def create_estimator(modelname:str, **options) -> IVisionEstimator:
+    console = ConsoleLogger.get_logger()
+    model_path = pathlib.Path(modelname)
+    if not model_path.is_absolute():
+        model_path = _PRETRAINED_PATH / model_path
+    if not model_path.is_file():
+        raise FileNotFoundError(f"HPE model {model_path.as_posix()} does not exist")
+
+    console.info(f"Load model {model_path.as_posix()}")
+    suffix = model_path.suffix.lower()
+    if suffix==".onnx":
+        from hpe.onnx_pose import OnnxPoseEstimator
+        return OnnxPoseEstimator(model_path, **options)
+    if suffix==".pt":
+        from hpe.YOLOv8 import YoloPoseEstimator
+        return YoloPoseEstimator(model_path, **options)
+    raise ValueError(f"Unsupported HPE Model : {modelname}")
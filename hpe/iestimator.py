@@ -11,10 +11,15 @@ class IVisionEstimator(ABC):
         super().__init__()
         self.__name = name
     
+    # keypoints (persons, 17, 3 : x, y, confidence) of each image
     @abstractmethod
-    def predict(self, image:np.ndarray, fps:float):
+    def estimate_batch(self, images:list) -> list:
         pass
     
+    # keypoints of a single image
+    def predict(self, image:np.ndarray, fps:float):
+        return self.estimate_batch([image])[0]
+    
     # estimator name
     def get_name(self):
         return self.__name
\ No newline at end of file
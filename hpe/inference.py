@@ -0,0 +1,161 @@
+'''
+Batched Multi-Camera Pose Inference Service
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import time
+import threading
+import numpy as np
+
+try:
+    # using PyQt5
+    from PyQt5.QtCore import QThread, pyqtSignal
+except ImportError:
+    # using PyQt6
+    from PyQt6.QtCore import QThread, pyqtSignal
+
+from util.logger.console import ConsoleLogger
+from hpe.tracker import KeypointTracker
+from hpe.roi import RoiCropper, rois_of
+from hpe.backend import create_estimator
+
+'''
+Pose inference thread for multiple cameras
+Capture threads submit frames, only the latest frame of each camera is kept (a newer frame replaces the one waiting).
+The inference thread takes the latest frames of all cameras and runs the estimator once for the batch.
+Frames older than max_age when the batch is taken are dropped instead of inferred.
+Each camera has two frame buffers : one for the frame waiting, one for the frame being inferred.
+The estimator needs estimate_batch(images) returning keypoints (persons, 17, 3) of each image.
+With detect_interval>0, each camera has a KeypointTracker : only the cameras needing detection go into the estimator batch,
+keypoints of the other cameras are propagated by the tracker.
+With rois (camera_rois in config), cameras are estimated on their seat crops (see RoiCropper).
+'''
+class PoseInferenceService(QThread):
+
+    pose_result_signal = pyqtSignal(int, object, int) # camera id, keypoints (persons, 17, 3 : x, y, confidence), frame timestamp(ns)
+    pose_track_signal = pyqtSignal(int, object, object, int) # camera id, person ids, keypoints, frame timestamp(ns) (tracking only)
+
+    def __init__(self, estimator, max_age_ms:float=200.0, max_batch:int=8, detect_interval:int=0, rois:dict=None, roi_size:int=320):
+        super().__init__()
+        self.__console = ConsoleLogger.get_logger()
+
+        self.__estimator = estimator
+        self.__max_age_ns = int(max_age_ms*1e6)
+        self.__max_batch = max_batch
+        self.__lock = threading.Condition()
+        self.__buffers = {}  # camera id -> [buffer, buffer]
+        self.__latest = {}   # camera id -> (buffer index, timestamp ns) waiting for inference
+        self.__busy = {}     # camera id -> buffer index being inferred
+        self.__detect_interval = detect_interval
+        self.__trackers = {} # camera id -> KeypointTracker (used on inference thread only)
+        self.__cropper = RoiCropper(rois, roi_size) if rois else None
+        self.__stats = {"submitted":0, "replaced":0, "stale":0, "inferred":0, "tracked":0, "batches":0, "batch_latency_ms":0.0}
+
+    # inference service from config (hpe_model, hpe_detect_interval, camera_rois, hpe_roi_size)
+    @classmethod
+    def from_config(cls, config:dict, max_age_ms:float=200.0, max_batch:int=8):
+        rois, roi_size = rois_of(config)
+        estimator = create_estimator(config.get("hpe_model", "yolov8s-pose.pt"), **({"imgsz":roi_size} if rois else {}))
+        return cls(estimator, max_age_ms, max_batch, config.get("hpe_detect_interval", 0), rois, roi_size)
+
+    # submit a frame of the camera (called in capture thread, the frame is copied)
+    def submit(self, camera_id:int, frame:np.ndarray, timestamp_ns:int=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        with self.__lock:
+            buffers = self.__buffers.get(camera_id)
+            if buffers is None or buffers[0].shape!=frame.shape:
+                buffers = self.__buffers[camera_id] = [np.empty_like(frame), np.empty_like(frame)]
+                self.__busy.pop(camera_id, None)
+
+            index = 1 if self.__busy.get(camera_id)==0 else 0
+            np.copyto(buffers[index], frame)
+            if camera_id in self.__latest:
+                self.__stats["replaced"] += 1
+            self.__latest[camera_id] = (index, timestamp_ns)
+            self.__stats["submitted"] += 1
+            self.__lock.notify()
+
+    # inference statistics
+    def get_stats(self) -> dict:
+        with self.__lock:
+            return dict(self.__stats)
+
+    # close thread
+    def close(self) -> None:
+        self.requestInterruption()
+        with self.__lock:
+            self.__lock.notify()
+        self.quit()
+        self.wait(1000)
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            batch = self.__take_batch()
+            if not batch:
+                continue
+
+            detect = batch
+            if self.__detect_interval>0:
+                detect = [item for item in batch if self.__tracker(item[0]).needs_detection()]
+
+            t_start = time.monotonic_ns()
+            try:
+                if not detect:
+                    keypoints = []
+                elif self.__cropper:
+                    keypoints = self.__cropper.estimate(self.__estimator, [camera_id for camera_id, _, _ in detect], [image for _, image, _ in detect])
+                else:
+                    keypoints = self.__estimator.estimate_batch([image for _, image, _ in detect])
+            except Exception as e:
+                self.__console.critical(f"Pose inference failed : {e}")
+                keypoints = []
+                detect = []
+            latency_ms = (time.monotonic_ns()-t_start)/1e6
+            detected = {camera_id:kps for (camera_id, _, _), kps in zip(detect, keypoints)}
+
+            # tracking (propagated cameras or detected cameras)
+            results = []
+            for camera_id, image, timestamp_ns in batch:
+                if self.__detect_interval>0:
+                    ids, kps = self.__tracker(camera_id).update(image, detected.get(camera_id))
+                    results.append((camera_id, ids, kps, timestamp_ns))
+                elif camera_id in detected:
+                    results.append((camera_id, None, detected[camera_id], timestamp_ns))
+
+            with self.__lock:
+                for camera_id, _, _ in batch:
+                    self.__busy.pop(camera_id, None)
+                self.__stats["inferred"] += len(detected)
+                self.__stats["tracked"] += len(batch)-len(detect)
+                if detect:
+                    self.__stats["batches"] += 1
+                    self.__stats["batch_latency_ms"] += (latency_ms-self.__stats["batch_latency_ms"])*0.1 # smoothed
+
+            for camera_id, ids, kps, timestamp_ns in results:
+                self.pose_result_signal.emit(camera_id, kps, timestamp_ns)
+                if ids is not None:
+                    self.pose_track_signal.emit(camera_id, ids, kps, timestamp_ns)
+
+    def __tracker(self, camera_id:int) -> KeypointTracker:
+        if camera_id not in self.__trackers:
+            self.__trackers[camera_id] = KeypointTracker(detect_interval=self.__detect_interval)
+        return self.__trackers[camera_id]
+
+    # take latest frames (oldest first, at most max_batch), stale frames are dropped
+    def __take_batch(self) -> list:
+        with self.__lock:
+            if not self.__latest:
+                self.__lock.wait(0.1)
+            now = time.monotonic_ns()
+            batch = []
+            for camera_id, (index, timestamp_ns) in sorted(self.__latest.items(), key=lambda item: item[1][1]):
+                if len(batch)>=self.__max_batch:
+                    break
+                del self.__latest[camera_id]
+                if now-timestamp_ns>self.__max_age_ns:
+                    self.__stats["stale"] += 1
+                    continue
+                self.__busy[camera_id] = index
+                batch.append((camera_id, self.__buffers[camera_id][index], timestamp_ns))
+            return batch
@@ -0,0 +1,101 @@
+'''
+ONNX Runtime Pose Estimator (exported YOLOv8-pose model, CPU/OpenVINO)
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import pathlib
+import numpy as np
+import cv2
+import onnxruntime
+
+from util.logger.console import ConsoleLogger
+
+from hpe.iestimator import IVisionEstimator
+
+_PREFERRED_PROVIDERS = ["OpenVINOExecutionProvider", "CPUExecutionProvider"]
+
+
+# resize with unchanged aspect ratio and pad to (size, size), returns (letterboxed image, scale, (pad x, pad y))
+def letterbox(image:np.ndarray, size:int, pad_value:int=114):
+    h, w = image.shape[:2]
+    scale = min(size/h, size/w)
+    nw, nh = int(round(w*scale)), int(round(h*scale))
+    pad_x, pad_y = (size-nw)//2, (size-nh)//2
+    out = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    out[pad_y:pad_y+nh, pad_x:pad_x+nw] = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return out, scale, (pad_x, pad_y)
+
+# greedy non-maximum suppression, returns indices of kept boxes (x1, y1, x2, y2) by descending score
+def nms(boxes:np.ndarray, scores:np.ndarray, iou_threshold:float) -> np.ndarray:
+    areas = (boxes[:, 2]-boxes[:, 0])*(boxes[:, 3]-boxes[:, 1])
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size>0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2-xx1, 0, None)*np.clip(yy2-yy1, 0, None)
+        iou = inter/(areas[i]+areas[rest]-inter+1e-9)
+        order = rest[iou<=iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+'''
+YOLOv8-pose exported to ONNX (yolo export model=yolov8s-pose.pt format=onnx), run with onnxruntime
+Output (batch, 4+1+17*3, anchors) : box(cx, cy, w, h), person score, keypoints(x, y, confidence)
+Images are BGR, frames of different cameras are run in one batch if the model has a dynamic batch axis.
+The input size is fixed by the export : for seat crops, export with imgsz=roi_size (yolo export ... imgsz=320)
+and pass imgsz=roi_size (checked against the model input, used as input size of a model with dynamic input axes).
+'''
+class OnnxPoseEstimator(IVisionEstimator):
+    def __init__(self, model_path:pathlib.Path, conf:float=0.7, iou:float=0.7, max_det:int=30, providers:list=None, imgsz:int=None) -> None:
+        super().__init__(pathlib.Path(model_path).name)
+        self.__console = ConsoleLogger.get_logger()
+
+        if providers is None:
+            providers = [p for p in _PREFERRED_PROVIDERS if p in onnxruntime.get_available_providers()]
+        self.__session = onnxruntime.InferenceSession(pathlib.Path(model_path).as_posix(), providers=providers)
+        model_input = self.__session.get_inputs()[0]
+        self.__input_name = model_input.name
+        self.__input_size = model_input.shape[2] if isinstance(model_input.shape[2], int) else (imgsz or 640)
+        if imgsz and self.__input_size>imgsz:
+            self.__console.warning(f"{pathlib.Path(model_path).name} input size {self.__input_size} is larger than the crops ({imgsz}), export the model with imgsz={imgsz}")
+        self.__dynamic_batch = not isinstance(model_input.shape[0], int)
+        self.__conf = conf
+        self.__iou = iou
+        self.__max_det = max_det
+
+    def estimate_batch(self, images:list) -> list:
+        if not images:
+            return []
+        inputs, transforms = [], []
+        for image in images:
+            boxed, scale, pad = letterbox(image, self.__input_size)
+            inputs.append(boxed)
+            transforms.append((scale, pad))
+        blob = np.stack(inputs)[..., ::-1].transpose(0, 3, 1, 2).astype(np.float32)/255.0 # BGR->RGB, NCHW
+
+        if self.__dynamic_batch:
+            outputs = self.__session.run(None, {self.__input_name: blob})[0]
+        else:
+            outputs = np.concatenate([self.__session.run(None, {self.__input_name: blob[i:i+1]})[0] for i in range(len(images))])
+        return [self.__decode(output, *transform) for output, transform in zip(outputs, transforms)]
+
+    # keypoints of an image from model output (4+1+51, anchors)
+    def __decode(self, output:np.ndarray, scale:float, pad:tuple) -> np.ndarray:
+        preds = output.T
+        preds = preds[preds[:, 4]>self.__conf]
+        if len(preds)==0:
+            return np.zeros((0, 17, 3), dtype=np.float32)
+
+        cx, cy, w, h = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+        boxes = np.stack([cx-w/2, cy-h/2, cx+w/2, cy+h/2], axis=1)
+        keep = nms(boxes, preds[:, 4], self.__iou)[:self.__max_det]
+
+        keypoints = preds[keep, 5:].reshape(-1, 17, 3).astype(np.float32)
+        keypoints[..., 0] = (keypoints[..., 0]-pad[0])/scale # back to image coordinates
+        keypoints[..., 1] = (keypoints[..., 1]-pad[1])/scale
+        return keypoints
@@ -0,0 +1,86 @@
+'''
+Seat ROI Cropping for Pose Estimation
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import numpy as np
+import cv2
+
+'''
+Per-camera seat regions (camera_rois in config : {"<camera id>" : [[x, y, w, h], ...]} in frame pixels)
+Each region is cropped and resized so that its longer side is roi_size, the crops of all cameras go into one estimator batch,
+then keypoints are mapped back to frame coordinates. A seat holds one occupant, so only the most confident person of
+a region is kept (max_persons). The estimator has to run at roi_size input (create_estimator(..., imgsz=roi_size) :
+ultralytics predicts at imgsz, an ONNX model has to be exported with imgsz=roi_size), otherwise every crop is scaled
+back up to the model input size and N seats cost N full size inferences.
+Frames of cameras without regions go into the same batch, so they are estimated at roi_size as well.
+'''
+class RoiCropper:
+    def __init__(self, rois:dict, roi_size:int=320, max_persons:int=1) -> None:
+        self.__rois = {int(camera_id):[tuple(int(v) for v in roi) for roi in regions] for camera_id, regions in rois.items() if regions}
+        self.__roi_size = roi_size
+        self.__max_persons = max_persons
+
+    def get_roi_size(self) -> int:
+        return self.__roi_size
+
+    def has_rois(self, camera_id:int) -> bool:
+        return camera_id in self.__rois
+
+    # crops of the camera frame : [(crop, (x offset, y offset, scale))]
+    def crop(self, camera_id:int, image:np.ndarray) -> list:
+        crops = []
+        h, w = image.shape[:2]
+        for x, y, rw, rh in self.__rois[camera_id]:
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(w, x+rw), min(h, y+rh)
+            if x1<=x0 or y1<=y0:
+                continue
+            scale = self.__roi_size/max(x1-x0, y1-y0)
+            region = image[y0:y1, x0:x1]
+            if scale!=1.0:
+                region = cv2.resize(region, (max(1, int(round((x1-x0)*scale))), max(1, int(round((y1-y0)*scale)))), interpolation=cv2.INTER_AREA if scale<1.0 else cv2.INTER_LINEAR)
+            crops.append((region, (x0, y0, scale)))
+        return crops
+
+    # keypoints of the crops in frame coordinates (persons, 17, 3)
+    def merge(self, keypoints:list, transforms:list) -> np.ndarray:
+        merged = []
+        for kps, (x0, y0, scale) in zip(keypoints, transforms):
+            if len(kps)==0:
+                continue
+            if self.__max_persons>0:
+                kps = kps[np.argsort(-kps[..., 2].mean(axis=1))[:self.__max_persons]]
+            kps = kps.astype(np.float32)
+            kps[..., 0] = kps[..., 0]/scale + x0
+            kps[..., 1] = kps[..., 1]/scale + y0
+            merged.append(kps)
+        if not merged:
+            return np.zeros((0, 17, 3), dtype=np.float32)
+        return np.concatenate(merged)
+
+    # batched estimation of frames (cameras with ROIs are estimated on their crops), returns keypoints of each frame
+    def estimate(self, estimator, camera_ids:list, images:list) -> list:
+        inputs, owners = [], [] # estimator inputs, (frame index, transform or None)
+        for i, (camera_id, image) in enumerate(zip(camera_ids, images)):
+            if self.has_rois(camera_id):
+                for region, transform in self.crop(camera_id, image):
+                    inputs.append(region)
+                    owners.append((i, transform))
+            else:
+                inputs.append(image)
+                owners.append((i, None))
+
+        outputs = estimator.estimate_batch(inputs) if inputs else []
+        results = [[[], []] for _ in images] # per frame : keypoints of crops, transforms
+        for (i, transform), kps in zip(owners, outputs):
+            results[i][0].append(kps)
+            results[i][1].append(transform if transform else (0, 0, 1.0))
+        return [self.merge(kps, transforms) if self.has_rois(camera_id) else (kps[0] if kps else np.zeros((0, 17, 3), dtype=np.float32))
+                for camera_id, (kps, transforms) in zip(camera_ids, results)]
+
+
+# seat regions of the config (camera_rois) : camera id -> regions, and the crop size (hpe_roi_size)
+def rois_of(config:dict) -> tuple:
+    rois = {int(camera_id):regions for camera_id, regions in config.get("camera_rois", {}).items() if regions}
+    return rois, int(config.get("hpe_roi_size", 320))
@@ -0,0 +1,108 @@
+'''
+Temporal Keypoint Tracker (detect every K frames, optical flow in between)
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import numpy as np
+import cv2
+
+'''
+Keypoint tracker of a camera
+Full detection is needed every detect_interval frames, or when a tracked person's mean keypoint confidence falls below
+min_confidence. In between, keypoints are propagated with pyramidal Lucas-Kanade optical flow, and the confidence of
+propagated keypoints decays so that a drifting track triggers detection. Detections are matched to tracks by the mean
+keypoint distance (relative to the track size) to keep person IDs stable. Unmatched tracks are kept for max_missed detections.
+'''
+class KeypointTracker:
+    def __init__(self, detect_interval:int=5, min_confidence:float=0.5, match_distance:float=0.5, max_missed:int=2, decay:float=0.95, flow_scale:float=0.5) -> None:
+        self.__detect_interval = detect_interval
+        self.__min_confidence = min_confidence
+        self.__match_distance = match_distance
+        self.__max_missed = max_missed
+        self.__decay = decay
+        self.__flow_scale = flow_scale
+        self.__lk_params = dict(winSize=(21, 21), maxLevel=3, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+        self.reset()
+
+    def reset(self):
+        self.__tracks = {} # person id -> [keypoints (17, 3), missed detections]
+        self.__next_id = 0
+        self.__prev_gray = None
+        self.__since_detection = self.__detect_interval
+
+    # True if the next frame has to be detected
+    def needs_detection(self) -> bool:
+        if self.__prev_gray is None or self.__since_detection>=self.__detect_interval:
+            return True
+        return any(missed==0 and keypoints[:, 2].mean()<self.__min_confidence for keypoints, missed in self.__tracks.values())
+
+    # update with the frame and its detected keypoints (None to propagate), returns (person ids, keypoints (persons, 17, 3))
+    def update(self, image:np.ndarray, detections:np.ndarray=None):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim==3 else image
+        if self.__flow_scale!=1.0:
+            gray = cv2.resize(gray, None, fx=self.__flow_scale, fy=self.__flow_scale, interpolation=cv2.INTER_AREA)
+
+        if detections is not None:
+            self.__associate(np.asarray(detections, dtype=np.float32).reshape(-1, 17, 3))
+            self.__since_detection = 0
+        elif self.__prev_gray is not None:
+            self.__propagate(gray)
+        self.__since_detection += 1
+        self.__prev_gray = gray
+
+        alive = [(pid, keypoints) for pid, (keypoints, missed) in self.__tracks.items() if missed==0]
+        if not alive:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 17, 3), dtype=np.float32)
+        return np.array([pid for pid, _ in alive], dtype=np.int64), np.stack([keypoints for _, keypoints in alive])
+
+    # move keypoints of alive tracks with optical flow
+    def __propagate(self, gray:np.ndarray):
+        alive = [track for track in self.__tracks.values() if track[1]==0]
+        if not alive:
+            return
+        keypoints = np.stack([track[0] for track in alive])
+        points = (keypoints[..., :2].reshape(-1, 1, 2)*self.__flow_scale).astype(np.float32)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.__prev_gray, gray, points, None, **self.__lk_params)
+        lost = status.reshape(-1)==0
+
+        keypoints[..., :2] = np.where(lost[:, None], keypoints[..., :2].reshape(-1, 2), moved.reshape(-1, 2)/self.__flow_scale).reshape(-1, 17, 2)
+        keypoints[..., 2] = np.where(lost, 0.0, keypoints[..., 2].reshape(-1)*self.__decay).reshape(-1, 17)
+        for track, kps in zip(alive, keypoints):
+            track[0] = kps
+
+    # match detections to tracks (greedy by normalized keypoint distance)
+    def __associate(self, detections:np.ndarray):
+        pids = list(self.__tracks.keys())
+        matched_tracks, matched_dets = set(), set()
+        if pids and len(detections)>0:
+            tracks = np.stack([self.__tracks[pid][0] for pid in pids])
+            cost = np.stack([_keypoint_distance(track, detections) for track in tracks]) # (tracks, detections)
+            for flat in np.argsort(cost, axis=None):
+                t, d = np.unravel_index(flat, cost.shape)
+                if cost[t, d]>self.__match_distance:
+                    break
+                if t in matched_tracks or d in matched_dets:
+                    continue
+                matched_tracks.add(t)
+                matched_dets.add(d)
+                self.__tracks[pids[t]] = [detections[d].copy(), 0]
+
+        for t, pid in enumerate(pids):
+            if t not in matched_tracks:
+                self.__tracks[pid][1] += 1
+                if self.__tracks[pid][1]>self.__max_missed:
+                    del self.__tracks[pid]
+        for d in range(len(detections)):
+            if d not in matched_dets:
+                self.__tracks[self.__next_id] = [detections[d].copy(), 0]
+                self.__next_id += 1
+
+
+# mean distance between keypoints of a track and detections (persons, 17, 3) relative to the track size
+def _keypoint_distance(track:np.ndarray, detections:np.ndarray) -> np.ndarray:
+    visible = (track[:, 2]>0)[None, :] & (detections[..., 2]>0)
+    distance = np.linalg.norm(detections[..., :2]-track[None, :, :2], axis=2)
+    xy = track[track[:, 2]>0, :2]
+    size = max(float(np.ptp(xy[:, 0]) + np.ptp(xy[:, 1])) if len(xy)>1 else 1.0, 1.0)
+    count = visible.sum(axis=1)
+    return np.where(count>0, (distance*visible).sum(axis=1)/np.maximum(count, 1)/size, np.inf)
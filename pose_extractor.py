@@ -0,0 +1,190 @@
+'''
+Offline Pose Extractor for recorded sessions
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import argparse
+import sys, os
+import pathlib
+import json
+import queue
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from util.logger.console import ConsoleLogger
+from util.logger.video_index import open_frame_index
+from hpe.roi import rois_of
+
+'''
+Output (<session>/pose/pose_N.npz, for camera/cam_N.avi or camera/cam_N.raw)
+  keypoints    : (persons, 17, 3 : x, y, confidence) of all frames
+  offsets      : (frames+1) keypoints of frame n are keypoints[offsets[n]:offsets[n+1]]
+  timestamp    : (frames) wall clock timestamp(sec) from the recording
+  monotonic_ns : (frames) monotonic clock from the recording
+Results are saved in parts (pose_N.partXXXXXXXX.npz) while extracting, an interrupted extraction resumes after the last part.
+Cameras with seat regions (camera_rois in config) are estimated on their crops (see hpe.roi.RoiCropper).
+'''
+
+_estimator = None # estimator of the worker process
+_cropper = None   # seat crops of the worker process (None if no regions)
+
+def init_worker(modelname, rois, roi_size):
+    global _estimator, _cropper
+    from hpe.backend import create_estimator
+    from hpe.roi import RoiCropper
+    _estimator = create_estimator(modelname, **({"imgsz":roi_size} if rois else {}))
+    _cropper = RoiCropper(rois, roi_size) if rois else None
+
+
+def find_videos(path):
+    """Finds recorded videos in camera directories (data/<subject>/<timestamp>/camera)."""
+    videos = []
+    for root, dirs, files in os.walk(path):
+        if pathlib.Path(root).name!="camera":
+            continue
+        for name in sorted(files + dirs):
+            if name.startswith("cam_") and name.lower().endswith(('.avi', '.raw')):
+                videos.append(pathlib.Path(root)/name)
+        dirs[:] = [] # raw recordings are directories
+    return videos
+
+def output_path_of(video_path):
+    camera_id = video_path.stem.split("_")[-1]
+    return video_path.parent.parent/"pose"/f"pose_{camera_id}.npz"
+
+def save_npz(path, **arrays):
+    tmp_path = path.with_name(path.name+".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path) # a part is complete or absent
+
+
+def read_frames(index, start, frames, stop_event, errors):
+    """Reader thread : decodes frames into the queue (None at the end, frame is None if it cannot be decoded)."""
+    try:
+        for n in range(start, len(index)):
+            if stop_event.is_set():
+                break
+            frames.put((n, index.get_frame(n)))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        frames.put(None)
+
+def extract_video(video_path, batch_size, chunk_frames):
+    """Extracts keypoints of all frames of the video (runs in a worker process)."""
+    out_path = output_path_of(video_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    part_prefix = out_path.stem+".part"
+
+    # resume after the saved parts
+    parts = sorted(out_path.parent.glob(f"{part_prefix}*.npz"))
+    start = 0
+    for part in parts:
+        with np.load(part) as data:
+            start = max(start, int(part.stem[len(part_prefix):]) + len(data["offsets"])-1)
+
+    camera_id = int(video_path.stem.split("_")[-1])
+    cropper = _cropper if _cropper and _cropper.has_rois(camera_id) else None
+    index = open_frame_index(video_path, use_cache=False)
+    frames = queue.Queue(maxsize=batch_size*4)
+    stop_event = threading.Event()
+    errors = []
+    reader = threading.Thread(target=read_frames, args=(index, start, frames, stop_event, errors), daemon=True)
+    reader.start()
+    try:
+        part_start, part_keypoints = start, []
+        done = False
+        while not done:
+            batch = []
+            while len(batch)<batch_size:
+                item = frames.get()
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+            if batch:
+                valid = [frame for _, frame in batch if frame is not None]
+                if not valid:
+                    estimated = iter([])
+                elif cropper:
+                    estimated = iter(cropper.estimate(_estimator, [camera_id]*len(valid), valid))
+                else:
+                    estimated = iter(_estimator.estimate_batch(valid))
+                part_keypoints += [next(estimated) if frame is not None else np.zeros((0, 17, 3), dtype=np.float32) for _, frame in batch]
+            if part_keypoints and (done or len(part_keypoints)>=chunk_frames):
+                counts = [len(k) for k in part_keypoints]
+                save_npz(out_path.parent/f"{part_prefix}{part_start:08d}.npz",
+                         keypoints=np.concatenate(part_keypoints).reshape(-1, 17, 3).astype(np.float32),
+                         offsets=np.concatenate([[0], np.cumsum(counts)]))
+                part_start += len(part_keypoints)
+                part_keypoints = []
+        if errors:
+            raise errors[0] # saved parts are kept to resume
+
+        # merge parts
+        parts = sorted(out_path.parent.glob(f"{part_prefix}*.npz"))
+        keypoints, offsets = [], [np.zeros(1, dtype=np.int64)]
+        for part in parts:
+            with np.load(part) as data:
+                keypoints.append(data["keypoints"])
+                offsets.append(data["offsets"][1:]+offsets[-1][-1])
+        save_npz(out_path,
+                 keypoints=np.concatenate(keypoints) if keypoints else np.zeros((0, 17, 3), dtype=np.float32),
+                 offsets=np.concatenate(offsets),
+                 timestamp=np.asarray(index.get_timestamps(), dtype=np.float64),
+                 monotonic_ns=np.asarray(index.get_monotonic_ns(), dtype=np.int64))
+        for part in parts:
+            part.unlink()
+        return video_path, len(index), int(offsets[-1][-1])
+    finally:
+        stop_event.set()
+        while reader.is_alive(): # unblock the reader
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        index.close()
+
+
+if __name__ == "__main__":
+    console = ConsoleLogger.get_logger()
+
+    # default model and seat regions from the monitor config
+    config = {}
+    config_path = pathlib.Path(__file__).parent/"avsim_monitor.cfg"
+    if config_path.is_file():
+        with open(config_path, "r") as file:
+            config = json.load(file)
+    model = config.get("hpe_model", "yolov8s-pose.pt")
+    rois, roi_size = rois_of(config)
+
+    # arguments
+    parser = argparse.ArgumentParser(description="Extract keypoints from recorded session videos")
+    parser.add_argument('--path', nargs='?', required=True, help="Data path (workspace root, subject or session directory)", default="data")
+    parser.add_argument('--model', nargs='?', default=model, help="HPE model (*.onnx, *.pt)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (one video per worker)")
+    parser.add_argument('--batch', type=int, default=8, help="Frames per inference batch")
+    parser.add_argument('--chunk', type=int, default=1000, help="Frames per saved part (resume unit)")
+    parser.add_argument('--overwrite', action='store_true', help="Extract videos already extracted")
+    parser.add_argument('--roi-size', type=int, default=roi_size, help="Seat crop size (camera_rois in config, model input size)")
+    parser.add_argument('--no-roi', action='store_true', help="Estimate full frames even if camera_rois are configured")
+    args = parser.parse_args()
+
+    try:
+        videos = [v for v in find_videos(args.path) if args.overwrite or not output_path_of(v).is_file()]
+        if args.no_roi:
+            rois = {}
+        console.info(f"{len(videos)} videos to extract with {args.model}" + (f" (seat crops of cameras {sorted(rois)})" if rois else ""))
+
+        with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=init_worker, initargs=(args.model, rois, args.roi_size)) as pool:
+            futures = [pool.submit(extract_video, v, args.batch, args.chunk) for v in videos]
+            for future in as_completed(futures):
+                try:
+                    video_path, frames, persons = future.result()
+                    console.info(f"Extracted {video_path.as_posix()} ({frames} frames, {persons} persons)")
+                except Exception as e:
+                    console.error(f"Extraction failed : {e}")
+    except Exception as e:
+        console.critical(f"{e}")
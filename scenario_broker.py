@@ -12,6 +12,7 @@ import paho.mqtt.client as mqtt
 import time
 
 from util.logger.console import ConsoleLogger
+from avsim_monitor.mapi import MapiDispatcher
 import subprocess
 import threading
 
@@ -28,6 +29,8 @@ class command_broker:
             "flame/avsim/carla/process/mapi_launch": self.on_process_launch
             #"flame/avsim/carla/process/mapi_terminate": self.on_process_terminate
         }
+        self.mapi_dispatcher = MapiDispatcher()
+        self.mapi_dispatcher.register_all(self.message_api)
 
         # MQTT Connections
         self.mq_client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, client_id="commad_broker", transport='tcp', protocol=mqtt.MQTTv311, clean_session=True)
@@ -39,7 +42,7 @@ class command_broker:
 
     def on_mqtt_connect(self, client, userdata, flags, reason_code, properties):
         if reason_code==0:
-            for topic in self.message_api.keys():
+            for topic in self.mapi_dispatcher.topics():
                 self.mq_client.subscribe(topic, 0)
             self.__console.info(f"Connected to broker successfully")
         else:
@@ -53,10 +56,9 @@ class command_broker:
         self.__console.info(f"Message API : {mapi}")
 
         try:
-            if mapi in self.message_api.keys():
+            if self.mapi_dispatcher.has_handler(mapi):
                 self.__console.info(f"Payload : {msg.payload}")
-                payload = json.loads(msg.payload)
-                self.message_api[mapi](payload)
+                self.mapi_dispatcher.dispatch(mapi, msg.payload)
                 self.__console.info(f"Call mapi : {mapi}")
             else:
                 self.__console.warning(f"Unknown Message API was called : {mapi}")
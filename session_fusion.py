@@ -0,0 +1,174 @@
+'''
+Session Fusion (merge the logs of a session into one time-indexed table)
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import argparse
+import sys, os
+import pathlib
+import csv
+import numpy as np
+
+from util.logger.console import ConsoleLogger
+from util.logger.columnar import read_columnar
+from util.logger.raw_video import RawFrameReader
+from util.logger.journal import JournalReader, Source
+
+'''
+Session workspace (data/<subject>/<timestamp>, created by the monitor)
+  session.jrnl             : session journal (scenario events, n-back responses and recorded frames, see util.logger.journal)
+  scenario_history.csv     : [wall clock(sec), event] (unless log_csv is disabled)
+  nback_response.csv       : [wall clock(sec) of the n-back device, response] (unless log_csv is disabled)
+  camera/timestamp_N.csv   : [wall clock(sec), dropped frames, monotonic ns] per recorded frame (or camera/cam_N.raw index)
+  eyetracker/gaze          : captured gaze samples (device ns, monotonic ns, wall ns, x, y, worn)
+
+Events and frame timestamps are read from the journal if the session has one, otherwise from the csv logs.
+
+All sources are aligned on the wall clock. Each event row gets the camera frame numbers and the gaze sample
+at the event time (as-of join : last frame/sample at or before the event, within the tolerance, otherwise -1/NaN).
+'''
+
+# events of a log file [timestamp, message] : (times, messages)
+def load_event_log(path):
+    if not path.is_file():
+        return np.zeros(0), np.zeros(0, dtype=object)
+    with open(path, "r", newline="") as file:
+        rows = [row for row in csv.reader(file) if len(row)>=2]
+    times = np.array([row[0] for row in rows], dtype=object)
+    messages = np.array([row[1] for row in rows], dtype=object)
+    valid = np.array([_is_float(t) for t in times], dtype=bool)
+    return times[valid].astype(np.float64), messages[valid]
+
+def _is_float(value) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+# wall clock timestamps(sec) of recorded frames per camera : camera id -> timestamps
+def load_frame_timestamps(camera_path):
+    cameras = {}
+    if not camera_path.is_dir():
+        return cameras
+    for path in sorted(camera_path.glob("timestamp_*.csv")):
+        data = np.genfromtxt(path, delimiter=",", usecols=0, dtype=np.float64, invalid_raise=False) if path.stat().st_size>0 else np.zeros(0)
+        data = np.atleast_1d(data)
+        cameras[int(path.stem.split("_")[-1])] = data[~np.isnan(data)] # a line cut by an interrupted recording is dropped
+    for path in sorted(camera_path.glob("cam_*.raw")): # raw recording without timestamp file
+        camera_id = int(path.stem.split("_")[-1])
+        if camera_id not in cameras:
+            reader = RawFrameReader(path)
+            cameras[camera_id] = reader.get_timestamps()
+            reader.close()
+    return cameras
+
+# events and frame timestamps of the session journal : (scenario (times, messages), nback (times, messages), camera id -> timestamps)
+def load_journal(path):
+    reader = JournalReader(path)
+    try:
+        events = []
+        for source in (Source.SCENARIO, Source.NBACK):
+            times, texts = reader.get_messages(source)
+            messages = np.empty(len(texts), dtype=object)
+            messages[:] = texts
+            events.append((times, messages))
+        cameras = {camera_id:reader.get_frames(camera_id)[0] for camera_id in reader.get_cameras()}
+    finally:
+        reader.close()
+    return events[0], events[1], cameras
+
+# as-of join : index of the last reference time at or before each time (-1 if none within the tolerance)
+def asof_index(reference, times, tolerance):
+    if len(reference)==0:
+        return np.full(len(times), -1, dtype=np.int64)
+    index = np.searchsorted(reference, times, side="right")-1
+    valid = index>=0
+    valid[valid] &= (times[valid]-reference[index[valid]])<=tolerance
+    return np.where(valid, index, -1).astype(np.int64)
+
+
+def fuse_session(session_path, tolerance=1.0) -> dict:
+    """Fused table of the session (column name -> array, sorted by time)."""
+    journal_path = session_path/"session.jrnl"
+    if journal_path.is_file():
+        (scenario_t, scenario_msg), (nback_t, nback_msg), cameras = load_journal(journal_path)
+        for camera_id, frame_t in load_frame_timestamps(session_path/"camera").items(): # recorded without the journal
+            cameras.setdefault(camera_id, frame_t)
+    else:
+        scenario_t, scenario_msg = load_event_log(session_path/"scenario_history.csv")
+        nback_t, nback_msg = load_event_log(session_path/"nback_response.csv")
+        cameras = load_frame_timestamps(session_path/"camera")
+
+    times = np.concatenate([scenario_t, nback_t])
+    order = np.argsort(times, kind="stable")
+    table = {
+        "time": times[order],
+        "source": np.concatenate([np.full(len(scenario_t), "scenario", dtype=object), np.full(len(nback_t), "nback", dtype=object)])[order],
+        "message": np.concatenate([scenario_msg, nback_msg])[order],
+    }
+
+    for camera_id, frame_t in sorted(cameras.items()):
+        table[f"cam_{camera_id}_frame"] = asof_index(frame_t, table["time"], tolerance)
+
+    gaze_path = session_path/"eyetracker"/"gaze"
+    if (gaze_path/"schema.json").is_file():
+        gaze = read_columnar(gaze_path)
+        gaze_t = gaze["wall_ns"]/1e9
+        index = asof_index(gaze_t, table["time"], tolerance)
+        found = index>=0
+        for column, missing in (("x", np.nan), ("y", np.nan), ("worn", 0)):
+            values = np.full(len(index), missing, dtype=gaze[column].dtype)
+            values[found] = gaze[column][index[found]]
+            table[f"gaze_{column}"] = values
+    return table
+
+
+# write table as Parquet (requires pyarrow) or HDF5 (requires h5py), indexed by time
+def write_table(table, path):
+    path = pathlib.Path(path)
+    if path.suffix.lower() in (".h5", ".hdf5"):
+        import h5py
+        with h5py.File(path, "w") as file:
+            group = file.create_group("session")
+            for name, values in table.items():
+                if values.dtype==object:
+                    group.create_dataset(name, data=values.astype(str).astype(object), dtype=h5py.string_dtype())
+                else:
+                    group.create_dataset(name, data=values)
+            group.attrs["index"] = "time"
+    else:
+        import pyarrow
+        import pyarrow.parquet
+        arrays = {name:(pyarrow.array(values.tolist(), type=pyarrow.string()) if values.dtype==object else pyarrow.array(values)) for name, values in table.items()}
+        pyarrow.parquet.write_table(pyarrow.table(arrays).replace_schema_metadata({"index":"time"}), path)
+
+# session directories under the path (directories having session.jrnl or scenario_history.csv)
+def find_sessions(path):
+    path = pathlib.Path(path)
+    return sorted({p.parent for p in path.rglob("session.jrnl")} | {p.parent for p in path.rglob("scenario_history.csv")})
+
+
+if __name__ == "__main__":
+    console = ConsoleLogger.get_logger()
+
+    # arguments
+    parser = argparse.ArgumentParser(description="Merge the logs of sessions into one time-indexed table per session")
+    parser.add_argument('--path', nargs='?', required=True, help="Data path (workspace root, subject or session directory)", default="data")
+    parser.add_argument('--format', choices=["parquet", "h5"], default="parquet", help="Output format (session.parquet or session.h5 in each session)")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="Max. time(sec) between an event and the matched frame/sample")
+    args = parser.parse_args()
+
+    try:
+        sessions = find_sessions(args.path)
+        console.info(f"{len(sessions)} sessions found")
+        for session_path in sessions:
+            try:
+                table = fuse_session(session_path, args.tolerance)
+                out_path = session_path/f"session.{args.format}"
+                write_table(table, out_path)
+                console.info(f"Saved {out_path.as_posix()} ({len(table['time'])} events, {len(table)} columns)")
+            except Exception as e:
+                console.error(f"Fusion failed for {session_path.as_posix()} : {e}")
+    except Exception as e:
+        console.critical(f"{e}")
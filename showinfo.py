@@ -10,8 +10,10 @@ from datetime import datetime
 import argparse
 import time
 import cv2
+import numpy as np
 
 from util.logger.console import ConsoleLogger
+from util.logger.video_index import open_frame_index, VideoIndexError
 
 
 if __name__ == "__main__":
@@ -20,7 +22,8 @@ if __name__ == "__main__":
 
     # arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument('--file', nargs='?', required=True, help="Video File(*.avi)")
+    parser.add_argument('--file', nargs='?', required=True, help="Video File(*.avi) or raw recording directory")
+    parser.add_argument('--save-index', action='store_true', help="Save frame index next to the video (*.index.npz)")
     args = parser.parse_args()
     
     try:
@@ -28,6 +31,25 @@ if __name__ == "__main__":
         target_file = pathlib.Path(args.file)
         console.info(f"Target File : {target_file.as_posix()}")
 
+        # frame index from the container (no decoding)
+        try:
+            index = open_frame_index(target_file, use_cache=args.save_index)
+            timestamps = index.get_timestamps()
+            print("================================")
+            print(f"File : {target_file.as_posix()}")
+            print(f"Resolution : {index.get_resolution()}")
+            print(f"Total Frames : {len(index)}")
+            print(f"FPS : {index.get_fps()}")
+            if len(timestamps)>0 and not np.isnan(timestamps[0]):
+                print(f"Duration : {timestamps[-1]-timestamps[0]} (recorded timestamps)")
+            elif index.get_fps()>0:
+                print(f"Duration : {len(index)/index.get_fps()}")
+            print("================================")
+            index.close()
+            sys.exit(0)
+        except (OSError, VideoIndexError) as e:
+            console.warning(f"Cannot read frame index ({e})")
+
         target = cv2.VideoCapture(target_file.as_posix()) # load target video file
         if not target.isOpened():
             console.error(f"Could not open video file.")
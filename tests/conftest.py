@@ -0,0 +1,5 @@
+import sys
+import pathlib
+
+# modules are imported from the repository root (as the applications run)
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
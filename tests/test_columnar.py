@@ -0,0 +1,30 @@
+import numpy as np
+
+from util.logger.columnar import ColumnarWriter, read_columnar
+
+DTYPE = np.dtype([("wall_ns", "<i8"), ("x", "<f4")])
+
+
+def test_samples_are_written_in_chunks(tmp_path):
+    writer = ColumnarWriter(tmp_path/"gaze", DTYPE, block_size=4, blocks=2)
+    for n in range(10):
+        writer.append((n, n*0.5))
+    writer.close()
+    assert len(list((tmp_path/"gaze").glob("chunk_*.npz")))==3
+    columns = read_columnar(tmp_path/"gaze")
+    assert columns["wall_ns"].tolist()==list(range(10))
+    assert columns["x"].dtype==np.float32
+    assert writer.get_samples()==10
+
+def test_interrupted_chunk_is_ignored(tmp_path):
+    writer = ColumnarWriter(tmp_path/"gaze", DTYPE, block_size=4)
+    for n in range(4):
+        writer.append((n, 0.0))
+    writer.close()
+    (tmp_path/"gaze"/"chunk_00001.tmp").write_bytes(b"partial")
+    assert len(read_columnar(tmp_path/"gaze")["wall_ns"])==4
+
+def test_empty_recording(tmp_path):
+    ColumnarWriter(tmp_path/"gaze", DTYPE).close()
+    columns = read_columnar(tmp_path/"gaze")
+    assert len(columns["x"])==0 and columns["x"].dtype==np.float32
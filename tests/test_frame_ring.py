@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from device.camera.frame_ring import FrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing((4, 6, 3), slots=3)
+    yield ring
+    ring.close()
+
+def frame(value):
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+def test_write_and_read(ring):
+    slot, seq = ring.write(frame(7))
+    assert seq==1
+    assert ring.latest()==(slot, seq)
+    view = ring.read(slot, seq)
+    assert np.array_equal(view, frame(7))
+    assert not view.flags.writeable
+
+def test_empty_ring_has_no_frame(ring):
+    slot, seq = ring.latest()
+    assert seq==0
+    assert ring.read(slot, seq) is None
+
+def test_overwritten_frame_is_detected(ring):
+    slot, seq = ring.write(frame(1))
+    for value in range(2, 2+ring.get_slots()):
+        ring.write(frame(value))
+    assert not ring.is_valid(slot, seq)
+    assert ring.read(slot, seq) is None
+
+def test_slot_being_written_is_invalid(ring):
+    ring.write(frame(1))
+    first_slot, first_seq = ring.write(frame(2))
+    for _ in range(ring.get_slots()-1):
+        ring.write(frame(3))
+    slot, seq, buffer = ring.acquire() # reuses the slot of the second frame
+    assert slot==first_slot
+    assert not ring.is_valid(first_slot, first_seq)
+    assert ring.read(slot, seq) is None
+    buffer[...] = 9
+    ring.commit(slot, seq)
+    assert np.array_equal(ring.read(slot, seq), frame(9))
+
+def test_attach_reads_frames_of_the_owner(ring):
+    slot, seq = ring.write(frame(5))
+    attached = FrameRing.attach(ring.get_name())
+    try:
+        assert attached.get_shape()==ring.get_shape()
+        assert np.array_equal(attached.read(slot, seq), frame(5))
+    finally:
+        attached.close()
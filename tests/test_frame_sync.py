@@ -0,0 +1,52 @@
+from device.camera.frame_sync import FrameSynchronizer, FrameBundle, SyncPolicy
+
+MS = 1_000_000
+
+
+# release(camera id, frame) callback keeping the released frames
+class Releases:
+    def __init__(self):
+        self.frames = []
+
+    def __call__(self, camera_id, frame):
+        self.frames.append((camera_id, frame))
+
+
+def test_frames_within_tolerance_make_a_bundle():
+    sync = FrameSynchronizer((0, 1), tolerance_ns=2*MS, max_wait_ns=50*MS)
+    assert sync.push(0, "a0", 100*MS, arrival_ns=0)==[]
+    bundles = sync.push(1, "b0", 101*MS, arrival_ns=1*MS)
+    assert len(bundles)==1
+    assert bundles[0].frames=={0:"a0", 1:"b0"}
+    assert bundles[0].is_complete()
+    assert bundles[0].spread_ns()==1*MS
+
+def test_missing_camera_after_max_wait():
+    releases = Releases()
+    sync = FrameSynchronizer((0, 1), tolerance_ns=2*MS, max_wait_ns=50*MS, release=releases)
+    sync.push(0, "a0", 100*MS, arrival_ns=0)
+    assert sync.poll(now_ns=10*MS)==[]
+    bundles = sync.poll(now_ns=60*MS)
+    assert len(bundles)==1 and bundles[0].missing==(1,)
+    assert sync.push(1, "late", 99*MS, arrival_ns=61*MS)==[] # older than the emitted bundle
+    assert releases.frames==[(1, "late")]
+    assert sync.get_stats()["partial"]==1 and sync.get_stats()["late"]==1
+
+def test_drop_policy_releases_incomplete_bundles():
+    releases = Releases()
+    sync = FrameSynchronizer((0, 1), tolerance_ns=2*MS, max_wait_ns=50*MS, policy=SyncPolicy.DROP, release=releases)
+    sync.push(0, "a0", 100*MS, arrival_ns=0)
+    assert sync.poll(now_ns=60*MS)==[]
+    assert releases.frames==[(0, "a0")]
+    assert sync.get_stats()["dropped"]==1
+
+def test_bundle_releases_frames_after_the_last_consumer():
+    releases = Releases()
+    bundle = FrameBundle(0, {0:"a0", 1:"b0"}, {0:0, 1:0}, (), releases)
+    bundle.retain(1)
+    bundle.release()
+    assert releases.frames==[]
+    bundle.release()
+    assert sorted(releases.frames)==[(0, "a0"), (1, "b0")]
+    bundle.release() # released once only
+    assert len(releases.frames)==2
@@ -0,0 +1,83 @@
+import struct
+import pytest
+
+from util.logger.journal import JournalWriter, JournalReader, JournalError, Source, Event
+
+
+def write_journal(path, texts):
+    writer = JournalWriter(path, block_records=2)
+    for n, text in enumerate(texts):
+        writer.append_text(Source.SCENARIO, text, monotonic_ns=n, wall_ns=1000+n)
+    writer.close()
+
+def read_texts(path):
+    reader = JournalReader(path)
+    try:
+        return reader.get_messages(Source.SCENARIO)[1], reader.torn
+    finally:
+        reader.close()
+
+
+def test_records_are_read_back(tmp_path):
+    path = tmp_path/"session.jrnl"
+    write_journal(path, ["a", "b", "c"])
+    reader = JournalReader(path)
+    try:
+        times, texts = reader.get_messages(Source.SCENARIO)
+        assert texts==["a", "b", "c"]
+        assert times.tolist()==[1000/1e9, 1001/1e9, 1002/1e9]
+        assert reader.find(1, clock="monotonic_ns")==1
+        assert reader.find_range(1, 3).tolist()==[1, 2]
+        assert not reader.torn
+    finally:
+        reader.close()
+
+def test_truncated_tail_is_ignored_and_cut_on_append(tmp_path):
+    path = tmp_path/"session.jrnl"
+    write_journal(path, ["a", "b", "c"]) # blocks [a, b], [c]
+    path.write_bytes(path.read_bytes()[:-3]) # crash while writing the last block
+    assert read_texts(path)==(["a", "b"], True)
+
+    writer = JournalWriter(path) # cuts off the torn block
+    writer.append_text(Source.SCENARIO, "d")
+    writer.close()
+    assert read_texts(path)==(["a", "b", "d"], False)
+
+def test_corrupted_block_ends_the_journal(tmp_path):
+    path = tmp_path/"session.jrnl"
+    write_journal(path, ["a", "b", "c"])
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF # payload of the last block
+    path.write_bytes(bytes(data))
+    assert read_texts(path)==(["a", "b"], True)
+
+def test_frames_of_the_last_recording(tmp_path):
+    path = tmp_path/"session.jrnl"
+    writer = JournalWriter(path)
+    source = Source.CAMERA+1
+    for recording in range(2):
+        writer.append(source, Event.RECORD, b"cam_1.avi")
+        for n in range(3):
+            writer.append(source, Event.FRAME, struct.pack("<I", n), monotonic_ns=recording*10+n, wall_ns=(recording*10+n)*10**9)
+    writer.close()
+    reader = JournalReader(path)
+    try:
+        wall, monotonic, dropped = reader.get_frames(1)
+        assert reader.get_cameras()==[1]
+        assert wall.tolist()==[10.0, 11.0, 12.0]
+        assert monotonic.tolist()==[10, 11, 12]
+        assert dropped.tolist()==[0, 1, 2]
+    finally:
+        reader.close()
+
+def test_append_after_close_is_refused(tmp_path):
+    writer = JournalWriter(tmp_path/"session.jrnl")
+    writer.close()
+    assert writer.is_closed()
+    assert not writer.append_text(Source.NBACK, "late")
+
+def test_not_a_journal(tmp_path):
+    path = tmp_path/"session.jrnl"
+    path.write_bytes(b"not a journal file")
+    with pytest.raises(JournalError):
+        JournalReader(path)
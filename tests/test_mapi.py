@@ -0,0 +1,50 @@
+import json
+import pytest
+
+from avsim_monitor.mapi import MapiDispatcher
+
+
+def filters(dispatcher, topic):
+    return sorted(topic_filter for topic_filter, _ in dispatcher.match(topic))
+
+
+def test_exact_and_single_level_wildcard():
+    dispatcher = MapiDispatcher()
+    for topic_filter in ("a/b/c", "a/+/c", "a/+", "+/b/c"):
+        dispatcher.register(topic_filter, lambda payload: None)
+    assert filters(dispatcher, "a/b/c")==["+/b/c", "a/+/c", "a/b/c"]
+    assert filters(dispatcher, "a/x/c")==["a/+/c"]
+    assert filters(dispatcher, "a/b")==["a/+"]
+    assert filters(dispatcher, "a/b/c/d")==[]
+
+def test_multi_level_wildcard_matches_parent_level():
+    dispatcher = MapiDispatcher()
+    dispatcher.register("a/#", lambda payload: None)
+    dispatcher.register("#", lambda payload: None)
+    assert filters(dispatcher, "a")==["#", "a/#"]
+    assert filters(dispatcher, "a/b/c")==["#", "a/#"]
+    assert filters(dispatcher, "b")==["#"]
+
+def test_wildcards_do_not_match_system_topics():
+    dispatcher = MapiDispatcher()
+    dispatcher.register("#", lambda payload: None)
+    dispatcher.register("+/broker", lambda payload: None)
+    dispatcher.register("$SYS/#", lambda payload: None)
+    assert filters(dispatcher, "$SYS/broker")==["$SYS/#"]
+
+def test_registering_clears_cached_matches():
+    dispatcher = MapiDispatcher()
+    assert not dispatcher.has_handler("a/b")
+    dispatcher.register("a/+", lambda payload: None)
+    assert dispatcher.has_handler("a/b")
+
+def test_dispatch_decodes_payload_and_records_latency():
+    received = []
+    dispatcher = MapiDispatcher()
+    dispatcher.register("a/+", received.append)
+    assert dispatcher.dispatch("a/b", b'{"x":1}')
+    assert not dispatcher.dispatch("b", b'not json') # no handler, payload is not decoded
+    assert received==[{"x":1}]
+    assert dispatcher.get_latency_histograms()["a/+"]["count"]==1
+    with pytest.raises(json.JSONDecodeError):
+        dispatcher.dispatch("a/b", b'not json')
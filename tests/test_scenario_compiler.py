@@ -0,0 +1,64 @@
+import json
+import os
+import numpy as np
+import pytest
+
+from avsim_monitor.scenario_compiler import compile_scenario, compile_scenario_file, ScenarioCompileError
+
+SCENARIO = {"scenario": [
+    {"time": 2, "event": [{"mapi": "a/b", "message": "{'x':1}"}]},
+    {"time": 1, "event": [{"mapi": "c", "message": {"y": "é"}}, {"mapi": "a/b", "message": "{}"}]},
+]}
+
+@pytest.fixture
+def scenario_path(tmp_path):
+    path = tmp_path/"scenario.json"
+    path.write_text(json.dumps(SCENARIO))
+    return path
+
+def cache_path_of(path):
+    return path.with_name(path.name+".compiled.npz")
+
+
+def test_events_are_sorted_by_time():
+    compiled = compile_scenario(SCENARIO)
+    assert list(compiled.events())==[(1.0, "c", b'{"y": "\\u00e9"}'), (1.0, "a/b", b"{}"), (2.0, "a/b", b'{"x":1}')]
+    assert compiled.end_time()==2.0
+
+def test_invalid_message_is_rejected():
+    with pytest.raises(ScenarioCompileError):
+        compile_scenario({"scenario": [{"time": 0, "event": [{"mapi": "a", "message": "{broken"}]}]})
+
+def test_cache_round_trip(scenario_path):
+    compiled = compile_scenario_file(scenario_path, use_cache=True)
+    assert cache_path_of(scenario_path).is_file()
+    with np.load(cache_path_of(scenario_path)) as cached: # arrays only, loaded without pickle
+        assert cached["times"].tolist()==[1.0, 1.0, 2.0]
+    cached = compile_scenario_file(scenario_path, use_cache=True)
+    assert list(cached.events())==list(compiled.events())
+    assert cached.times.typecode=="d" and cached.topic_ids.typecode=="I"
+
+def test_cache_is_used_while_the_scenario_is_unchanged(scenario_path):
+    compile_scenario_file(scenario_path, use_cache=True)
+    with np.load(cache_path_of(scenario_path)) as cached:
+        arrays = dict(cached)
+    arrays["times"] = np.array([5.0, 6.0, 7.0])
+    with open(cache_path_of(scenario_path), "wb") as cfile:
+        np.savez(cfile, **arrays)
+    assert compile_scenario_file(scenario_path, use_cache=True).end_time()==7.0
+
+def test_cache_is_invalidated_by_a_changed_scenario(scenario_path):
+    compile_scenario_file(scenario_path, use_cache=True)
+    changed = {"scenario": SCENARIO["scenario"]+[{"time": 3, "event": [{"mapi": "d", "message": "{}"}]}]}
+    scenario_path.write_text(json.dumps(changed))
+    stat = scenario_path.stat()
+    os.utime(scenario_path, ns=(stat.st_atime_ns, stat.st_mtime_ns+1_000_000_000))
+    compiled = compile_scenario_file(scenario_path, use_cache=True)
+    assert len(compiled)==4 and compiled.end_time()==3.0
+
+def test_damaged_cache_is_rebuilt(scenario_path):
+    compile_scenario_file(scenario_path, use_cache=True)
+    cache_path_of(scenario_path).write_bytes(b"damaged")
+    assert len(compile_scenario_file(scenario_path, use_cache=True))==3
+    with np.load(cache_path_of(scenario_path)) as cached:
+        assert len(cached["times"])==3
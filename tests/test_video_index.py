@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+import pytest
+
+from util.logger.video_index import AviFrameIndex, VideoIndexError, load_avi_index
+
+FRAMES = 20
+
+@pytest.fixture(scope="module")
+def avi_data(tmp_path_factory):
+    path = tmp_path_factory.mktemp("avi")/"cam_1.avi"
+    writer = cv2.VideoWriter(path.as_posix(), cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("MJPG writer is not available")
+    for n in range(FRAMES):
+        writer.write(np.full((48, 64, 3), n*10, dtype=np.uint8))
+    writer.release()
+    return path.read_bytes()
+
+def write_avi(tmp_path, data):
+    path = tmp_path/"cam_1.avi"
+    path.write_bytes(data)
+    return path
+
+
+def test_frames_are_indexed(tmp_path, avi_data):
+    index = AviFrameIndex.scan(write_avi(tmp_path, avi_data))
+    try:
+        assert len(index)==FRAMES
+        assert index.get_fps()==pytest.approx(10.0)
+        assert index.get_resolution()==(64, 48)
+        assert index.get_frame(3).shape==(48, 64, 3)
+    finally:
+        index.close()
+
+def test_truncated_index_falls_back_to_movi(tmp_path, avi_data):
+    index = AviFrameIndex.scan(write_avi(tmp_path, avi_data[:-300])) # idx1 cut off
+    assert len(index)==FRAMES
+    index.close()
+
+def test_truncated_file_keeps_complete_frames(tmp_path, avi_data):
+    movi = avi_data.find(b"movi")
+    data = avi_data[:movi+(len(avi_data)-movi)//2]
+    index = AviFrameIndex.scan(write_avi(tmp_path, data))
+    try:
+        assert 0<len(index)<FRAMES
+        offsets = index.frames["offset"].astype(np.int64)
+        assert np.all(offsets+index.frames["size"]<=len(data))
+        assert index.get_frame(len(index)-1) is not None
+    finally:
+        index.close()
+
+def test_any_truncation_raises_video_index_error_only(tmp_path, avi_data):
+    path = tmp_path/"cam_1.avi"
+    for size in range(1, len(avi_data), 7):
+        path.write_bytes(avi_data[:size])
+        try:
+            AviFrameIndex.scan(path).close()
+        except VideoIndexError:
+            pass
+
+def test_not_an_avi(tmp_path):
+    path = tmp_path/"cam_1.avi"
+    path.write_bytes(b"RIFF\0\0\0\0WAVE")
+    with pytest.raises(VideoIndexError):
+        AviFrameIndex.scan(path)
+
+def test_timestamps_are_joined_from_csv(tmp_path, avi_data):
+    path = write_avi(tmp_path, avi_data)
+    (tmp_path/"timestamp_1.csv").write_text("".join(f"{100+n*0.1},0,{n}\n" for n in range(FRAMES)))
+    index = load_avi_index(path, use_cache=False)
+    assert index.get_timestamps()[:3].tolist()==pytest.approx([100.0, 100.1, 100.2])
+    assert index.get_monotonic_ns()[-1]==FRAMES-1
@@ -0,0 +1,91 @@
+'''
+Chunked Columnar Sample Writer
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import os
+import json
+import queue
+import pathlib
+import threading
+import numpy as np
+
+from util.logger.console import ConsoleLogger
+
+'''
+Samples are appended into preallocated blocks (structured array), a full block is written by a writer thread as a chunk
+(chunk_NNNNN.npz, one array per column) and the block is reused. A chunk is renamed into place only after it is complete,
+so an interrupted recording keeps all flushed chunks. schema.json has the column names and types.
+'''
+class ColumnarWriter:
+    def __init__(self, path:pathlib.Path, dtype:np.dtype, block_size:int=4096, blocks:int=4) -> None:
+        self.__console = ConsoleLogger.get_logger()
+        self.__path = pathlib.Path(path)
+        self.__path.mkdir(parents=True, exist_ok=True)
+        self.__dtype = np.dtype(dtype)
+        with open(self.__path/"schema.json", "w") as sfile:
+            json.dump({"columns":[[name, self.__dtype[name].str] for name in self.__dtype.names], "block_size":block_size}, sfile)
+
+        self.__free = queue.Queue()
+        for _ in range(blocks):
+            self.__free.put(np.zeros(block_size, dtype=self.__dtype))
+        self.__full = queue.Queue() # (block, number of samples), None to stop
+        self.__block = self.__free.get()
+        self.__count = 0
+        self.__chunks = 0
+        self.__samples = 0
+        self.__writer = threading.Thread(target=self.__write_chunks, daemon=True)
+        self.__writer.start()
+
+    # append a sample (tuple in column order)
+    def append(self, sample:tuple):
+        self.__block[self.__count] = sample
+        self.__count += 1
+        if self.__count==len(self.__block):
+            self.flush()
+
+    # hand over the current block to the writer thread
+    def flush(self):
+        if self.__count>0:
+            self.__full.put((self.__block, self.__count))
+            self.__block = self.__free.get() # waits only if the writer is behind by all blocks
+            self.__count = 0
+
+    def get_samples(self) -> int:
+        return self.__samples + self.__count
+
+    # write remaining samples and stop the writer thread
+    def close(self):
+        self.flush()
+        self.__full.put(None)
+        self.__writer.join()
+
+    def __write_chunks(self):
+        while True:
+            item = self.__full.get()
+            if item is None:
+                break
+            block, count = item
+            chunk_path = self.__path/f"chunk_{self.__chunks:05d}.npz"
+            try:
+                with open(chunk_path.with_suffix(".tmp"), "wb") as cfile:
+                    np.savez(cfile, **{name:block[name][:count] for name in self.__dtype.names})
+                os.replace(chunk_path.with_suffix(".tmp"), chunk_path)
+                self.__chunks += 1
+                self.__samples += count
+            except OSError as e:
+                self.__console.error(f"Cannot write {chunk_path.as_posix()} : {e}")
+            self.__free.put(block)
+
+
+# read all chunks of the columnar directory : column name -> array
+def read_columnar(path:pathlib.Path) -> dict:
+    path = pathlib.Path(path)
+    with open(path/"schema.json", "r") as sfile:
+        columns = [(name, np.dtype(dtype)) for name, dtype in json.load(sfile)["columns"]]
+    parts = {name:[] for name, _ in columns}
+    for chunk_path in sorted(path.glob("chunk_*.npz")):
+        with np.load(chunk_path) as chunk:
+            for name, _ in columns:
+                parts[name].append(chunk[name])
+    return {name:(np.concatenate(parts[name]) if parts[name] else np.zeros(0, dtype=dtype)) for name, dtype in columns}
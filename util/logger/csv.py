@@ -3,33 +3,201 @@ CSV(Comma Separated Value) Recorder Class
 @author Byunghun Hwang<bh.hwang@iae.re.kr>
 '''
 
+import os
 import csv
+import time
+import queue
 import typing
 import pathlib
+import threading
 from PyQt6.QtCore import QObject
 from util.logger.console import ConsoleLogger
 
+# when written rows are pushed to the disk
+class Durability:
+    CLOSE = "close"     # kept in the file buffer, written when the buffer is full or the file is closed (fastest)
+    FLUSH = "flush"     # flushed to the OS every flush_interval or batch_size rows (survives an application crash)
+    FSYNC = "fsync"     # flushed and synced to the disk every flush_interval or batch_size rows (survives a power loss)
+
+'''
+CSV file written by the CSVWriterService (rows are queued, never written on the calling thread)
+'''
+class CSVLog:
+    def __init__(self, service, path:pathlib.Path, mode:str="a", header:list=None) -> None:
+        self.__service = service
+        self.path = path
+        self.mode = mode
+        self.header = header
+        self.file = None        # used on the writer thread only
+        self.writer = None
+        self.pending = 0        # rows written after the last flush
+        self.flushed_at = 0.0
+        self.closed = False
+
+    # queue a row (list of values)
+    def write_row(self, data:list):
+        if not self.closed:
+            self.__service.put(self, data)
+
+    # queue rows
+    def write_rows(self, rows:list):
+        for data in rows:
+            self.write_row(data)
+
+    # close after all queued rows are written
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.__service.put(self, None)
+
+'''
+Background CSV writer shared by log files
+Rows of all opened files go into one bounded queue, the writer thread writes them in batches and flushes each file
+when batch_size rows are pending or flush_interval(sec) is passed (see Durability). If the queue is full, write_row waits
+for the writer (rows are never dropped).
+'''
+class CSVWriterService:
+    _STOP = object()
+    _OPEN = object()
+
+    def __init__(self, queue_size:int=10000, batch_size:int=256, flush_interval:float=1.0, durability:str=Durability.FLUSH) -> None:
+        self.__console = ConsoleLogger.get_logger()
+
+        if durability not in (Durability.CLOSE, Durability.FLUSH, Durability.FSYNC):
+            raise ValueError(f"Unknown durability : {durability}")
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__durability = durability
+        self.__queue = queue.Queue(maxsize=queue_size) # (log, row), (log, _OPEN) to open, (log, None) to close the log
+        self.__logs = set() # opened logs (writer thread only)
+        self.__worker = threading.Thread(target=self.__write, daemon=True)
+        self.__worker.start()
+
+    # open a csv file (mode : "a" or "w", header : first row of a new file)
+    def open(self, path:pathlib.Path, mode:str="a", header:list=None) -> CSVLog:
+        log = CSVLog(self, pathlib.Path(path), mode, header)
+        self.__queue.put((log, self._OPEN))
+        return log
+
+    def put(self, log:CSVLog, data):
+        self.__queue.put((log, data))
+
+    def get_queue_size(self) -> int:
+        return self.__queue.qsize()
+
+    # write all queued rows, close all files and stop the writer thread
+    def close(self):
+        if self.__worker.is_alive():
+            self.__queue.put((self._STOP, None))
+            self.__worker.join()
+
+    # writer thread
+    def __write(self):
+        running = True
+        while running:
+            try:
+                items = [self.__queue.get(timeout=self.__flush_interval)]
+            except queue.Empty:
+                items = []
+            while items and len(items)<self.__batch_size: # take queued rows as a batch
+                try:
+                    items.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for log, data in items:
+                if log is self._STOP:
+                    running = False
+                elif data is self._OPEN:
+                    self.__open(log)
+                elif data is None:
+                    self.__close(log)
+                elif log.writer:
+                    try:
+                        log.writer.writerow(data)
+                        log.pending += 1
+                    except OSError as e:
+                        self.__console.error(f"Cannot write {log.path.as_posix()} : {e}")
+
+            now = time.monotonic()
+            for log in self.__logs:
+                if log.pending>=self.__batch_size or (log.pending>0 and now-log.flushed_at>=self.__flush_interval):
+                    self.__flush(log, now)
+
+        for log in list(self.__logs):
+            self.__close(log)
+
+    def __open(self, log:CSVLog):
+        try:
+            is_new = log.mode=="w" or not log.path.exists() or log.path.stat().st_size==0
+            log.file = open(log.path, mode=log.mode, newline='')
+            log.writer = csv.writer(log.file)
+            log.flushed_at = time.monotonic()
+            if log.header and is_new:
+                log.writer.writerow(log.header)
+                log.pending += 1
+            self.__logs.add(log)
+        except OSError as e:
+            self.__console.error(f"Cannot open {log.path.as_posix()} : {e}")
+
+    def __flush(self, log:CSVLog, now:float):
+        log.pending = 0
+        log.flushed_at = now
+        if self.__durability==Durability.CLOSE:
+            return
+        try:
+            log.file.flush()
+            if self.__durability==Durability.FSYNC:
+                os.fsync(log.file.fileno())
+        except OSError as e:
+            self.__console.error(f"Cannot write {log.path.as_posix()} : {e}")
+
+    def __close(self, log:CSVLog):
+        if log not in self.__logs:
+            return
+        self.__logs.discard(log)
+        try:
+            log.file.flush()
+            if self.__durability==Durability.FSYNC:
+                os.fsync(log.file.fileno())
+            log.file.close()
+        except OSError as e:
+            self.__console.error(f"Cannot close {log.path.as_posix()} : {e}")
+        log.file = None
+        log.writer = None
+
+
 class CSVRecorder(QObject):
-    def __init__(self, dirpath:pathlib.Path, filename:str) -> None:
+    def __init__(self, dirpath:pathlib.Path, filename:str, service:CSVWriterService=None) -> None:
         super().__init__()
-        
+
         self.__console = ConsoleLogger.get_logger()
         self.__save_path = dirpath / f"{filename}.csv"
-        self.__writer = None
-        self.__csv_file = None
+        self.__service = service    # shared writer service (own service if None)
+        self.__own_service = None
+        self.__log = None
         self.__is_working = False
-        
+
     # start write
     def start(self):
-        self.__csv_file = open(self.__save_path.as_posix(), mode="a+", newline='')
-        self.__writer = csv.writer(self.__csv_file)
+        if self.__log:
+            return
+        if self.__service is None:
+            self.__own_service = CSVWriterService()
+        self.__log = (self.__service or self.__own_service).open(self.__save_path, mode="a")
         self.__is_working = True
-    
-    # stop write
+
+    # stop write (queued rows are written and the file is closed)
     def stop(self):
         self.__is_working = False
-    
-    # write row in csv file
+        if self.__log:
+            self.__log.close()
+            self.__log = None
+        if self.__own_service:
+            self.__own_service.close()
+            self.__own_service = None
+
+    # write row in csv file (queued)
     def write_row(self, data:list):
         if self.__is_working:
-            self.__writer.writerow(data)
\ No newline at end of file
+            self.__log.write_row(data)
@@ -0,0 +1,283 @@
+'''
+Append-only Binary Session Journal
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import os
+import mmap
+import time
+import zlib
+import queue
+import struct
+import pathlib
+import threading
+import numpy as np
+
+from util.logger.console import ConsoleLogger
+
+'''
+Journal layout (single file, little endian)
+  header   : magic(8), version(u4), reserved(u4)
+  block... : block header [magic(u4), number of records(u4), payload size(u4), crc32 of records+payload(u4)]
+             records (RECORD_DTYPE, fixed size) followed by their payloads
+A block is written with one write call. After a crash, the journal is valid up to the last block with a good crc
+(a torn block at the end is ignored by the reader and cut off when the journal is opened for append).
+payload_offset is the absolute file offset of the payload, so a record's payload is read directly from the memory map.
+'''
+RECORD_DTYPE = np.dtype([("monotonic_ns", "<i8"), ("wall_ns", "<i8"), ("source", "<u2"), ("event", "<u2"), ("payload_size", "<u4"), ("payload_offset", "<u8")])
+_FILE_HEADER = struct.Struct("<8sII")
+_BLOCK_HEADER = struct.Struct("<IIII")
+_MAGIC = b"AVSIMJNL"
+_BLOCK_MAGIC = 0x4B4C424A # "JBLK"
+_VERSION = 1
+
+# source ids
+class Source:
+    SCENARIO = 1
+    NBACK = 2
+    EYETRACKER = 3
+    CAMERA = 100    # + camera id
+
+# event types
+class Event:
+    MESSAGE = 1     # payload : utf-8 text
+    FRAME = 2       # payload : number of dropped frames so far (u4)
+    RECORD = 3      # recording (re)started, payload : file name (frames of the source before it belong to an overwritten file)
+
+
+class JournalError(ValueError):
+    pass
+
+# size of the valid part of the journal (header + good blocks)
+def _valid_size(buffer) -> int:
+    size = len(buffer)
+    if size<_FILE_HEADER.size:
+        raise JournalError("Journal header is truncated")
+    magic, version, _ = _FILE_HEADER.unpack_from(buffer, 0)
+    if magic!=_MAGIC or version!=_VERSION:
+        raise JournalError("Not a session journal")
+    offset = _FILE_HEADER.size
+    for _, end in _iter_blocks(buffer):
+        offset = end
+    return offset
+
+# good blocks : (offset of the records, end of the block)
+def _iter_blocks(buffer):
+    offset = _FILE_HEADER.size
+    size = len(buffer)
+    while offset+_BLOCK_HEADER.size<=size:
+        magic, count, payload_size, crc = _BLOCK_HEADER.unpack_from(buffer, offset)
+        start = offset+_BLOCK_HEADER.size
+        end = start+count*RECORD_DTYPE.itemsize+payload_size
+        if magic!=_BLOCK_MAGIC or end>size or zlib.crc32(memoryview(buffer)[start:end])!=crc:
+            return # torn or corrupted block
+        yield start, end
+        offset = end
+
+
+'''
+Journal writer (thread safe)
+append() only fills the current block in memory, a writer thread writes the blocks : a full block right away, the pending
+records every flush_interval(sec) (a quiet session is on the disk at most flush_interval after its last event), and all
+records at flush()/close(). Opening an existing journal appends to it after cutting off a torn block.
+'''
+class JournalWriter:
+    def __init__(self, path:pathlib.Path, block_records:int=1024, flush_interval:float=1.0) -> None:
+        self.__console = ConsoleLogger.get_logger()
+        self.__path = pathlib.Path(path)
+        self.__block_records = block_records
+        self.__block = np.zeros(block_records, dtype=RECORD_DTYPE)
+        self.__payloads = []
+        self.__payload_size = 0
+        self.__count = 0
+        self.__records = 0
+        self.__flush_interval = flush_interval
+        self.__closed = False
+        self.__lock = threading.Lock()
+        self.__full = queue.Queue() # (records, payloads, payload size) to be written, None to stop
+
+        if self.__path.is_file() and self.__path.stat().st_size>0:
+            self.__file = open(self.__path, "r+b")
+            with mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                valid_size = _valid_size(buffer)
+            self.__file.truncate(valid_size)
+            self.__file.seek(valid_size)
+        else:
+            self.__file = open(self.__path, "wb")
+            self.__file.write(_FILE_HEADER.pack(_MAGIC, _VERSION, 0))
+            self.__file.flush()
+
+        self.__writer = threading.Thread(target=self.__write_blocks, daemon=True)
+        self.__writer.start()
+
+    # append a record (timestamps are taken now if not given), False if the journal is closed
+    def append(self, source:int, event:int, payload:bytes=b"", monotonic_ns:int=None, wall_ns:int=None) -> bool:
+        if monotonic_ns is None:
+            monotonic_ns = time.monotonic_ns()
+        if wall_ns is None:
+            wall_ns = time.time_ns()
+        with self.__lock:
+            if self.__closed:
+                return False
+            self.__block[self.__count] = (monotonic_ns, wall_ns, source, event, len(payload), self.__payload_size)
+            self.__payloads.append(payload)
+            self.__payload_size += len(payload)
+            self.__count += 1
+            self.__records += 1
+            if self.__count==len(self.__block):
+                self.__hand_over()
+        return True
+
+    # append a text message
+    def append_text(self, source:int, text:str, monotonic_ns:int=None, wall_ns:int=None) -> bool:
+        return self.append(source, Event.MESSAGE, text.encode("utf-8"), monotonic_ns, wall_ns)
+
+    # hand the pending records over to the writer thread
+    def flush(self):
+        with self.__lock:
+            if not self.__closed:
+                self.__hand_over()
+
+    def get_records(self) -> int:
+        return self.__records
+
+    def is_closed(self) -> bool:
+        return self.__closed
+
+    # write all records and close the file
+    def close(self):
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__hand_over()
+        self.__full.put(None)
+        self.__writer.join()
+        self.__file.close()
+
+    # (called with the lock held) the block belongs to the writer thread from now on
+    def __hand_over(self):
+        if self.__count==0:
+            return
+        self.__full.put((self.__block[:self.__count], self.__payloads, self.__payload_size))
+        self.__block = np.zeros(self.__block_records, dtype=RECORD_DTYPE)
+        self.__payloads = []
+        self.__payload_size = 0
+        self.__count = 0
+
+    # writer thread
+    def __write_blocks(self):
+        deadline = time.monotonic()+self.__flush_interval
+        while True:
+            try:
+                item = self.__full.get(timeout=max(0.0, deadline-time.monotonic()))
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            if time.monotonic()>=deadline: # write the pending records of a quiet period
+                deadline = time.monotonic()+self.__flush_interval
+                self.flush()
+            if item:
+                self.__write_block(*item)
+
+    def __write_block(self, records:np.ndarray, payloads:list, payload_size:int):
+        try:
+            start = self.__file.tell()+_BLOCK_HEADER.size
+            records["payload_offset"] += start+records.nbytes # block relative to absolute offset
+            data = records.tobytes()+b"".join(payloads)
+            self.__file.write(_BLOCK_HEADER.pack(_BLOCK_MAGIC, len(records), payload_size, zlib.crc32(data))+data)
+            self.__file.flush()
+        except OSError as e:
+            self.__console.error(f"Cannot write {self.__path.as_posix()} : {e}")
+
+
+'''
+Journal reader (memory mapped, records of good blocks only)
+Records are searched by time with binary search (records of several sources may not be appended in time order,
+a sorted order is kept for the search).
+'''
+class JournalReader:
+    def __init__(self, path:pathlib.Path) -> None:
+        self.__path = pathlib.Path(path)
+        self.__file = open(self.__path, "rb")
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.__path)>0 else b""
+        self.valid_size = _valid_size(self.__map)
+        self.torn = self.valid_size<len(self.__map) # crashed session (data after the last good block is ignored)
+
+        blocks = []
+        for start, _ in _iter_blocks(self.__map):
+            count = _BLOCK_HEADER.unpack_from(self.__map, start-_BLOCK_HEADER.size)[1]
+            blocks.append(np.frombuffer(self.__map, dtype=RECORD_DTYPE, count=count, offset=start))
+        self.records = np.concatenate(blocks) if blocks else np.zeros(0, dtype=RECORD_DTYPE)
+        self.__orders = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get_payload(self, n:int) -> bytes:
+        record = self.records[n]
+        offset = int(record["payload_offset"])
+        return bytes(self.__map[offset:offset+int(record["payload_size"])])
+
+    def get_text(self, n:int) -> str:
+        return self.get_payload(n).decode("utf-8", errors="replace")
+
+    # messages of the source in order of appending : (wall clock timestamps(sec), texts)
+    def get_messages(self, source:int) -> tuple:
+        selected = self.select(source, Event.MESSAGE)
+        return self.records["wall_ns"][selected]/1e9, [self.get_text(n) for n in selected]
+
+    # frames of the last recording of the camera in order of recording : (wall clock timestamps(sec), monotonic ns, dropped frames so far)
+    def get_frames(self, camera_id:int) -> tuple:
+        selected = self.select(Source.CAMERA+camera_id, Event.FRAME)
+        started = self.select(Source.CAMERA+camera_id, Event.RECORD)
+        if len(started)>0:
+            selected = selected[selected>started[-1]]
+        records = self.records[selected]
+        dropped = np.array([struct.unpack("<I", self.get_payload(n))[0] if records["payload_size"][i]==4 else 0 for i, n in enumerate(selected)], dtype=np.int64)
+        return records["wall_ns"]/1e9, records["monotonic_ns"].copy(), dropped
+
+    # camera ids having recorded frames
+    def get_cameras(self) -> list:
+        sources = np.unique(self.records["source"][self.records["event"]==Event.FRAME])
+        return [int(source)-Source.CAMERA for source in sources if source>=Source.CAMERA]
+
+    # record numbers of the source (and event), in order of appending
+    def select(self, source:int, event:int=None) -> np.ndarray:
+        mask = self.records["source"]==source
+        if event is not None:
+            mask &= self.records["event"]==event
+        return np.flatnonzero(mask)
+
+    # record numbers in the time range [start_ns, end_ns) sorted by time (clock : monotonic_ns or wall_ns)
+    def find_range(self, start_ns:int, end_ns:int, clock:str="monotonic_ns") -> np.ndarray:
+        order, times = self.__sorted(clock)
+        return order[np.searchsorted(times, start_ns, side="left"):np.searchsorted(times, end_ns, side="left")]
+
+    # record number of the last record at or before the time (-1 if none)
+    def find(self, time_ns:int, clock:str="monotonic_ns") -> int:
+        order, times = self.__sorted(clock)
+        position = int(np.searchsorted(times, time_ns, side="right"))-1
+        return int(order[position]) if position>=0 else -1
+
+    def __sorted(self, clock:str):
+        if clock not in self.__orders:
+            times = self.records[clock]
+            if len(times)<2 or np.all(times[1:]>=times[:-1]):
+                order = np.arange(len(times))
+            else:
+                order = np.argsort(times, kind="stable")
+            self.__orders[clock] = (order, times[order])
+        return self.__orders[clock]
+
+    def close(self):
+        self.records = np.zeros(0, dtype=RECORD_DTYPE) # release views of the map
+        self.__orders = {}
+        if isinstance(self.__map, mmap.mmap):
+            self.__map.close()
+        self.__file.close()
+
+# session journal of the recorded video (<session>/camera/cam_N.avi -> <session>/session.jrnl)
+def journal_path_of(video_path:pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(video_path).parent.parent/"session.jrnl"
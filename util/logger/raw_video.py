@@ -0,0 +1,170 @@
+'''
+Raw Frame Recorder (lossless, memory-mapped chunk files with per-frame index)
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import json
+import mmap
+import struct
+import pathlib
+import numpy as np
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+'''
+Recording layout (directory)
+  meta.json        : shape, dtype, fps, compression, chunk size, number of frames
+  chunk_NNNNN.bin  : frames(raw or compressed) appended back to back
+  index.bin        : fixed size record per frame (chunk, size, offset, monotonic ns, device ns, wall clock ns)
+'''
+INDEX_DTYPE = np.dtype([("chunk", "<u4"), ("size", "<u4"), ("offset", "<u8"), ("monotonic_ns", "<i8"), ("device_ns", "<i8"), ("wall_ns", "<i8")])
+_INDEX_RECORD = struct.Struct("<IIQqqq")
+_COMPRESSIONS = ("none", "lz4", "zstd")
+
+
+# raise ValueError if the compression is unknown or its package is not installed
+def check_compression(compression:str):
+    if compression not in _COMPRESSIONS:
+        raise ValueError(f"Unknown compression : {compression}")
+    if compression=="lz4" and lz4_frame is None:
+        raise ValueError("lz4 compression requires the lz4 package")
+    if compression=="zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+
+
+class RawFrameWriter:
+    def __init__(self, path:pathlib.Path, shape:tuple, fps:float, dtype:str="uint8", compression:str="none", chunk_size:int=1<<30) -> None:
+        check_compression(compression)
+        self.__path = pathlib.Path(path)
+        self.__path.mkdir(parents=True, exist_ok=True)
+        self.__meta = {"shape":list(shape), "dtype":dtype, "fps":fps, "compression":compression, "chunk_size":chunk_size, "frames":0}
+        self.__compress = None
+        if compression=="lz4":
+            self.__compress = lambda data: lz4_frame.compress(data, compression_level=0)
+        elif compression=="zstd":
+            self.__compress = zstandard.ZstdCompressor(level=1).compress
+
+        self.__chunk_size = chunk_size
+        self.__chunk_id = -1
+        self.__chunk_file = None
+        self.__chunk_map = None
+        self.__offset = 0
+        self.__frames = 0
+        self.__index = open(self.__path/"index.bin", "wb")
+        self.__write_meta()
+
+    def __write_meta(self):
+        self.__meta["frames"] = self.__frames
+        with open(self.__path/"meta.json", "w") as mfile:
+            json.dump(self.__meta, mfile)
+
+    # map a new chunk file
+    def __next_chunk(self, size:int):
+        self.__close_chunk()
+        self.__chunk_id += 1
+        self.__chunk_file = open(self.__path/f"chunk_{self.__chunk_id:05d}.bin", "w+b")
+        self.__chunk_file.truncate(size)
+        self.__chunk_map = mmap.mmap(self.__chunk_file.fileno(), size)
+        self.__offset = 0
+
+    def __close_chunk(self):
+        if self.__chunk_map is not None:
+            self.__chunk_map.flush()
+            self.__chunk_map.close()
+            self.__chunk_file.truncate(self.__offset) # drop unused space
+            self.__chunk_file.close()
+            self.__chunk_map = None
+            self.__chunk_file = None
+
+    # append a frame (device_ns : -1 if the camera has no device clock)
+    def write(self, frame:np.ndarray, monotonic_ns:int, device_ns:int=-1, wall_ns:int=0) -> int:
+        data = np.ascontiguousarray(frame).data.cast("B")
+        if self.__compress:
+            data = self.__compress(data)
+        size = len(data)
+        if self.__chunk_map is None or self.__offset+size>len(self.__chunk_map):
+            self.__next_chunk(max(self.__chunk_size, size))
+
+        self.__chunk_map[self.__offset:self.__offset+size] = data
+        self.__index.write(_INDEX_RECORD.pack(self.__chunk_id, size, self.__offset, monotonic_ns, device_ns, wall_ns))
+        self.__offset += size
+        self.__frames += 1
+        return self.__frames-1
+
+    def close(self):
+        self.__close_chunk()
+        self.__index.close()
+        self.__write_meta()
+
+
+class RawFrameReader:
+    def __init__(self, path:pathlib.Path) -> None:
+        self.__path = pathlib.Path(path)
+        with open(self.__path/"meta.json", "r") as mfile:
+            self.meta = json.load(mfile)
+        check_compression(self.meta["compression"])
+        self.__shape = tuple(self.meta["shape"])
+        self.__dtype = np.dtype(self.meta["dtype"])
+        index_path = self.__path/"index.bin"
+        count = index_path.stat().st_size//INDEX_DTYPE.itemsize # partial record of an interrupted recording is ignored
+        self.index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=count)
+        self.__chunks = {} # chunk id -> (file, mmap)
+        self.__decompress = None
+        if self.meta["compression"]=="lz4":
+            self.__decompress = lz4_frame.decompress
+        elif self.meta["compression"]=="zstd":
+            self.__decompress = zstandard.ZstdDecompressor().decompress
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get_fps(self) -> float:
+        return self.meta["fps"]
+
+    def get_resolution(self) -> tuple:
+        return (self.__shape[1], self.__shape[0])
+
+    # wall clock timestamps(sec) of frames
+    def get_timestamps(self) -> np.ndarray:
+        return self.index["wall_ns"]/1e9
+
+    # monotonic clock of frames
+    def get_monotonic_ns(self) -> np.ndarray:
+        return self.index["monotonic_ns"]
+
+    def __chunk(self, chunk_id:int) -> mmap.mmap:
+        if chunk_id not in self.__chunks:
+            cfile = open(self.__path/f"chunk_{chunk_id:05d}.bin", "rb")
+            self.__chunks[chunk_id] = (cfile, mmap.mmap(cfile.fileno(), 0, access=mmap.ACCESS_READ))
+        return self.__chunks[chunk_id][1]
+
+    # n-th frame (uncompressed frames are read-only views on the mapped file)
+    def get_frame(self, n:int) -> np.ndarray:
+        record = self.index[n]
+        chunk = self.__chunk(int(record["chunk"]))
+        offset, size = int(record["offset"]), int(record["size"])
+        if self.__decompress:
+            data = self.__decompress(chunk[offset:offset+size])
+            return np.frombuffer(data, dtype=self.__dtype).reshape(self.__shape)
+        return np.frombuffer(chunk, dtype=self.__dtype, count=size//self.__dtype.itemsize, offset=offset).reshape(self.__shape)
+
+    # frame number at(or right before) the monotonic time
+    def find_frame(self, monotonic_ns:int) -> int:
+        return max(0, int(np.searchsorted(self.index["monotonic_ns"], monotonic_ns, side="right"))-1)
+
+    # frame at(or right before) the wall clock timestamp(sec)
+    def get_frame_at(self, t:float) -> np.ndarray:
+        return self.get_frame(max(0, int(np.searchsorted(self.index["wall_ns"], int(t*1e9), side="right"))-1))
+
+    def close(self):
+        for cfile, cmap in self.__chunks.values():
+            cmap.close()
+            cfile.close()
+        self.__chunks.clear()
@@ -17,6 +17,13 @@ from util.logger.console import ConsoleLogger
 from datetime import datetime
 import numpy as np
 from typing import Tuple
+import threading
+import queue
+import csv
+from util.logger.raw_video import RawFrameWriter, check_compression
+from util.logger.csv import CSVWriterService
+from util.logger.journal import JournalWriter, Event
+import struct
 
 
 class VideoRecorder(QObject):
@@ -68,4 +75,178 @@ class VideoRecorder(QObject):
     # write a frame
     def write_frame(self, image:np.ndarray, fps:float):
         if self.__is_recording:
-            self.__writer.write(image)
\ No newline at end of file
+            self.__writer.write(image)
+
+'''
+Video recorder with a bounded frame queue and a dedicated encoder thread
+(capture thread only copies the frame into a preallocated buffer, encoding & file writing are done by the encoder thread)
+'''
+class RecordPolicy:
+    BLOCK = "block"             # wait until the encoder frees a buffer
+    DROP_OLDEST = "drop_oldest" # drop the oldest queued frame
+    DROP_NEWEST = "drop_newest" # drop the incoming frame
+
+# recorded file format
+class RecordFormat:
+    MJPG = "mjpg"           # MJPG avi (lossy)
+    RAW = "raw"             # raw frames in memory-mapped chunk files (lossless, see raw_video)
+    RAW_LZ4 = "raw-lz4"     # raw frames compressed with lz4 (requires lz4)
+    RAW_ZSTD = "raw-zstd"   # raw frames compressed with zstd (requires zstandard)
+
+_RAW_COMPRESSION = {RecordFormat.RAW:"none", RecordFormat.RAW_LZ4:"lz4", RecordFormat.RAW_ZSTD:"zstd"}
+
+class QueuedVideoRecorder:
+    def __init__(self, video_path:pathlib.Path, timestamp_path:pathlib.Path, resolution:Tuple[int,int], fps:float, queue_size:int=30, policy:str=RecordPolicy.DROP_OLDEST, record_format:str=RecordFormat.MJPG, log_writer:CSVWriterService=None, journal:JournalWriter=None, journal_source:int=0):
+        self.__console = ConsoleLogger.get_logger()
+
+        if policy not in (RecordPolicy.BLOCK, RecordPolicy.DROP_OLDEST, RecordPolicy.DROP_NEWEST):
+            raise ValueError(f"Unknown record policy : {policy}")
+        if record_format!=RecordFormat.MJPG and record_format not in _RAW_COMPRESSION:
+            raise ValueError(f"Unknown record format : {record_format}")
+        if record_format in _RAW_COMPRESSION:
+            check_compression(_RAW_COMPRESSION[record_format]) # fail before recording starts
+
+        self.__video_path = video_path
+        self.__timestamp_path = timestamp_path
+        self.__resolution = resolution
+        self.__fps = fps
+        self.__policy = policy
+        self.__record_format = record_format
+        # frame timestamps : FRAME events of the session journal if given, timestamp csv written by the writer service if given,
+        # timestamp csv written directly if neither is given
+        self.__log_writer = log_writer
+        self.__journal = journal
+        self.__journal_source = journal_source
+        self.__queue = queue.Queue(maxsize=queue_size)     # (buffer, wall clock ns, monotonic ns, device ns) to be encoded
+        self.__free = queue.Queue()                         # free frame buffers
+        for _ in range(queue_size+1): # queued frames + a frame being encoded
+            self.__free.put(None) # allocated with the first frame (frame shape is not known yet)
+        self.__dropped = 0      # number of dropped frames
+        self.__written = 0      # number of written frames
+        self.__worker = None
+        self.__failed = False   # encoder stopped by an error (frames are dropped)
+        self.__stop_event = threading.Event()
+
+    # start encoder thread
+    def start(self):
+        self.__stop_event.clear()
+        self.__failed = False
+        self.__worker = threading.Thread(target=self.__encode, daemon=True)
+        self.__worker.start()
+
+    # stop encoder thread after all queued frames are written
+    def stop(self):
+        if self.__worker:
+            self.__stop_event.set()
+            self.__worker.join()
+            self.__worker = None
+            self.__console.info(f"Recorded {self.__video_path.name} (written : {self.__written}, dropped : {self.__dropped})")
+
+    def get_dropped_frames(self) -> int:
+        return self.__dropped
+
+    def get_queue_size(self) -> int:
+        return self.__queue.qsize()
+
+    def is_failed(self) -> bool:
+        return self.__failed
+
+    # put a frame to be recorded (called in capture thread), returns False if the frame is dropped
+    # (wall_ns : wall clock of the frame in ns, monotonic_ns : monotonic clock of the frame, device_ns : camera clock, -1 if unknown)
+    def write_frame(self, image:np.ndarray, wall_ns:int, monotonic_ns:int=0, device_ns:int=-1) -> bool:
+        buffer = self.__acquire_buffer() if not self.__failed else False
+        if buffer is False:
+            self.__dropped += 1
+            return False
+        if buffer is None or buffer.shape!=image.shape:
+            buffer = np.empty_like(image)
+        np.copyto(buffer, image)
+        self.__queue.put((buffer, wall_ns, monotonic_ns, device_ns))
+        return True
+
+    # get a free buffer by the record policy (False if the frame has to be dropped)
+    def __acquire_buffer(self):
+        try:
+            return self.__free.get_nowait()
+        except queue.Empty:
+            pass
+
+        if self.__policy==RecordPolicy.DROP_NEWEST:
+            return False
+        if self.__policy==RecordPolicy.DROP_OLDEST:
+            try:
+                buffer, _, _, _ = self.__queue.get_nowait()
+                self.__dropped += 1
+                return buffer
+            except queue.Empty:
+                pass
+        while True: # the encoder returns a buffer soon (unless it has stopped)
+            try:
+                return self.__free.get(timeout=0.1)
+            except queue.Empty:
+                if self.__failed or not (self.__worker and self.__worker.is_alive()):
+                    return False
+
+    # encoder thread
+    def __encode(self):
+        writer = None
+        raw_writer = None
+        timestamp_file = None
+        timestamp_writer = None
+        try:
+            if self.__record_format==RecordFormat.MJPG:
+                writer = cv2.VideoWriter(self.__video_path.as_posix(), cv2.VideoWriter_fourcc(*'MJPG'), self.__fps, self.__resolution)
+            if self.__log_writer:
+                timestamp_writer = self.__log_writer.open(self.__timestamp_path, mode='w')
+            elif not self.__journal:
+                timestamp_file = open(self.__timestamp_path, mode='w', newline='')
+                timestamp_writer = csv.writer(timestamp_file)
+            if self.__journal:
+                self.__journal.append(self.__journal_source, Event.RECORD, self.__video_path.name.encode("utf-8"))
+            while True:
+                try:
+                    buffer, wall_ns, monotonic_ns, device_ns = self.__queue.get(timeout=0.1)
+                except queue.Empty:
+                    if self.__stop_event.is_set():
+                        break
+                    continue
+
+                try:
+                    if writer:
+                        writer.write(buffer)
+                    else:
+                        if raw_writer is None: # frame shape is known from the first frame
+                            raw_writer = RawFrameWriter(self.__video_path, buffer.shape, self.__fps, dtype=buffer.dtype.str, compression=_RAW_COMPRESSION[self.__record_format])
+                        raw_writer.write(buffer, monotonic_ns, device_ns, wall_ns)
+                    if self.__journal:
+                        self.__journal.append(self.__journal_source, Event.FRAME, struct.pack("<I", self.__dropped), monotonic_ns, wall_ns)
+                    if timestamp_writer:
+                        row = [str(wall_ns/1e9), self.__dropped, monotonic_ns] # timestamp(sec), number of dropped frames so far, monotonic clock(ns)
+                        if timestamp_file:
+                            timestamp_writer.writerow(row)
+                        else:
+                            timestamp_writer.write_row(row)
+                    self.__written += 1
+                finally:
+                    self.__free.put(buffer)
+        except Exception as e:
+            self.__failed = True
+            self.__console.critical(f"Recording {self.__video_path.name} failed : {e}")
+        finally:
+            if self.__failed: # release queued frames, the capture thread never waits for a stopped encoder
+                while True:
+                    try:
+                        buffer, _, _, _ = self.__queue.get_nowait()
+                        self.__dropped += 1
+                        self.__free.put(buffer)
+                    except queue.Empty:
+                        break
+            for close in (timestamp_file.close if timestamp_file else None,
+                          timestamp_writer.close if timestamp_writer and not timestamp_file else None,
+                          writer.release if writer else None,
+                          raw_writer.close if raw_writer else None):
+                if close:
+                    try:
+                        close()
+                    except Exception as e:
+                        self.__console.error(f"Cannot close recording {self.__video_path.name} : {e}")
@@ -0,0 +1,296 @@
+'''
+Recorded Video Frame Index (random access to frames without decoding the whole video)
+@author Byunghun Hwang<bh.hwang@iae.re.kr>
+'''
+
+import re
+import csv
+import mmap
+import struct
+import pathlib
+import numpy as np
+import cv2
+
+from util.logger.raw_video import RawFrameReader
+from util.logger.journal import JournalReader, JournalError, journal_path_of
+
+_INDEX_VERSION = 1
+_INDEX_SUFFIX = ".index.npz"
+
+'''
+frame table
+  offset, size : frame data(JPEG for MJPG) position in the video file
+  timestamp    : wall clock timestamp(sec) from timestamp_N.csv (NaN if not recorded)
+  monotonic_ns : monotonic clock of the frame from timestamp_N.csv (-1 if not recorded)
+'''
+FRAME_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u4"), ("timestamp", "<f8"), ("monotonic_ns", "<i8")])
+
+# video file has no readable AVI structure
+class VideoIndexError(ValueError):
+    pass
+
+
+# walk RIFF chunks in [start, end) : (fourcc, list type or None, data offset, data size)
+# (end is limited to the buffer, a list cut by a truncated file is limited to the buffer, a data chunk keeps its size)
+def _iter_chunks(buffer, start:int, end:int):
+    end = min(end, len(buffer))
+    pos = start
+    while pos+8<=end:
+        fourcc, size = struct.unpack_from("<4sI", buffer, pos)
+        if fourcc in (b"RIFF", b"LIST"):
+            if pos+12>end:
+                break
+            if size==0: # size is not written if the recording was interrupted
+                size = end-pos-8
+            size = max(4, size)
+            yield fourcc, bytes(buffer[pos+8:pos+12]), pos+12, min(size-4, end-pos-12)
+        else:
+            yield fourcc, None, pos+8, size
+        pos += 8 + size + (size&1) # chunks are word aligned
+
+'''
+AVI(MJPG) frame index
+Frame positions are read from the idx1 chunk, or from the chunk headers of the movi lists if there is no idx1
+or the file has OpenDML(AVIX) extensions (recordings bigger than 1GB). Only chunk headers are read, no frame is decoded.
+'''
+class AviFrameIndex:
+    def __init__(self, path:pathlib.Path, frames:np.ndarray, fps:float, resolution:tuple) -> None:
+        self.__path = pathlib.Path(path)
+        self.frames = frames
+        self.__fps = fps
+        self.__resolution = resolution
+        self.__file = None
+        self.__map = None
+
+    # scan the AVI structure of the video file
+    @classmethod
+    def scan(cls, path:pathlib.Path) -> "AviFrameIndex":
+        with open(path, "rb") as vfile:
+            try:
+                buffer = mmap.mmap(vfile.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file
+                raise VideoIndexError(f"{pathlib.Path(path).name} is empty")
+            with buffer:
+                try:
+                    return cls.__scan(path, buffer)
+                except VideoIndexError:
+                    raise
+                except (struct.error, ValueError, IndexError) as e: # damaged headers
+                    raise VideoIndexError(f"{pathlib.Path(path).name} has a damaged AVI structure : {e}")
+
+    @classmethod
+    def __scan(cls, path, buffer) -> "AviFrameIndex":
+        if len(buffer)<12 or buffer[0:4]!=b"RIFF" or buffer[8:12]!=b"AVI ":
+            raise VideoIndexError(f"{pathlib.Path(path).name} is not an AVI file")
+
+        fps, resolution = 0.0, (0, 0)
+        stream, video_stream = 0, None
+        movi_lists = [] # (movi fourcc position, data offset, data size)
+        idx1 = None
+        segments = 0
+        for fourcc, form, offset, size in _iter_chunks(buffer, 0, len(buffer)):
+            if fourcc!=b"RIFF":
+                continue
+            segments += 1
+            for cc, ltype, coffset, csize in _iter_chunks(buffer, offset, min(offset+size, len(buffer))):
+                if ltype==b"hdrl":
+                    for hcc, htype, hoffset, hsize in _iter_chunks(buffer, coffset, coffset+csize):
+                        if hcc==b"avih" and hsize>=40:
+                            resolution = struct.unpack_from("<II", buffer, hoffset+32)
+                        elif htype==b"strl":
+                            strh = [(o, s) for c, _, o, s in _iter_chunks(buffer, hoffset, hoffset+hsize) if c==b"strh"]
+                            if strh and strh[0][1]>=28 and buffer[strh[0][0]:strh[0][0]+4]==b"vids" and video_stream is None:
+                                scale, rate = struct.unpack_from("<II", buffer, strh[0][0]+20)
+                                fps = rate/scale if scale else 0.0
+                                video_stream = stream
+                            stream += 1
+                elif ltype==b"movi":
+                    movi_lists.append((coffset-4, coffset, min(csize, len(buffer)-coffset)))
+                elif cc==b"idx1" and coffset+csize<=len(buffer): # a truncated idx1 is not used (movi lists are walked)
+                    idx1 = (coffset, csize)
+
+        if video_stream is None:
+            raise VideoIndexError(f"{pathlib.Path(path).name} has no video stream")
+        prefix = f"{video_stream:02d}".encode()
+
+        if idx1 and segments==1 and movi_lists:
+            offsets, sizes = cls.__read_idx1(buffer, idx1, movi_lists[0], prefix)
+        else:
+            offsets, sizes = cls.__walk_movi(buffer, movi_lists, prefix)
+
+        frames = np.zeros(len(offsets), dtype=FRAME_DTYPE)
+        frames["offset"] = offsets
+        frames["size"] = sizes
+        frames["timestamp"] = np.nan
+        frames["monotonic_ns"] = -1
+        return cls(path, frames, fps, tuple(resolution))
+
+    # frame positions from idx1 (16 bytes entries : chunk id, flags, offset, size)
+    @staticmethod
+    def __read_idx1(buffer, idx1:tuple, movi:tuple, prefix:bytes):
+        offset, size = idx1
+        entries = np.frombuffer(buffer, dtype=np.dtype([("ckid", "S4"), ("flags", "<u4"), ("offset", "<u4"), ("size", "<u4")]), count=size//16, offset=offset)
+        ckid = entries["ckid"]
+        entries = entries[(np.char.startswith(ckid, prefix)) & (np.char.endswith(ckid, b"dc") | np.char.endswith(ckid, b"db"))]
+        if len(entries)==0:
+            return np.zeros(0, np.uint64), np.zeros(0, np.uint32)
+        movi_pos, movi_data, _ = movi
+        base = 0 if entries["offset"][0]>=movi_data else movi_pos # offsets are absolute or relative to 'movi'
+        offsets = entries["offset"].astype(np.uint64) + base + 8
+        sizes = entries["size"].copy()
+        complete = offsets+sizes<=len(buffer)
+        return _repeat_empty(offsets[complete], sizes[complete])
+
+    # frame positions from the chunk headers of movi lists
+    @staticmethod
+    def __walk_movi(buffer, movi_lists:list, prefix:bytes):
+        offsets, sizes = [], []
+        def walk(start, end):
+            for cc, ltype, offset, size in _iter_chunks(buffer, start, end):
+                if ltype==b"rec ":
+                    walk(offset, offset+size)
+                elif cc[:2]==prefix and cc[2:] in (b"dc", b"db") and offset+size<=len(buffer): # a frame cut by a truncated file is skipped
+                    offsets.append(offset)
+                    sizes.append(size)
+        for _, offset, size in movi_lists:
+            walk(offset, offset+size)
+        return _repeat_empty(np.array(offsets, dtype=np.uint64), np.array(sizes, dtype=np.uint32))
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def get_fps(self) -> float:
+        return self.__fps
+
+    def get_resolution(self) -> tuple:
+        return self.__resolution
+
+    # wall clock timestamps of frames (NaN if not recorded)
+    def get_timestamps(self) -> np.ndarray:
+        return self.frames["timestamp"]
+
+    # monotonic clock of frames (-1 if not recorded)
+    def get_monotonic_ns(self) -> np.ndarray:
+        return self.frames["monotonic_ns"]
+
+    # encoded(JPEG) data of the n-th frame
+    def get_frame_data(self, n:int) -> bytes:
+        if self.__map is None:
+            self.__file = open(self.__path, "rb")
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        offset, size = int(self.frames["offset"][n]), int(self.frames["size"][n])
+        return self.__map[offset:offset+size]
+
+    # decoded n-th frame
+    def get_frame(self, n:int) -> np.ndarray:
+        return cv2.imdecode(np.frombuffer(self.get_frame_data(n), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    # decoded frame at(or right before) the wall clock timestamp(sec)
+    def get_frame_at(self, t:float) -> np.ndarray:
+        return self.get_frame(find_frame(self.frames["timestamp"], t, self.__fps))
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__file.close()
+            self.__map = None
+            self.__file = None
+
+
+# zero sized chunk repeats the previous frame
+def _repeat_empty(offsets:np.ndarray, sizes:np.ndarray):
+    empty = sizes==0
+    if empty.any():
+        valid = np.where(~empty, np.arange(len(sizes)), 0)
+        np.maximum.accumulate(valid, out=valid)
+        offsets, sizes = offsets[valid], sizes[valid]
+    return offsets, sizes
+
+# frame number at(or right before) t (by frame number if timestamps are not recorded)
+def find_frame(timestamps:np.ndarray, t:float, fps:float) -> int:
+    if len(timestamps)==0:
+        raise IndexError("Video has no frame")
+    if np.isnan(timestamps[0]):
+        n = int(t*fps) if fps>0 else 0
+    else:
+        n = int(np.searchsorted(timestamps, t, side="right"))-1
+    return min(max(n, 0), len(timestamps)-1)
+
+# camera id of the recorded video (cam_N.avi -> N), None if unknown
+def camera_id_of(video_path:pathlib.Path):
+    matched = re.match(r"cam_(\d+)", pathlib.Path(video_path).stem)
+    return int(matched.group(1)) if matched else None
+
+# timestamp file of the recorded video (cam_N.avi -> timestamp_N.csv)
+def timestamp_path_of(video_path:pathlib.Path) -> pathlib.Path:
+    camera_id = camera_id_of(video_path)
+    if camera_id is None:
+        return None
+    return pathlib.Path(video_path).with_name(f"timestamp_{camera_id}.csv")
+
+# frame timestamps of the recorded video : timestamp_N.csv, or the FRAME events of the session journal (without csv logs)
+def timestamp_source_of(video_path:pathlib.Path) -> pathlib.Path:
+    timestamp_path = timestamp_path_of(video_path)
+    if timestamp_path is None or timestamp_path.is_file():
+        return timestamp_path
+    journal_path = journal_path_of(video_path)
+    return journal_path if journal_path.is_file() else None
+
+# join timestamps(rows of timestamp_N.csv or FRAME events of session.jrnl, in recorded order) to the frame table
+def join_timestamps(frames:np.ndarray, timestamp_path:pathlib.Path, camera_id:int=None):
+    if timestamp_path is None or not timestamp_path.is_file():
+        return
+    timestamps, monotonic = [], []
+    if timestamp_path.suffix==".jrnl":
+        try:
+            journal = JournalReader(timestamp_path)
+        except JournalError:
+            return
+        timestamps, monotonic, _ = journal.get_frames(camera_id)
+        journal.close()
+    else:
+        with open(timestamp_path, "r", newline="") as tfile:
+            for row in csv.reader(tfile):
+                if not row:
+                    continue
+                timestamps.append(float(row[0]))
+                monotonic.append(int(row[2]) if len(row)>2 else -1) # [timestamp, dropped, monotonic ns], old files have timestamp only
+    count = min(len(frames), len(timestamps))
+    frames["timestamp"][:count] = timestamps[:count]
+    frames["monotonic_ns"][:count] = monotonic[:count]
+
+
+# load the sidecar index of the AVI file, or scan the file (the index is saved next to the video if use_cache is True)
+def load_avi_index(path, use_cache:bool=True) -> AviFrameIndex:
+    path = pathlib.Path(path)
+    cache_path = path.with_name(path.name + _INDEX_SUFFIX)
+    timestamp_path = timestamp_source_of(path)
+    stat = path.stat()
+    key = [_INDEX_VERSION, stat.st_size, stat.st_mtime_ns]
+    if timestamp_path is not None and timestamp_path.is_file():
+        key += [timestamp_path.stat().st_size, timestamp_path.stat().st_mtime_ns]
+
+    if use_cache and cache_path.is_file():
+        try:
+            with np.load(cache_path) as cached:
+                if cached["key"].tolist()==key:
+                    return AviFrameIndex(path, cached["frames"], float(cached["fps"]), tuple(cached["resolution"].tolist()))
+        except (OSError, ValueError, KeyError):
+            pass # rebuild
+
+    index = AviFrameIndex.scan(path)
+    join_timestamps(index.frames, timestamp_path, camera_id_of(path))
+    if use_cache:
+        try:
+            with open(cache_path, "wb") as cfile:
+                np.savez(cfile, key=np.array(key, dtype=np.int64), frames=index.frames, fps=index.get_fps(), resolution=np.array(index.get_resolution()))
+        except OSError:
+            pass # read-only dataset
+    return index
+
+# frame index of the recording (AVI file or raw recording directory)
+def open_frame_index(path, use_cache:bool=True):
+    path = pathlib.Path(path)
+    if path.is_dir():
+        return RawFrameReader(path)
+    return load_avi_index(path, use_cache)